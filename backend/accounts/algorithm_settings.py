@@ -0,0 +1,244 @@
+"""
+Per-school matching algorithm settings.
+
+School.matching_algorithm_settings only stores the overrides a school admin
+saved; everything else comes from DEFAULT_ALGORITHM_SETTINGS. Merging and
+validating the two on every access is wasted work on the matching hot path,
+so the merged result is built once into an immutable AlgorithmSettings and
+memoized per school, in process and in the shared cache (see caching.py).
+"""
+import copy
+import logging
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from django.core.cache import cache
+
+from .caching import bump_version, get_version
+
+logger = logging.getLogger(__name__)
+
+RANKINGS = ('learned', 'weighted')
+
+DEFAULT_ALGORITHM_SETTINGS = {
+    'batch_size': 10,
+    'wait_time_minutes': 10,
+    # 'learned' orders candidates by expected time to accept once acceptance
+    # models are trained (see substitutes.acceptance_model); 'weighted' always
+    # uses the weights below
+    'ranking': 'learned',
+    'weights': {
+        'qualification': {
+            'PhD': 3,
+            'Masters': 2,
+            'Bachelors': 1
+        },
+        'rating_multiplier': {
+            'factor': 2.0
+        },
+        'experience_multiplier': {
+            'factor': 0.5
+        },
+        # Added to the score of teachers with the app open right now (see
+        # substitutes.presence); 'minutes' is taken off their expected time
+        # to accept under the learned ranking instead. 'only' invites nobody
+        # else.
+        'online': {
+            'boost': 5.0,
+            'minutes': 5.0,
+            'only': False
+        }
+    }
+}
+
+# Seconds a built settings payload stays in the shared cache
+SETTINGS_CACHE_TIMEOUT = 60 * 60 * 24
+
+_local_settings = {}
+
+
+def _freeze(value):
+    """Recursively turn dicts/lists into read-only equivalents"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    """Inverse of _freeze, for JSON responses"""
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+def merge_algorithm_settings(saved):
+    """Deep merge saved overrides onto a fresh copy of the defaults"""
+    result = copy.deepcopy(DEFAULT_ALGORITHM_SETTINGS)
+    if not saved:
+        return result
+
+    # Merge top level fields
+    for key, value in saved.items():
+        if key != 'weights':
+            result[key] = copy.deepcopy(value)
+
+    # Handle weights dictionary specially for deep merging
+    for weight_key, weight_value in (saved.get('weights') or {}).items():
+        current = result['weights'].get(weight_key)
+        if isinstance(weight_value, dict) and isinstance(current, dict):
+            current.update(weight_value)
+        else:
+            result['weights'][weight_key] = copy.deepcopy(weight_value)
+    return result
+
+
+def _factor(weights, key, legacy_key):
+    """Resolve a multiplier from `{key: {'factor': x}}` or a legacy flat weight"""
+    if legacy_key in weights and not isinstance(weights[legacy_key], Mapping):
+        return float(weights[legacy_key])
+    value = weights.get(key)
+    if isinstance(value, Mapping):
+        return float(value.get('factor', 1.0))
+    if value is not None:
+        return float(value)
+    return 1.0
+
+
+@dataclass(frozen=True)
+class AlgorithmSettings:
+    """Validated, read-only view of a school's matching settings"""
+    batch_size: int
+    wait_time_minutes: int
+    weights: Mapping[str, Any]
+    rating_weight: float
+    experience_weight: float
+    qualification_weights: Mapping[str, float]
+    version: int = 0
+    extra: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    online_boost: float = 0.0
+    online_minutes: float = 0.0
+    online_only: bool = False
+    ranking: str = 'learned'
+
+    @classmethod
+    def from_dict(cls, merged, version=0):
+        """Validate a merged settings dict; invalid values fall back to defaults"""
+        weights = merged.get('weights')
+        if not isinstance(weights, dict):
+            weights = copy.deepcopy(DEFAULT_ALGORITHM_SETTINGS['weights'])
+
+        try:
+            batch_size = max(1, int(merged.get('batch_size')))
+        except (TypeError, ValueError):
+            batch_size = DEFAULT_ALGORITHM_SETTINGS['batch_size']
+        try:
+            wait_time_minutes = max(1, int(merged.get('wait_time_minutes')))
+        except (TypeError, ValueError):
+            wait_time_minutes = DEFAULT_ALGORITHM_SETTINGS['wait_time_minutes']
+        ranking = merged.get('ranking')
+        if ranking not in RANKINGS:
+            ranking = DEFAULT_ALGORITHM_SETTINGS['ranking']
+
+        try:
+            rating_weight = _factor(weights, 'rating_multiplier', 'rating')
+            experience_weight = _factor(weights, 'experience_multiplier', 'experience')
+            qualification = weights.get('qualification') or {}
+            qualification_weights = {
+                str(name): float(score) for name, score in qualification.items()
+            }
+            online = weights.get('online')
+            if not isinstance(online, dict):
+                online = {'boost': online or 0.0}
+            online_boost = float(online.get('boost') or 0.0)
+            online_minutes = float(online.get('minutes') or 0.0)
+            online_only = bool(online.get('only', False))
+        except (TypeError, ValueError, AttributeError):
+            logger.warning("Invalid algorithm weights %r, using defaults", weights)
+            return cls.from_dict(
+                {**merged, 'weights': copy.deepcopy(DEFAULT_ALGORITHM_SETTINGS['weights'])},
+                version=version,
+            )
+
+        extra = {
+            key: value for key, value in merged.items()
+            if key not in ('batch_size', 'wait_time_minutes', 'ranking', 'weights')
+        }
+        return cls(
+            batch_size=batch_size,
+            wait_time_minutes=wait_time_minutes,
+            weights=_freeze(weights),
+            rating_weight=rating_weight,
+            experience_weight=experience_weight,
+            qualification_weights=MappingProxyType(qualification_weights),
+            version=version,
+            extra=_freeze(extra),
+            online_boost=online_boost,
+            online_minutes=online_minutes,
+            online_only=online_only,
+            ranking=ranking,
+        )
+
+    def as_dict(self):
+        """Plain dict in the shape the algorithm-settings API has always returned"""
+        return {
+            **_thaw(self.extra),
+            'batch_size': self.batch_size,
+            'wait_time_minutes': self.wait_time_minutes,
+            'ranking': self.ranking,
+            'weights': _thaw(self.weights),
+        }
+
+
+def _version_key(school_id):
+    return f"school:{school_id}:algorithm_settings:version"
+
+
+def _payload_key(school_id, version):
+    return f"school:{school_id}:algorithm_settings:{version}"
+
+
+def _load_saved_settings(school):
+    """Read the saved overrides fresh from the row; the instance may predate a save"""
+    from .models import School
+
+    saved = School.objects.filter(pk=school.pk).values_list(
+        'matching_algorithm_settings', flat=True
+    ).first()
+    return school.matching_algorithm_settings if saved is None else saved
+
+
+def get_algorithm_settings(school):
+    """Return the memoized AlgorithmSettings for a School instance"""
+    school_id = str(school.pk)
+    try:
+        version = get_version(_version_key(school_id))
+        local = _local_settings.get(school_id)
+        if local is not None and local.version == version:
+            return local
+
+        merged = cache.get(_payload_key(school_id, version))
+        if merged is None:
+            merged = merge_algorithm_settings(_load_saved_settings(school))
+            cache.set(_payload_key(school_id, version), merged, SETTINGS_CACHE_TIMEOUT)
+    except Exception as e:
+        # Cache outage must never break matching; build directly from the row
+        logger.warning("Algorithm settings cache unavailable: %s", e)
+        return AlgorithmSettings.from_dict(
+            merge_algorithm_settings(school.matching_algorithm_settings)
+        )
+
+    built = AlgorithmSettings.from_dict(merged, version=version)
+    _local_settings[school_id] = built
+    return built
+
+
+def invalidate_algorithm_settings(school_id):
+    """Bump the version stamp so every process rebuilds on next access"""
+    school_id = str(school_id)
+    _local_settings.pop(school_id, None)
+    bump_version(_version_key(school_id))
@@ -7,3 +7,6 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         import accounts.signals
+        from .form_schemas import warm_profile_forms
+        from .models import User
+        warm_profile_forms(user_type for user_type, _ in User.USER_TYPE_CHOICES)
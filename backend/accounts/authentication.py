@@ -0,0 +1,140 @@
+"""
+JWT authentication that trusts signed profile claims instead of loading the user.
+
+Access tokens issued by UserLoginSerializer (and refreshed through
+ClaimsTokenRefreshSerializer) carry the handful of user fields that
+permissions and the profile gate need. ClaimsJWTAuthentication turns them into
+a ClaimsUser: those fields are answered from the token, and the real User row
+is only loaded the first time a view touches anything else.
+
+Each user has a claims version stamp (see caching.py). It is embedded in the
+token and bumped whenever a claimed field may have changed, so a token whose
+claims went stale falls back to a normal database lookup until it is refreshed.
+"""
+import logging
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .caching import drop_versions, get_version
+
+logger = logging.getLogger(__name__)
+
+CLAIMS_VERSION_CLAIM = 'claims_version'
+
+# Token claims answered by ClaimsUser without touching the database
+PROFILE_CLAIMS = (
+    'user_type',
+    'profile_completed',
+    'profile_verification_status',
+    'school_id',
+    'staff_role',
+    'is_staff',
+    'is_superuser',
+)
+
+
+def _claims_version_key(user_id):
+    return f"user:{user_id}:claims:version"
+
+
+def profile_claims(user):
+    """Claim values for a user; expects school_staff to be joined in"""
+    staff = getattr(user, 'school_staff', None)
+    school_id = user.school_id
+    return {
+        'user_type': user.user_type,
+        'profile_completed': user.profile_completed,
+        'profile_verification_status': user.profile_verification_status,
+        'school_id': str(school_id) if school_id else None,
+        'staff_role': staff.role if staff is not None else None,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+    }
+
+
+def add_profile_claims(token, user):
+    """Embed fresh profile claims and the current claims version in `token`"""
+    User = get_user_model()
+    user = User.objects.select_related('school_staff').get(pk=user.pk)
+    for name, value in profile_claims(user).items():
+        token[name] = value
+    try:
+        token[CLAIMS_VERSION_CLAIM] = get_version(_claims_version_key(user.pk))
+    except Exception as e:
+        # Without a version the token simply authenticates the slow way
+        logger.warning("Claims version unavailable for %s: %s", user.pk, e)
+    return token
+
+
+def invalidate_claims(user_ids):
+    """Mark the claims in every outstanding token of these users as stale"""
+    drop_versions(_claims_version_key(user_id) for user_id in user_ids if user_id)
+
+
+def _load_user(user_id):
+    User = get_user_model()
+    try:
+        user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    except User.DoesNotExist:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+    if not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+    return user
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    request.user built from token claims. Claimed fields and the id are plain
+    attributes; any other access (or passing it to the ORM) loads the User.
+    """
+
+    def __init__(self, validated_token):
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        super().__init__(lambda: _load_user(user_id))
+        # Bypass LazyObject.__setattr__, which would forward to the wrapped user
+        attrs = self.__dict__
+        attrs['id'] = attrs['pk'] = uuid.UUID(str(user_id))
+        attrs['is_authenticated'] = True
+        attrs['is_anonymous'] = False
+        attrs['is_active'] = True
+        for name in PROFILE_CLAIMS:
+            attrs[name] = validated_token[name]
+        attrs['school_id'] = uuid.UUID(attrs['school_id']) if attrs['school_id'] else None
+
+    def __bool__(self):
+        # LazyObject would load the user just to answer `if request.user`
+        return True
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that skips the per-request user lookup when the token
+    carries current profile claims.
+    """
+
+    def get_user(self, validated_token):
+        if not self.has_current_claims(validated_token):
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
+
+    def has_current_claims(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares the stored password hash, so it needs the row
+            return False
+        if any(name not in validated_token for name in PROFILE_CLAIMS):
+            return False
+        version = validated_token.get(CLAIMS_VERSION_CLAIM)
+        if version is None:
+            return False
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+            return get_version(_claims_version_key(user_id)) == version
+        except Exception as e:
+            logger.warning("Claims version check failed: %s", e)
+            return False
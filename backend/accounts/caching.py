@@ -0,0 +1,77 @@
+"""
+Small helpers shared by the Redis-backed read caches in this app.
+
+Each cached object family keeps a version stamp per entity; payloads are
+stored under a key that embeds the stamp, so bumping (or dropping) the stamp
+invalidates the payload in every process without having to know its key.
+"""
+import hashlib
+import json
+import logging
+import secrets
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+
+def new_version():
+    # Random so a re-stamped (dropped or evicted) key never matches a stale copy
+    return secrets.randbits(62)
+
+
+def get_version(key):
+    """Return the current stamp for `key`, creating one on first use"""
+    version = cache.get(key)
+    if version is None:
+        # add() keeps concurrent first readers on the same stamp
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Invalidate everything stored under the current stamp for `key`"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Stamp missing (never read or evicted): start a fresh one
+        cache.add(key, new_version(), timeout=None)
+    except Exception as e:
+        logger.warning("Could not bump cache version %s: %s", key, e)
+
+
+def drop_versions(keys):
+    """Invalidate many stamps at once; readers re-stamp on next access"""
+    if not keys:
+        return
+    try:
+        cache.delete_many(list(keys))
+    except Exception as e:
+        logger.warning("Could not drop cache versions: %s", e)
+
+
+def make_etag(data):
+    """Strong ETag for a JSON-serializable payload"""
+    raw = json.dumps(data, sort_keys=True, default=str).encode()
+    return f'"{hashlib.md5(raw).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    """True when the client's If-None-Match already names `etag`"""
+    header = request.headers.get('If-None-Match', '')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in [tag.strip() for tag in header.split(',')]
+
+
+def conditional_response(request, data, etag, cache_control='private, no-cache'):
+    """200 with ETag, or an empty 304 when the client already holds `etag`"""
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(data, headers=headers)
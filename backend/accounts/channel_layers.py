@@ -0,0 +1,19 @@
+from channels_redis.core import RedisChannelLayer
+
+from .instrumentation import count_channel_send
+
+
+class CountedSendsMixin:
+    """Reports every send and group_send to the current request's metrics"""
+
+    async def send(self, channel, message):
+        count_channel_send()
+        return await super().send(channel, message)
+
+    async def group_send(self, group, message):
+        count_channel_send()
+        return await super().group_send(group, message)
+
+
+class InstrumentedRedisChannelLayer(CountedSendsMixin, RedisChannelLayer):
+    pass
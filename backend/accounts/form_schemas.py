@@ -0,0 +1,365 @@
+"""
+Profile completion form schemas.
+
+The schemas only depend on the user type (and the current year, for the
+established-year bound), so they are built once per user type and reused
+for every request together with a precomputed strong ETag.
+"""
+import datetime
+from functools import lru_cache
+
+from .caching import make_etag
+
+
+def build_form_schema(user_type, current_year):
+    """Generate dynamic form schema based on user type"""
+    base_fields = {
+        "first_name": {
+            "type": "text",
+            "label": "First Name",
+            "required": True,
+            "order": 1
+        },
+        "last_name": {
+            "type": "text", 
+            "label": "Last Name",
+            "required": True,
+            "order": 2
+        },
+        "phone_number": {
+            "type": "text",
+            "label": "Phone Number",
+            "required": True,
+            "order": 3
+        },
+        "profile_image": {
+            "type": "file",
+            "label": "Profile Image",
+            "required": False,
+            "accept": "image/*",
+            "max_size": 204800,  # 200KB
+            "order": 5
+        }
+    }
+
+    # Teacher specific fields
+    if user_type in ['INTERNAL_TEACHER', 'EXTERNAL_TEACHER']:
+        teacher_fields = {
+            "teacher_profile.qualification": {
+                "type": "text",
+                "label": "Educational Qualification",
+                "required": True,
+                "order": 10
+            },
+            "teacher_profile.subjects": {
+                "type": "multi-text",
+                "label": "Teaching Subjects",
+                "required": True, 
+                "order": 11
+            },
+            "teacher_profile.experience_years": {
+                "type": "number",
+                "label": "Years of Experience",
+                "required": True,
+                "min": 0,
+                "order": 12
+            },
+            "teacher_profile.preferred_classes": {
+                "type": "multi-text",
+                "label": "Preferred Classes",
+                "required": False,
+                "order": 13
+            },
+            "teacher_profile.teaching_methodology": {
+                "type": "textarea",
+                "label": "Teaching Methodology",
+                "required": False,
+                "order": 14
+            },
+            "teacher_profile.languages": {
+                "type": "multi-text",
+                "label": "Languages Known",
+                "required": False,
+                "order": 15
+            },
+            "teacher_profile.can_teach_online": {
+                "type": "checkbox",
+                "label": "Available for Online Teaching",
+                "required": False,
+                "order": 16
+            },
+            "teacher_profile.can_travel": {
+                "type": "checkbox",
+                "label": "Available for Travel",
+                "required": False,
+                "order": 17
+            }
+        }
+        return {**base_fields, **teacher_fields}
+
+    # Student specific fields
+    elif user_type == 'STUDENT':
+        student_fields = {
+            "student_profile.grade": {
+                "type": "text",
+                "label": "Current Grade",
+                "required": True,
+                "order": 10
+            },
+            "student_profile.section": {
+                "type": "text",
+                "label": "Section",
+                "required": False,
+                "order": 11
+            },
+            "student_profile.roll_number": {
+                "type": "text",
+                "label": "Roll Number",
+                "required": False,
+                "order": 12
+            },
+            "student_profile.parent_name": {
+                "type": "text",
+                "label": "Parent/Guardian Name",
+                "required": True,
+                "order": 13
+            },
+            "student_profile.parent_phone": {
+                "type": "text",
+                "label": "Parent/Guardian Phone",
+                "required": True,
+                "order": 14
+            },
+            "student_profile.parent_email": {
+                "type": "email",
+                "label": "Parent/Guardian Email",
+                "required": False,
+                "order": 15
+            },
+            "student_profile.date_of_birth": {
+                "type": "date",
+                "label": "Date of Birth",
+                "required": False,
+                "order": 16
+            }
+        }
+        return {**base_fields, **student_fields}
+
+    # School admin/principal specific fields
+    elif user_type in ['SCHOOL_ADMIN', 'PRINCIPAL']:
+        # Staff fields
+        staff_fields = {
+            "school_staff_profile.department": {
+                "type": "text",
+                "label": "Department",
+                "required": True,
+                "section": "Staff Details",
+                "order": 10
+            },
+            "school_staff_profile.employee_id": {
+                "type": "text",
+                "label": "Employee ID",
+                "required": True,
+                "section": "Staff Details",
+                "order": 11
+            },
+            "school_staff_profile.date_of_joining": {
+                "type": "date",
+                "label": "Date of Joining",
+                "required": True,
+                "section": "Staff Details",
+                "order": 12
+            }
+        }
+
+        # School fields
+        school_fields = {
+            "school_profile.school_name": {
+                "type": "text",
+                "label": "School Name",
+                "required": True,
+                "section": "School Details",
+                "order": 20
+            },
+            "school_profile.category": {
+                "type": "select",
+                "label": "School Category",
+                "required": True,
+                "options": [
+                    {"value": "PRIMARY", "label": "Primary School"},
+                    {"value": "MIDDLE", "label": "Middle School"},
+                    {"value": "SECONDARY", "label": "Secondary School"},
+                    {"value": "HIGHER_SECONDARY", "label": "Higher Secondary School"},
+                    {"value": "DEGREE_COLLEGE", "label": "Degree College"},
+                    {"value": "UNIVERSITY", "label": "University"},
+                    {"value": "OTHER", "label": "Other"}
+                ],
+                "section": "School Details",
+                "order": 21
+            },
+            "school_profile.address": {
+                "type": "textarea",
+                "label": "School Address",
+                "required": True,
+                "section": "School Details",
+                "order": 22
+            },
+            "school_profile.city": {
+                "type": "text",
+                "label": "City",
+                "required": True,
+                "section": "School Details",
+                "order": 23
+            },
+            "school_profile.state": {
+                "type": "text",
+                "label": "State",
+                "required": True,
+                "section": "School Details",
+                "order": 24
+            },
+            "school_profile.country": {
+                "type": "text",
+                "label": "Country",
+                "required": True,
+                "section": "School Details",
+                "order": 25
+            },
+            "school_profile.postal_code": {
+                "type": "text",
+                "label": "Postal Code",
+                "required": True,
+                "section": "School Details",
+                "order": 26
+            },
+            "school_profile.board_type": {
+                "type": "select",
+                "label": "Board Type",
+                "required": True,
+                "options": [
+                    {"value": "CBSE", "label": "CBSE"},
+                    {"value": "ICSE", "label": "ICSE"},
+                    {"value": "IB", "label": "IB"},
+                    {"value": "STATE", "label": "State Board"},
+                    {"value": "OTHER", "label": "Other Board"}
+                ],
+                "section": "School Details",
+                "order": 27
+            },
+            "school_profile.registration_number": {
+                "type": "text",
+                "label": "Registration Number",
+                "required": True,
+                "section": "School Details",
+                "order": 28
+            },
+            "school_profile.established_year": {
+                "type": "number",
+                "label": "Established Year",
+                "required": True,
+                "min": 1800,
+                "max": current_year,
+                "section": "School Details",
+                "order": 29
+            },
+            "school_profile.website": {
+                "type": "url",
+                "label": "Website",
+                "required": False,
+                "section": "School Details",
+                "order": 30
+            },
+            "school_profile.contact_person": {
+                "type": "text",
+                "label": "Contact Person",
+                "required": True,
+                "section": "School Details",
+                "order": 31
+            }
+        }
+        return {**base_fields, **staff_fields, **school_fields}
+
+    return base_fields
+
+
+def build_required_fields(user_type):
+    """Return required fields based on user type"""
+    base_fields = {
+        "first_name": "First Name",
+        "last_name": "Last Name",
+        "phone_number": "Phone Number",
+    }
+
+    if user_type == 'INTERNAL_TEACHER':
+        return {
+            **base_fields,
+            "teacher_profile": {
+                "qualification": "Educational Qualification",
+                "subjects": "Teaching Subjects",
+                "experience_years": "Years of Experience",
+                "preferred_classes": "Preferred Classes",
+                "languages": "Languages Known",
+                "can_teach_online": "Available for Online Teaching",
+                "can_travel": "Available for Travel",
+                "school_name": "School", # For internal teachers
+            }
+        }
+    elif user_type == 'EXTERNAL_TEACHER':
+        return {
+            **base_fields,
+                "qualification": "Educational Qualification",
+                "subjects": "Teaching Subjects",
+                "experience_years": "Years of Experience",
+                "preferred_classes": "Preferred Classes",
+                "languages": "Languages Known",
+                "can_teach_online": "Available for Online Teaching",
+                "can_travel": "Available for Travel",
+        }
+    elif user_type == 'STUDENT':
+        return {
+            **base_fields,
+            "student_profile": {
+                "grade": "Current Grade",
+                "section": "Section",
+                "roll_number": "Roll Number",
+                "parent_name": "Parent/Guardian Name",
+                "parent_phone": "Parent/Guardian Phone",
+                "parent_email": "Parent/Guardian Email",
+                "date_of_birth": "Date of Birth"
+            }
+        }
+    elif user_type in ['SCHOOL_ADMIN', 'PRINCIPAL']:
+        return {
+            **base_fields,
+            "school_staff_profile": {
+                "employee_id": "Employee ID",
+                "designation": "Designation",
+            },
+            "school_profile": {
+                "school_name": "School Name",
+                "category": "School Category",
+                "board_type": "Board Type",       
+        }        
+        } 
+    return base_fields
+
+
+@lru_cache(maxsize=None)
+def _profile_form(user_type, current_year):
+    schema = build_form_schema(user_type, current_year)
+    required_fields = build_required_fields(user_type)
+    return schema, required_fields, make_etag([schema, required_fields])
+
+
+def get_profile_form(user_type):
+    """
+    Return (form_schema, required_fields, etag) for a user type.
+    The dicts are shared between requests and must not be mutated.
+    """
+    return _profile_form(user_type, datetime.date.today().year)
+
+
+def warm_profile_forms(user_types):
+    """Build every schema up front so no request pays for it"""
+    for user_type in user_types:
+        get_profile_form(user_type)
@@ -0,0 +1,339 @@
+"""
+Per-request instrumentation: wall time, database queries, channel-layer
+sends and time spent waiting on external services (JioMeet, SMTP).
+
+InstrumentationMiddleware opens a RequestMetrics for every request and
+installs it as a connection.execute_wrapper; code further down reports into
+the current one through external_call() and the counting channel layer in
+accounts.channel_layers. When the request finishes the totals are
+
+    - added to the in-process registry served by metrics_view in the
+      Prometheus text format,
+    - returned as a Server-Timing header when SERVER_TIMING_ENABLED,
+    - logged with the request's slowest and most repeated queries when the
+      request takes longer than SLOW_REQUEST_THRESHOLD_MS. Only the worst
+      request per view is logged in each SLOW_REQUEST_SAMPLE_INTERVAL.
+
+The hot path is a few perf_counter() calls and list appends per query, so
+this is meant to stay on in production. Metrics are kept per process; every
+worker serves its own on /metrics.
+"""
+import contextvars
+import heapq
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Queries kept per request for the slow-request log; counts stay exact past it
+MAX_RECORDED_QUERIES = 1000
+SLOW_REQUEST_TOP_QUERIES = 10
+UNRESOLVED_VIEW = '<unresolved>'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def current_metrics():
+    """The RequestMetrics of the request being handled, or None outside one"""
+    return _current.get()
+
+
+class RequestMetrics:
+    __slots__ = ('view', 'started', 'duration', 'db_queries', 'db_time',
+                 'channel_sends', 'external', 'phases', 'queries')
+
+    def __init__(self):
+        self.view = None
+        self.started = time.perf_counter()
+        self.duration = None
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.channel_sends = 0
+        self.external = defaultdict(float)
+        self.phases = {}
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.db_queries += 1
+            self.db_time += elapsed
+            if len(self.queries) < MAX_RECORDED_QUERIES:
+                self.queries.append((elapsed, sql))
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def server_timing(self):
+        entries = [
+            f'total;dur={self.duration * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+        ]
+        entries.extend(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.phases.items())
+        entries.extend(f'ext-{service};dur={seconds * 1000:.1f}' for service, seconds in self.external.items())
+        if self.channel_sends:
+            entries.append(f'channels;desc="{self.channel_sends} sends"')
+        return ', '.join(entries)
+
+
+@contextmanager
+def external_call(service):
+    """
+    Times a call to an external service. Works as a decorator too:
+
+        @external_call('smtp')
+        def send_direct_smtp_email(...):
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe_external(service, elapsed)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.external[service] += elapsed
+
+
+def count_channel_send():
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.channel_sends += 1
+
+
+class MetricsRegistry:
+    """Process-wide counters, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = Counter()
+            self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+            self.duration_sum = Counter()
+            self.duration_count = Counter()
+            self.db_queries = Counter()
+            self.db_seconds = Counter()
+            self.channel_sends = Counter()
+            self.external_calls = Counter()
+            self.external_seconds = Counter()
+            self.slow_requests = Counter()
+
+    def observe_request(self, metrics, method, status):
+        view = metrics.view
+        with self._lock:
+            self.requests[view, method, status] += 1
+            buckets = self.duration_buckets[view]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if metrics.duration <= bound:
+                    buckets[index] += 1
+            self.duration_sum[view] += metrics.duration
+            self.duration_count[view] += 1
+            self.db_queries[view] += metrics.db_queries
+            self.db_seconds[view] += metrics.db_time
+            self.channel_sends[view] += metrics.channel_sends
+
+    def observe_external(self, service, seconds):
+        with self._lock:
+            self.external_calls[service] += 1
+            self.external_seconds[service] += seconds
+
+    def observe_slow_request(self, view):
+        with self._lock:
+            self.slow_requests[view] += 1
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels)
+                lines.append(f'{name}{{{label_text}}} {_format(value)}' if label_text else f'{name} {_format(value)}')
+
+        with self._lock:
+            family('teacherhub_http_requests_total', 'counter', 'Requests handled, by view, method and status.',
+                   [((('view', view), ('method', method), ('status', status)), count)
+                    for (view, method, status), count in sorted(self.requests.items())])
+
+            histogram = []
+            for view in sorted(self.duration_count):
+                for bound, count in zip(DURATION_BUCKETS, self.duration_buckets[view]):
+                    histogram.append(((('view', view), ('le', _format(bound))), count, '_bucket'))
+                histogram.append(((('view', view), ('le', '+Inf')), self.duration_count[view], '_bucket'))
+                histogram.append(((('view', view),), self.duration_sum[view], '_sum'))
+                histogram.append(((('view', view),), self.duration_count[view], '_count'))
+            name = 'teacherhub_http_request_duration_seconds'
+            lines.append(f'# HELP {name} Request wall time, by view.')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, value, suffix in histogram:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels)
+                lines.append(f'{name}{suffix}{{{label_text}}} {_format(value)}')
+
+            per_view = (
+                ('teacherhub_db_queries_total', 'Database queries, by view.', self.db_queries),
+                ('teacherhub_db_query_seconds_total', 'Time spent in database queries, by view.', self.db_seconds),
+                ('teacherhub_channel_sends_total', 'Channel-layer sends, by view.', self.channel_sends),
+                ('teacherhub_slow_requests_total', 'Requests over the slow threshold, by view.', self.slow_requests),
+            )
+            for name, help_text, counter in per_view:
+                family(name, 'counter', help_text,
+                       [((('view', view),), value) for view, value in sorted(counter.items())])
+
+            family('teacherhub_external_calls_total', 'counter', 'Calls to external services.',
+                   [((('service', service),), value) for service, value in sorted(self.external_calls.items())])
+            family('teacherhub_external_call_seconds_total', 'counter', 'Time spent in external services.',
+                   [((('service', service),), value) for service, value in sorted(self.external_seconds.items())])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+
+
+class SlowRequestSampler:
+    """
+    Logs the queries of slow requests. Within each interval a view is logged
+    the first time it goes over the threshold and again only if a later
+    request is slower still, so a burst of slow requests logs its worst few.
+    """
+
+    def __init__(self, threshold_ms, interval):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self._worst = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metrics, request):
+        if metrics.duration < self.threshold:
+            return
+        registry.observe_slow_request(metrics.view)
+
+        now = time.monotonic()
+        with self._lock:
+            window_started, worst = self._worst.get(metrics.view, (None, 0.0))
+            if window_started is None or now - window_started >= self.interval:
+                window_started, worst = now, 0.0
+            if metrics.duration <= worst:
+                return
+            self._worst[metrics.view] = (window_started, metrics.duration)
+
+        logger.warning(self.describe(metrics, request))
+
+    def describe(self, metrics, request):
+        lines = [
+            f'Slow request {request.method} {request.path} ({metrics.view}): '
+            f'{metrics.duration * 1000:.0f} ms, {metrics.db_queries} queries in {metrics.db_time * 1000:.0f} ms, '
+            f'{metrics.channel_sends} channel sends'
+        ]
+        lines.extend(f'  {service}: {seconds * 1000:.0f} ms' for service, seconds in metrics.external.items())
+
+        repeated = Counter(sql for _, sql in metrics.queries).most_common(SLOW_REQUEST_TOP_QUERIES)
+        repeated = [(count, sql) for sql, count in repeated if count > 1]
+        if repeated:
+            lines.append('  Repeated queries:')
+            lines.extend(f'    {count}x {sql}' for count, sql in repeated)
+
+        if metrics.queries:
+            lines.append('  Slowest queries:')
+            for elapsed, sql in heapq.nlargest(SLOW_REQUEST_TOP_QUERIES, metrics.queries, key=lambda query: query[0]):
+                lines.append(f'    {elapsed * 1000:.1f} ms {sql}')
+        return '\n'.join(lines)
+
+
+class InstrumentationMiddleware:
+    """Measures every request; see the module docstring. Goes first in MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'SERVER_TIMING_ENABLED', False)
+        self.sampler = SlowRequestSampler(
+            getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', 1000),
+            getattr(settings, 'SLOW_REQUEST_SAMPLE_INTERVAL', 300),
+        )
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        metrics.finish()
+
+        if metrics.view is None:
+            match = request.resolver_match
+            metrics.view = match.view_name if match is not None else UNRESOLVED_VIEW
+        registry.observe_request(metrics, request.method, response.status_code)
+        self.sampler.observe(metrics, request)
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing()
+        return response
+
+
+class InstrumentedViewMixin:
+    """
+    For DRF views: labels the request's metrics with the view class and
+    action instead of the URL name, and times authentication, permission
+    and throttle checks as the 'auth' phase.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return super().initial(request, *args, **kwargs)
+        action = getattr(self, 'action', None) or request.method.lower()
+        metrics.view = f'{type(self).__name__}.{action}'
+        with metrics.phase('auth'):
+            return super().initial(request, *args, **kwargs)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Requires `Authorization: Bearer <METRICS_TOKEN>`
+    when METRICS_TOKEN is set, otherwise only answers local requests.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden()
+    elif request.META.get('REMOTE_ADDR') not in ('127.0.0.1', '::1'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=METRICS_CONTENT_TYPE)
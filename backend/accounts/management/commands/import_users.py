@@ -0,0 +1,68 @@
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import School
+from accounts.onboarding import (
+    IMPORT_CHUNK_SIZE, ImportFileError, default_hash_workers, import_users_csv
+)
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports students and internal teachers of a school from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='CSV with email, username and profile columns')
+        parser.add_argument('--school', required=True, help='School id or registration number')
+        parser.add_argument('--user-type', choices=['STUDENT', 'INTERNAL_TEACHER'],
+                            help='User type for rows without a user_type column')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, default=default_hash_workers(),
+                            help='Processes used for password hashing')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+        parser.add_argument('--report', help='Write the full JSON report to this path')
+
+    def get_school(self, value):
+        try:
+            lookup = {'id': uuid.UUID(value)}
+        except ValueError:
+            lookup = {'registration_number': value}
+        try:
+            return School.objects.get(**lookup)
+        except School.DoesNotExist:
+            raise CommandError(f'School "{value}" not found')
+
+    def handle(self, *args, **options):
+        school = self.get_school(options['school'])
+        started = time.monotonic()
+        try:
+            with open(options['csv_path'], encoding='utf-8-sig', newline='') as stream:
+                report = import_users_csv(
+                    stream,
+                    school,
+                    default_user_type=options['user_type'],
+                    chunk_size=options['chunk_size'],
+                    hash_workers=options['workers'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+
+        for error in report['errors'][:20]:
+            self.stdout.write(self.style.WARNING(f"Line {error['row']} ({error['email']}): {json.dumps(error['errors'], default=str)}"))
+        if len(report['errors']) > 20:
+            self.stdout.write(self.style.WARNING(f"... {len(report['errors']) - 20} more errors"))
+
+        verb = 'Validated' if report['dry_run'] else 'Imported'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {report['created']} of {report['total_rows']} rows into "
+                f"{school.school_name} in {elapsed:.1f}s ({report['failed']} failed)"
+            )
+        )
@@ -1,48 +1,80 @@
+import re
+
+from django.conf import settings
 from django.shortcuts import redirect
 from django.urls import reverse
-from rest_framework.response import Response
+from django.utils.functional import cached_property
 from rest_framework import status
 from django.http import JsonResponse
 
+# Paths a user with an incomplete or unverified profile may still reach
+PROFILE_CHECK_EXCLUDED_PATHS = (
+    '/admin/',
+    '/api/auth/logout/',
+    '/api/profile/complete/',
+)
+
+PROFILE_INCOMPLETE_MESSAGE = "Please complete your profile"
+PROFILE_PENDING_MESSAGE = "Your profile is pending verification"
+
+
 class ProfileCompletionCheckMiddleware:
+    """
+    Redirects session-authenticated users with an incomplete or unverified
+    profile. API clients authenticate with JWT after middleware runs, so they
+    are gated by accounts.permissions.IsProfileVerified instead.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
+    @cached_property
+    def excluded_paths(self):
+        """Exclusion prefixes compiled once; reverse() needs the URLconf loaded"""
+        prefixes = (
+            reverse('profile-completion'),
+            reverse('verification-pending'),
+            *PROFILE_CHECK_EXCLUDED_PATHS,
+        )
+        return re.compile('|'.join(re.escape(prefix) for prefix in prefixes))
+
     def __call__(self, request):
-        if request.user.is_authenticated and not request.user.is_superuser:
-            # Exclude certain paths
-            excluded_paths = [
-                reverse('profile-completion'),
-                reverse('verification-pending'),
-                '/admin/',
-                '/api/auth/logout/',
-                '/api/profile/complete/',
-            ]
-
-            if not any(request.path.startswith(path) for path in excluded_paths):
-                if not request.user.profile_completed:
-                    if self.is_api_request(request):
-                        return JsonResponse(
-                            {"error": "Please complete your profile"},
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                    return redirect('profile-completion')
-
-                if (request.user.profile_completed and 
-                    request.user.profile_verification_status == 'PENDING'):
-                    if self.is_api_request(request):
-                        return JsonResponse(
-                            {"error": "Your profile is pending verification"},
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                    return redirect('verification-pending')
-
-        response = self.get_response(request)
-        return response
+        # Without a session cookie request.user can only be anonymous, so skip
+        # loading it at all; this is the common case for JWT API traffic.
+        if (settings.SESSION_COOKIE_NAME in request.COOKIES
+                and not self.excluded_paths.match(request.path)):
+            response = self.check_profile(request)
+            if response is not None:
+                return response
+
+        return self.get_response(request)
+
+    def check_profile(self, request):
+        user = request.user
+        if not user.is_authenticated or user.is_superuser:
+            return None
+
+        if not user.profile_completed:
+            if self.is_api_request(request):
+                return JsonResponse(
+                    {"error": PROFILE_INCOMPLETE_MESSAGE},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            return redirect('profile-completion')
+
+        if user.profile_verification_status == 'PENDING':
+            if self.is_api_request(request):
+                return JsonResponse(
+                    {"error": PROFILE_PENDING_MESSAGE},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            return redirect('verification-pending')
+
+        return None
 
     def is_api_request(self, request):
         return (
-            request.path.startswith('/api/') or 
+            request.path.startswith('/api/') or
             request.headers.get('accept') == 'application/json' or
             request.headers.get('content-type') == 'application/json'
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_user_school(apps, schema_editor):
+    """Copy each user's school from their profiles; later sources take precedence"""
+    User = apps.get_model('accounts', 'User')
+    sources = [
+        apps.get_model('accounts', 'School').objects.filter(user=models.OuterRef('pk')).values('id'),
+        apps.get_model('accounts', 'StudentProfile').objects.filter(
+            user=models.OuterRef('pk'), school__isnull=False).values('school_id'),
+        apps.get_model('accounts', 'TeacherProfile').objects.filter(
+            user=models.OuterRef('pk'), school__isnull=False).values('school_id'),
+        apps.get_model('accounts', 'SchoolStaff').objects.filter(user=models.OuterRef('pk')).values('school_id'),
+    ]
+    for source in sources:
+        User.objects.filter(models.Exists(source)).update(school_id=models.Subquery(source[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_schoolstaff_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='school',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='accounts.school'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('profile_completed', True), ('profile_verification_status', 'PENDING')), fields=['school', 'created_at'], name='user_pending_verif_idx'),
+        ),
+        migrations.RunPython(backfill_user_school, migrations.RunPython.noop),
+    ]
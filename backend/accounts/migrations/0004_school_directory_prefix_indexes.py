@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:30
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class PostgresAddIndex(migrations.AddIndex):
+    """AddIndex that only touches the database on PostgreSQL (pattern-ops opclass)"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_school_pending_verification'),
+    ]
+
+    operations = [
+        PostgresAddIndex(
+            model_name='school',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('school_name'), name='varchar_pattern_ops'), name='school_name_prefix_idx'),
+        ),
+        PostgresAddIndex(
+            model_name='school',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('city'), name='varchar_pattern_ops'), name='school_city_prefix_idx'),
+        ),
+    ]
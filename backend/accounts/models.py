@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import OpClass
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 import uuid
@@ -36,6 +38,15 @@ class User(AbstractUser):
     )
     profile_completed = models.BooleanField(default=False)
     verification_notes = models.TextField(blank=True)
+    # Denormalized from the staff/teacher/student profile or owned school (see
+    # verification.sync_user_school) so per-school queues avoid three reverse joins
+    school = models.ForeignKey(
+        'School',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='members'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'user_type']
@@ -57,6 +68,19 @@ class User(AbstractUser):
         related_name='accounts_user_set',  # Custom related_name
         related_query_name='accounts_user'
     )
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Verification queue: only completed, pending profiles per school
+            models.Index(
+                fields=['school', 'created_at'],
+                name='user_pending_verif_idx',
+                condition=models.Q(
+                    profile_completed=True,
+                    profile_verification_status='PENDING'
+                )
+            ),
+        ]
         
 
 
@@ -141,54 +165,18 @@ class School(models.Model):
         help_text="Custom settings for teacher matching algorithm"
     )
 
+    class Meta:
+        indexes = [
+            # Directory prefix search: istartswith compiles to UPPER(col) LIKE 'X%'
+            models.Index(OpClass(Upper('school_name'), name='varchar_pattern_ops'), name='school_name_prefix_idx'),
+            models.Index(OpClass(Upper('city'), name='varchar_pattern_ops'), name='school_city_prefix_idx'),
+        ]
+
     @property
     def get_algorithm_settings(self):
-        """Get algorithm settings with defaults"""
-        default_settings = {
-            'batch_size': 10,
-            'wait_time_minutes': 10,
-            'weights': {
-                'qualification': {
-                    'PhD': 3,
-                    'Masters': 2,
-                    'Bachelors': 1
-                },
-                'rating_multiplier': {
-                    'factor': 2.0
-                },
-                'experience_multiplier': {
-                    'factor': 0.5
-                }
-            }
-        }
-        
-        # Deep merge of nested dictionaries
-        result = default_settings.copy()
-        
-        # If there are no saved settings, return defaults
-        if not self.matching_algorithm_settings:
-            return result
-            
-        # Merge top level fields
-        for key, value in self.matching_algorithm_settings.items():
-            if key != 'weights':
-                result[key] = value
-                
-        # Handle weights dictionary specially for deep merging
-        if 'weights' in self.matching_algorithm_settings:
-            for weight_key, weight_value in self.matching_algorithm_settings['weights'].items():
-                if weight_key in result['weights']:
-                    if isinstance(weight_value, dict) and isinstance(result['weights'][weight_key], dict):
-                        # Deep merge for nested dictionaries like qualification
-                        result['weights'][weight_key].update(weight_value)
-                    else:
-                        # Direct replacement for simple values
-                        result['weights'][weight_key] = weight_value
-                else:
-                    # Add new weight categories not in defaults
-                    result['weights'][weight_key] = weight_value
-                    
-        return result
+        """Get algorithm settings with defaults (memoized per school version)"""
+        from .algorithm_settings import get_algorithm_settings
+        return get_algorithm_settings(self)
 
 class TeacherProfile(models.Model):
     AVAILABILITY_STATUS = (
@@ -0,0 +1,300 @@
+"""
+Bulk onboarding of students and internal teachers from CSV.
+
+Rows are streamed through BulkUserRowSerializer and handled in chunks: each
+chunk is checked for duplicate emails/usernames with one query per column,
+its passwords are hashed in a process pool (PBKDF2 dominates the cost of an
+import), and users, profiles and staff rows are written with bulk_create in
+one transaction. Problems are reported per CSV line instead of aborting the
+whole file.
+
+bulk_create skips model signals. That is safe here: User.school is filled in
+directly, and brand new users have no cached profiles or issued tokens yet.
+"""
+import csv
+import itertools
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .form_schemas import build_required_fields
+from .models import SchoolStaff, StudentProfile, TeacherProfile, User
+from .serializers import BulkUserRowSerializer
+
+logger = logging.getLogger(__name__)
+
+# Rows validated, hashed and inserted together
+IMPORT_CHUNK_SIZE = 500
+
+REQUIRED_COLUMNS = ('email', 'username')
+
+STUDENT_FIELDS = (
+    'grade', 'section', 'roll_number', 'parent_name', 'parent_phone',
+    'parent_email', 'date_of_birth',
+)
+TEACHER_FIELDS = (
+    'qualification', 'subjects', 'experience_years', 'preferred_classes', 'languages',
+)
+
+
+def _completion_fields(user_type):
+    """
+    Columns a row must fill for the profile to count as completed; booleans
+    with model defaults and the school (known from the import) are implied.
+    """
+    fields = []
+    for key, value in build_required_fields(user_type).items():
+        if isinstance(value, dict):
+            fields.extend(name for name in value if name not in ('school_name', 'can_teach_online', 'can_travel'))
+        else:
+            fields.append(key)
+    return tuple(fields)
+
+
+COMPLETION_FIELDS = {
+    user_type: _completion_fields(user_type) for user_type in ('STUDENT', 'INTERNAL_TEACHER')
+}
+
+
+class ImportFileError(ValueError):
+    """The CSV as a whole is unusable (missing header or required columns)"""
+
+
+def iter_csv_rows(stream):
+    """
+    Yield (line_number, row) from a text stream, with normalized headers and
+    empty cells dropped so optional serializer fields stay optional.
+    """
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames:
+        raise ImportFileError("The file is empty or has no header row")
+    reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames]
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        raise ImportFileError(f"Missing required column(s): {', '.join(missing)}")
+
+    for row in reader:
+        cleaned = {
+            key: value.strip() for key, value in row.items()
+            if key and isinstance(value, str) and value.strip()
+        }
+        if cleaned:
+            yield reader.line_num, cleaned
+
+
+def read_csv_rows(stream, max_rows):
+    """
+    Read at most max_rows rows up front, so an oversized file is rejected
+    before anything is written.
+    """
+    rows = list(itertools.islice(iter_csv_rows(stream), max_rows + 1))
+    if len(rows) > max_rows:
+        raise ImportFileError(
+            f"The file has more than {max_rows} rows; split it or use the import_users management command"
+        )
+    return rows
+
+
+def _hash_serially(passwords):
+    return [make_password(password) for password in passwords]
+
+
+@contextmanager
+def password_hasher(workers):
+    """
+    Yield a function hashing a list of passwords. With more than one worker
+    the hashing runs in spawned processes, which are safe to start from a
+    threaded server and set Django up from the inherited settings module.
+    """
+    if workers <= 1:
+        yield _hash_serially
+        return
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+        def hash_passwords(passwords):
+            chunksize = max(1, len(passwords) // (workers * 4))
+            return list(pool.map(make_password, passwords, chunksize=chunksize))
+        yield hash_passwords
+
+
+def default_hash_workers():
+    return max(1, min(os.cpu_count() or 1, 8))
+
+
+class UserImporter:
+    """
+    Imports rows into one school. Feed it with run(); the result is a report
+    dict: total_rows, created, dry_run and a list of per-line errors.
+    """
+
+    def __init__(self, school, default_user_type=None, chunk_size=IMPORT_CHUNK_SIZE,
+                 hash_workers=None, dry_run=False):
+        self.school = school
+        self.default_user_type = default_user_type
+        self.chunk_size = chunk_size
+        self.hash_workers = default_hash_workers() if hash_workers is None else hash_workers
+        self.dry_run = dry_run
+        self.seen_emails = set()
+        self.seen_usernames = set()
+        self.total_rows = 0
+        self.created = 0
+        self.errors = []
+        # Binding a serializer's fields deep-copies them, so validate every row
+        # through one instance instead of constructing one per row
+        self.row_serializer = BulkUserRowSerializer()
+
+    def run(self, rows):
+        """Import an iterable of (line_number, row) pairs, e.g. from iter_csv_rows"""
+        with password_hasher(1 if self.dry_run else self.hash_workers) as hash_passwords:
+            self.hash_passwords = hash_passwords
+            chunk = []
+            for line, row in rows:
+                self.total_rows += 1
+                chunk.append((line, row))
+                if len(chunk) >= self.chunk_size:
+                    self.import_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self.import_chunk(chunk)
+
+        return {
+            'total_rows': self.total_rows,
+            'created': self.created,
+            'failed': len(self.errors),
+            'dry_run': self.dry_run,
+            'errors': self.errors,
+        }
+
+    def add_error(self, line, row, errors):
+        self.errors.append({'row': line, 'email': row.get('email', ''), 'errors': errors})
+
+    def validate_chunk(self, chunk):
+        valid = []
+        for line, row in chunk:
+            if self.default_user_type and 'user_type' not in row:
+                row = {**row, 'user_type': self.default_user_type}
+            try:
+                data = self.row_serializer.run_validation(row)
+            except serializers.ValidationError as e:
+                self.add_error(line, row, e.detail)
+                continue
+
+            # Duplicates within the file itself
+            if data['email'] in self.seen_emails:
+                self.add_error(line, row, {'email': ["Duplicate email in this file"]})
+                continue
+            if data['username'] in self.seen_usernames:
+                self.add_error(line, row, {'username': ["Duplicate username in this file"]})
+                continue
+            self.seen_emails.add(data['email'])
+            self.seen_usernames.add(data['username'])
+            valid.append((line, row, data))
+
+        if not valid:
+            return valid
+
+        # Duplicates against existing users: one query per unique column
+        taken_emails = set(User.objects.filter(
+            email__in=[data['email'] for _, _, data in valid]
+        ).values_list('email', flat=True))
+        taken_usernames = set(User.objects.filter(
+            username__in=[data['username'] for _, _, data in valid]
+        ).values_list('username', flat=True))
+
+        accepted = []
+        for line, row, data in valid:
+            if data['email'] in taken_emails:
+                self.add_error(line, row, {'email': ["A user with this email already exists"]})
+            elif data['username'] in taken_usernames:
+                self.add_error(line, row, {'username': ["A user with this username already exists"]})
+            else:
+                accepted.append((line, row, data))
+        return accepted
+
+    def build_user(self, data, password_hash):
+        completed = all(data.get(field) not in (None, '', []) for field in COMPLETION_FIELDS[data['user_type']])
+        return User(
+            id=uuid.uuid4(),
+            email=data['email'],
+            username=data['username'],
+            password=password_hash,
+            user_type=data['user_type'],
+            first_name=data.get('first_name', ''),
+            last_name=data.get('last_name', ''),
+            phone_number=data.get('phone_number', ''),
+            school_id=self.school.id,
+            profile_completed=completed,
+            profile_verification_status='PENDING',
+        )
+
+    def build_profiles(self, user, data):
+        if user.user_type == 'STUDENT':
+            fields = {name: data[name] for name in STUDENT_FIELDS if name in data}
+            return [StudentProfile(user=user, school=self.school, **fields)]
+
+        fields = {name: data[name] for name in TEACHER_FIELDS if name in data}
+        fields.setdefault('qualification', '')
+        fields.setdefault('subjects', [])
+        fields.setdefault('experience_years', 0)
+        return [
+            TeacherProfile(
+                user=user, school=self.school, teacher_type='INTERNAL',
+                availability_status='AVAILABLE', **fields
+            ),
+            SchoolStaff(user=user, school=self.school, role='TEACHER'),
+        ]
+
+    def import_chunk(self, chunk):
+        accepted = self.validate_chunk(chunk)
+        if not accepted:
+            return
+        if self.dry_run:
+            self.created += len(accepted)
+            return
+
+        # Rows without a password get an unusable one and set it via password reset
+        hashed = iter(self.hash_passwords([data['password'] for _, _, data in accepted if data.get('password')]))
+        entries = []
+        for line, row, data in accepted:
+            user = self.build_user(data, next(hashed) if data.get('password') else make_password(None))
+            entries.append((line, row, user, self.build_profiles(user, data)))
+
+        try:
+            self.insert(entries)
+            self.created += len(entries)
+        except IntegrityError:
+            # A concurrent registration took an email or username; isolate the rows
+            logger.info("Bulk insert conflict, retrying %d rows individually", len(entries))
+            for entry in entries:
+                try:
+                    self.insert([entry])
+                    self.created += 1
+                except IntegrityError as e:
+                    line, row = entry[0], entry[1]
+                    self.add_error(line, row, {'non_field_errors': [str(e)]})
+
+    def insert(self, entries):
+        users = [user for _, _, user, _ in entries]
+        profiles = {}
+        for _, _, _, related in entries:
+            for obj in related:
+                profiles.setdefault(type(obj), []).append(obj)
+
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=self.chunk_size)
+            for model, objs in profiles.items():
+                model.objects.bulk_create(objs, batch_size=self.chunk_size)
+
+
+def import_users_csv(stream, school, **options):
+    """Stream a CSV text file into `school`; returns the UserImporter report"""
+    return UserImporter(school, **options).run(iter_csv_rows(stream))
@@ -1,4 +1,12 @@
 from rest_framework import permissions
+from .utils import get_request_school_id
+
+
+def _in_request_school(request, obj):
+    """True when `obj` has a school and it is the requesting user's school"""
+    school_id = get_request_school_id(request)
+    return school_id is not None and getattr(obj, 'school_id', None) == school_id
+
 
 class IsOwnerOrSchoolAdmin(permissions.BasePermission):
     """
@@ -10,9 +18,7 @@ class IsOwnerOrSchoolAdmin(permissions.BasePermission):
         # Read permissions are allowed to school admin
         if request.method in permissions.SAFE_METHODS:
             if request.user.user_type == 'SCHOOL_ADMIN':
-                if hasattr(obj, 'school'):
-                    return obj.school == request.user.school_profile
-                return False
+                return _in_request_school(request, obj)
             
         # Write permissions are only allowed to the owner
         return obj.user == request.user
@@ -51,9 +57,7 @@ class IsSchoolAdmin(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # School admins can access their school's related objects
-        if hasattr(obj, 'school'):
-            return obj.school == request.user.school_profile
-        return False
+        return _in_request_school(request, obj)
 
 class IsPrincipal(permissions.BasePermission):
     """
@@ -65,9 +69,7 @@ class IsPrincipal(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         # Principals can access their school's related objects
-        if hasattr(obj, 'school'):
-            return obj.school == request.user.school_profile
-        return False
+        return _in_request_school(request, obj)
     
 class CanManageSchoolProfile(permissions.BasePermission):
     """
@@ -89,7 +91,26 @@ class CanManageSchoolProfile(permissions.BasePermission):
             return request.user.is_authenticated
         
         # Check if user belongs to the school
-        if hasattr(request.user, 'school_staff'):
-            return (request.user.school_staff.school == obj and 
-                   request.user.user_type in ['SCHOOL_ADMIN', 'PRINCIPAL'])
-        return False
\ No newline at end of file
+        school_id = get_request_school_id(request)
+        return (school_id is not None and obj.pk == school_id and
+                request.user.user_type in ['SCHOOL_ADMIN', 'PRINCIPAL'])
+
+class IsProfileVerified(permissions.BasePermission):
+    """
+    API counterpart of ProfileCompletionCheckMiddleware: the JWT user must have
+    completed their profile and not be pending verification.
+    """
+
+    def has_permission(self, request, view):
+        from .middleware import PROFILE_INCOMPLETE_MESSAGE, PROFILE_PENDING_MESSAGE
+
+        user = request.user
+        if not user or not user.is_authenticated or user.is_superuser:
+            return True
+        if not user.profile_completed:
+            self.message = PROFILE_INCOMPLETE_MESSAGE
+            return False
+        if user.profile_verification_status == 'PENDING':
+            self.message = PROFILE_PENDING_MESSAGE
+            return False
+        return True
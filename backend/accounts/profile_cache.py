@@ -0,0 +1,119 @@
+"""
+Versioned cache of serialized user profiles.
+
+UserProfileSerializer output depends on the user row plus its teacher,
+student and staff profiles and the related school. The serialized result is
+cached per user id together with a strong ETag; signals in signals.py drop
+the user's version stamp whenever any of those rows is saved or deleted.
+"""
+import logging
+
+from django.core.cache import cache
+
+from .caching import conditional_response, drop_versions, get_version, make_etag
+
+logger = logging.getLogger(__name__)
+
+# Bump when UserProfileSerializer's output shape changes
+PROFILE_CACHE_SCHEMA = 1
+
+# Seconds a serialized profile stays cached without being invalidated
+PROFILE_CACHE_TIMEOUT = 60 * 60
+
+
+def _version_key(user_id):
+    return f"user:{user_id}:profile:version"
+
+
+def _payload_key(user_id, version):
+    return f"user:{user_id}:profile:v{PROFILE_CACHE_SCHEMA}:{version}"
+
+
+def _username_key(username):
+    return f"user:username:{username}:id"
+
+
+def profile_queryset():
+    """Users with every relation UserProfileSerializer touches joined in"""
+    from .models import User
+
+    return User.objects.select_related(
+        'teacher_profile__school',
+        'student_profile',
+        'school_staff__school',
+        'school_profile',
+    )
+
+
+def _build_profile(user_id):
+    from .serializers import UserProfileSerializer
+
+    user = profile_queryset().filter(id=user_id).first()
+    if user is None:
+        return None
+    data = dict(UserProfileSerializer(user).data)
+    return {'data': data, 'etag': make_etag(data)}
+
+
+def get_cached_profile(user_id):
+    """
+    Return {'data': ..., 'etag': ...} for a user id, or None if the user is gone.
+    Falls back to serializing from the database if the cache is unavailable.
+    """
+    try:
+        version = get_version(_version_key(user_id))
+        key = _payload_key(user_id, version)
+        entry = cache.get(key)
+        if entry is None:
+            entry = _build_profile(user_id)
+            if entry is not None:
+                cache.set(key, entry, PROFILE_CACHE_TIMEOUT)
+        return entry
+    except Exception as e:
+        logger.warning("Profile cache unavailable for %s: %s", user_id, e)
+        return _build_profile(user_id)
+
+
+def get_cached_profile_by_username(username):
+    """Resolve a username through a cached id mapping, then read the profile cache"""
+    from .models import User
+
+    try:
+        user_id = cache.get(_username_key(username))
+    except Exception as e:
+        logger.warning("Profile cache unavailable for %s: %s", username, e)
+        user_id = None
+    if user_id is not None:
+        entry = get_cached_profile(user_id)
+        # The mapping may outlive a username change; trust it only if it still matches
+        if entry is not None and entry['data'].get('username') == username:
+            return entry
+
+    user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+    if user_id is None:
+        return None
+    try:
+        cache.set(_username_key(username), user_id, PROFILE_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning("Profile cache unavailable for %s: %s", username, e)
+    return get_cached_profile(user_id)
+
+
+def profile_response(request, entry):
+    """200 with ETag, or 304 when the client already holds this version"""
+    return conditional_response(request, entry['data'], entry['etag'])
+
+
+def invalidate_profiles(user_ids):
+    """Drop cached profiles for the given users"""
+    drop_versions(_version_key(user_id) for user_id in user_ids if user_id)
+
+
+def invalidate_school_profiles(school_id):
+    """Drop cached profiles of every user whose profile embeds this school"""
+    from .models import School, SchoolStaff, TeacherProfile
+
+    user_ids = set(SchoolStaff.objects.filter(school_id=school_id).values_list('user_id', flat=True))
+    user_ids.update(TeacherProfile.objects.filter(school_id=school_id).values_list('user_id', flat=True))
+    user_ids.update(School.objects.filter(id=school_id).exclude(user=None).values_list('user_id', flat=True))
+    invalidate_profiles(user_ids)
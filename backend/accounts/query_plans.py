@@ -0,0 +1,47 @@
+"""
+Per-action query plans for ViewSets.
+
+Each app declares its plans in a query_plans.py module next to its views: a
+mapping from ViewSet action to the select_related/prefetch_related a
+serializer for that action needs. QueryPlanMixin applies the plan for the
+current action to whatever get_base_queryset() returns, so role filtering and
+join strategy stay separate and every action's joins live in one place.
+"""
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    select_related: tuple = ()
+    prefetch_related: tuple = ()
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+
+class QueryPlanMixin:
+    """
+    ViewSet mixin. `query_plans` maps action names to QueryPlan; the 'default'
+    entry covers actions without their own plan.
+    """
+    query_plans = {}
+
+    def get_query_plan(self, action=None):
+        action = action or getattr(self, 'action', None)
+        return self.query_plans.get(action) or self.query_plans.get('default')
+
+    def plan_queryset(self, queryset, action=None):
+        """Apply the plan for `action` (default: the current one) to a queryset"""
+        plan = self.get_query_plan(action)
+        return plan.apply(queryset) if plan else queryset
+
+    def get_base_queryset(self):
+        """Rows the user may see; override instead of get_queryset()"""
+        return super().get_queryset()
+
+    def get_queryset(self):
+        return self.plan_queryset(self.get_base_queryset())
@@ -0,0 +1,342 @@
+"""
+Synthetic schools, staff, teachers, students and availability.
+
+Used by the create_sample_data command and by the API benchmarks. The
+default scale reproduces the original fixed dataset (10 schools, one admin,
+principal and internal teacher each, 10 external teachers, 10 students per
+school and 5 days of availability).
+
+The data is generated in units (one school with its staff, teachers and
+students, or a slice of external teachers) written with bulk_create in
+chunks. Units can run in parallel worker processes. Each unit draws from its
+own random stream derived from the seed and the unit, and ids come from
+those streams too, so a seed gives the same dataset with any worker count.
+Password hashes are computed once per user type and shared.
+
+bulk_create skips model signals, so what they would maintain is set
+directly: User.school, and the school directory cache is invalidated once
+at the end.
+"""
+import multiprocessing
+import random
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import time, timedelta
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .models import School, SchoolStaff, StudentProfile, TeacherAvailability, TeacherProfile
+
+User = get_user_model()
+
+SCHOOL_NAMES = [
+    "Delhi Public School", "St. Mary's School", "Modern School",
+    "Kendriya Vidyalaya", "Army Public School", "Ryan International",
+    "DAV Public School", "Cambridge International", "Oxford Public School",
+    "Heritage School"
+]
+SUBJECTS_POOL = ["MATHS", "PHYSICS", "CHEMISTRY", "BIOLOGY", "ENGLISH", "HISTORY", "GEOGRAPHY", "COMPUTER"]
+QUALIFICATIONS_POOL = ["BTECH", "MCA", "MSC", "MA", "PHD"]
+LANGUAGES_POOL = ["English", "Hindi", "Sanskrit", "French", "German"]
+GRADES = ["9", "10", "11", "12"]
+SECTIONS = ["A", "B", "C"]
+
+# Eight one-hour slots from 9:00
+TIME_SLOTS = [(time(hour, 0), time(hour + 1, 0)) for hour in range(9, 17)]
+
+PASSWORDS = {
+    'SCHOOL_ADMIN': 'admin123',
+    'PRINCIPAL': 'principal123',
+    'INTERNAL_TEACHER': 'teacher123',
+    'EXTERNAL_TEACHER': 'external123',
+    'STUDENT': 'student123',
+}
+
+# Rows per INSERT
+BULK_BATCH_SIZE = 5000
+
+# External teachers per unit of work
+EXTERNAL_TEACHERS_PER_UNIT = 1000
+
+
+@dataclass(frozen=True)
+class SampleDataScale:
+    schools: int = 10
+    teachers_per_school: int = 1
+    external_teachers: int = 10
+    students_per_school: int = 10
+    availability_days: int = 5
+
+
+def school_name(index):
+    """Names cycle through SCHOOL_NAMES, numbered once they repeat"""
+    name = SCHOOL_NAMES[index % len(SCHOOL_NAMES)]
+    return name if index < len(SCHOOL_NAMES) else f"{name} {index // len(SCHOOL_NAMES) + 1}"
+
+
+def password_hashes():
+    """One hash per sample password; every user of a type shares it"""
+    return {user_type: make_password(password) for user_type, password in PASSWORDS.items()}
+
+
+class SampleDataGenerator:
+    """
+    Creates a dataset of the given SampleDataScale. Usernames follow the
+    original command (admin1, principal1, teacher1, external1, student_1...),
+    so the numbering continues across schools.
+    """
+
+    def __init__(self, scale=None, seed=None, batch_size=BULK_BATCH_SIZE, hashes=None, today=None):
+        self.scale = scale or SampleDataScale()
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.batch_size = batch_size
+        self.hashes = hashes
+        self.today = today or timezone.now().date()
+        self.counts = {}
+
+    def rng(self, *unit):
+        """Random stream of one unit of work, independent of execution order"""
+        return random.Random(':'.join(str(part) for part in (self.seed, *unit)))
+
+    @staticmethod
+    def make_id(rng):
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+    def generate(self, workers=1):
+        if self.hashes is None:
+            self.hashes = password_hashes()
+        schools = self.create_schools()
+        units = self.units(schools)
+
+        if workers <= 1:
+            for unit in units:
+                self.add_counts(self.run_unit(unit))
+        else:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+                options = (self.scale, self.seed, self.batch_size, self.hashes, self.today)
+                for counts in pool.map(_run_unit, [(options, unit) for unit in units]):
+                    self.add_counts(counts)
+
+        from .school_directory import invalidate_directory
+        transaction.on_commit(invalidate_directory)
+        return schools
+
+    def units(self, schools):
+        units = [('school', index, str(school.id)) for index, school in enumerate(schools)]
+        for start in range(0, self.scale.external_teachers, EXTERNAL_TEACHERS_PER_UNIT):
+            units.append(('external', start, min(start + EXTERNAL_TEACHERS_PER_UNIT, self.scale.external_teachers)))
+        return units
+
+    def add_counts(self, counts):
+        for model, count in counts.items():
+            self.counts[model] = self.counts.get(model, 0) + count
+
+    def run_unit(self, unit):
+        kind, *args = unit
+        self.unit_counts = {}
+        with transaction.atomic():
+            if kind == 'school':
+                self.populate_school(*args)
+            else:
+                self.populate_external_teachers(*args)
+        return self.unit_counts
+
+    def bulk_create(self, model, objs):
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.unit_counts[model.__name__] = self.unit_counts.get(model.__name__, 0) + len(objs)
+
+    def create_schools(self):
+        rng = self.rng('schools')
+        schools = []
+        for i in range(self.scale.schools):
+            name = school_name(i)
+            schools.append(School(
+                id=self.make_id(rng),
+                school_name=name,
+                category="SECONDARY",
+                address=f"{i+1} Education Street",
+                city="New Delhi",
+                state="Delhi",
+                country="India",
+                postal_code=f"11{i+1:04d}",
+                website=f"https://www.{name.lower().replace(' ', '')}.edu",
+                contact_person=f"Principal {i+1}",
+                board_type="CBSE",
+                registration_number=f"SCH{i+1}2024",
+                established_year=1972 + i % 50,
+                subscription_status="STANDARD",
+                matching_algorithm_settings={
+                    "experience_weight": 0.3,
+                    "rating_weight": 0.4,
+                    "distance_weight": 0.3
+                }
+            ))
+        School.objects.bulk_create(schools, batch_size=self.batch_size)
+        self.counts['School'] = len(schools)
+        return schools
+
+    def user(self, rng, user_type, username, email, phone_number, school_id=None):
+        return User(
+            id=self.make_id(rng),
+            username=username,
+            email=email,
+            password=self.hashes[user_type],
+            user_type=user_type,
+            phone_number=phone_number,
+            school_id=school_id,
+            profile_verification_status="VERIFIED",
+            profile_completed=True
+        )
+
+    def populate_school(self, index, school_id):
+        rng = self.rng('school', index)
+        users, staff = [], []
+        for user_type, prefix, role, department, code, phone in (
+            ("SCHOOL_ADMIN", "admin", "ADMIN", "Administration", "ADM", "98765"),
+            ("PRINCIPAL", "principal", "PRINCIPAL", "Management", "PRI", "98766"),
+        ):
+            user = self.user(
+                rng, user_type, f"{prefix}{index+1}", f"{prefix}{index+1}@school.edu",
+                f"{phone}{index:05d}", school_id
+            )
+            users.append(user)
+            staff.append(SchoolStaff(
+                user=user,
+                school_id=school_id,
+                role=role,
+                department=department,
+                employee_id=f"{code}{index+1:03d}",
+                joining_date=self.today
+            ))
+
+        teachers = []
+        first = index * self.scale.teachers_per_school + 1
+        for counter in range(first, first + self.scale.teachers_per_school):
+            user = self.user(
+                rng, "INTERNAL_TEACHER", f"teacher{counter}", f"teacher{counter}@school.edu",
+                f"98767{counter:05d}", school_id
+            )
+            users.append(user)
+            teachers.append(TeacherProfile(
+                user=user,
+                school_id=school_id,
+                availability_status="AVAILABLE",
+                can_teach_online=True,
+                **self.teacher_profile_fields(rng, external=False)
+            ))
+
+        students = []
+        school_identifier = school_id[:4]
+        first = index * self.scale.students_per_school + 1
+        for counter in range(first, first + self.scale.students_per_school):
+            user = self.user(
+                rng, "STUDENT", f"student_{counter}", f"student{counter}@{school_identifier}.edu",
+                f"98769{counter:05d}", school_id
+            )
+            users.append(user)
+            students.append(StudentProfile(
+                user=user,
+                school_id=school_id,
+                grade=rng.choice(GRADES),
+                section=rng.choice(SECTIONS),
+                roll_number=f"{rng.choice(GRADES)}{rng.choice(SECTIONS)}{counter:03d}",
+                parent_name=f"Parent {counter}",
+                parent_phone=f"98770{counter:05d}",
+                parent_email=f"parent{counter}@{school_identifier}.edu",
+                date_of_birth=self.today - timedelta(days=365 * rng.randint(14, 18))
+            ))
+
+        self.bulk_create(User, users)
+        self.bulk_create(SchoolStaff, staff)
+        self.bulk_create(TeacherProfile, teachers)
+        self.bulk_create(StudentProfile, students)
+        self.create_availability(rng, teachers)
+
+    def populate_external_teachers(self, start, stop):
+        rng = self.rng('external', start)
+        users, teachers = [], []
+        for i in range(start, stop):
+            user = self.user(
+                rng, "EXTERNAL_TEACHER", f"external{i+1}", f"external{i+1}@teacher.com", f"98768{i:05d}"
+            )
+            users.append(user)
+            teachers.append(TeacherProfile(
+                user=user,
+                availability_status="AVAILABLE",
+                can_teach_online=True,
+                **self.teacher_profile_fields(rng, external=True)
+            ))
+        self.bulk_create(User, users)
+        self.bulk_create(TeacherProfile, teachers)
+        self.create_availability(rng, teachers)
+
+    def teacher_profile_fields(self, rng, external):
+        if external:
+            return dict(
+                teacher_type="EXTERNAL",
+                experience_years=rng.randint(5, 20),
+                preferred_classes=["9", "10", "11", "12"],
+                preferred_boards=["CBSE", "ICSE", "IB"],
+                teaching_methodology="Focus on conceptual learning",
+                hourly_rate=rng.randint(1000, 2000),
+                languages=rng.sample(LANGUAGES_POOL, 3),
+                can_travel=bool(rng.getrandbits(1)),
+                qualification=rng.sample(QUALIFICATIONS_POOL, 2),
+                subjects=rng.sample(SUBJECTS_POOL, 3),
+                rating=round(rng.uniform(3.5, 5.0), 1),
+            )
+        return dict(
+            teacher_type="INTERNAL",
+            experience_years=rng.randint(2, 15),
+            preferred_classes=["11", "12"],
+            preferred_boards=["CBSE", "ICSE"],
+            teaching_methodology="Interactive and practical approach",
+            hourly_rate=rng.randint(800, 1500),
+            languages=rng.sample(LANGUAGES_POOL, 2),
+            can_travel=True,
+            qualification=rng.sample(QUALIFICATIONS_POOL, 2),
+            subjects=rng.sample(SUBJECTS_POOL, 3),
+            rating=round(rng.uniform(3.5, 5.0), 1),
+        )
+
+    def create_availability(self, rng, profiles):
+        """One slot per teacher per day, starting today, flushed in chunks"""
+        dates = [self.today + timedelta(days=day) for day in range(self.scale.availability_days)]
+        rows = []
+        for profile in profiles:
+            preferred_subjects = profile.subjects[:2]
+            for date in dates:
+                start_time, end_time = rng.choice(TIME_SLOTS)
+                rows.append(TeacherAvailability(
+                    teacher_id=profile.user_id,
+                    date=date,
+                    start_time=start_time,
+                    end_time=end_time,
+                    is_recurring=True,
+                    recurrence_pattern="WEEKLY",
+                    status="AVAILABLE",
+                    preferred_subjects=preferred_subjects
+                ))
+            if len(rows) >= self.batch_size:
+                self.bulk_create(TeacherAvailability, rows)
+                rows = []
+        if rows:
+            self.bulk_create(TeacherAvailability, rows)
+
+
+def _run_unit(args):
+    """Worker entry point; runs in a spawned process after django.setup()"""
+    (scale, seed, batch_size, hashes, today), unit = args
+    generator = SampleDataGenerator(scale, seed, batch_size=batch_size, hashes=hashes, today=today)
+    return generator.run_unit(unit)
+
+
+def generate_sample_data(scale=None, seed=None, workers=1, batch_size=BULK_BATCH_SIZE):
+    """Create a dataset and return its schools"""
+    return SampleDataGenerator(scale, seed, batch_size=batch_size).generate(workers)
@@ -0,0 +1,72 @@
+"""
+Cached, searchable school directory for the signup form.
+
+Pages are cached per (search, page, page size) under a single version stamp
+that any School save or delete bumps, so edits show up immediately while the
+common unfiltered and short-prefix lookups are served from Redis.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .caching import bump_version, get_version, make_etag
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_VERSION_KEY = "schools:directory:version"
+
+# Seconds a directory page stays cached without being invalidated
+DIRECTORY_CACHE_TIMEOUT = 60 * 60
+
+# Longer search terms are cut; a prefix this long is already very selective
+MAX_SEARCH_LENGTH = 64
+
+
+def normalize_search(term):
+    return (term or '').strip().lower()[:MAX_SEARCH_LENGTH]
+
+
+def directory_queryset(search=''):
+    """Schools whose name or city starts with `search` (case-insensitive)"""
+    from .models import School
+
+    queryset = School.objects.only(
+        'id', 'school_name', 'city', 'state', 'category', 'board_type'
+    ).order_by('school_name', 'id')
+    if search:
+        # Served by the Upper(...) pattern-ops indexes on School
+        queryset = queryset.filter(Q(school_name__istartswith=search) | Q(city__istartswith=search))
+    return queryset
+
+
+def _page_key(version, search, page, page_size):
+    return f"schools:directory:{version}:{page_size}:{page}:{search}"
+
+
+def get_directory_page(search, page, page_size, build):
+    """
+    Return {'data': ..., 'etag': ...} for one directory page. `build` produces
+    the paginated response data on a cache miss.
+    """
+    try:
+        key = _page_key(get_version(DIRECTORY_VERSION_KEY), search, page, page_size)
+        entry = cache.get(key)
+    except Exception as e:
+        logger.warning("School directory cache unavailable: %s", e)
+        key = entry = None
+
+    if entry is None:
+        # build() may raise NotFound for an out-of-range page; let it through
+        data = build()
+        entry = {'data': data, 'etag': make_etag(data)}
+        if key is not None:
+            try:
+                cache.set(key, entry, DIRECTORY_CACHE_TIMEOUT)
+            except Exception as e:
+                logger.warning("School directory cache unavailable: %s", e)
+    return entry
+
+
+def invalidate_directory():
+    bump_version(DIRECTORY_VERSION_KEY)
@@ -1,14 +1,20 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, smart_str, DjangoUnicodeDecodeError
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from .algorithm_settings import RANKINGS
 from .models import TeacherProfile, StudentProfile, SchoolStaff, TeacherAvailability
 from .utils import send_email
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import TeacherProfile, StudentProfile, SchoolStaff, User, TeacherAvailability, School
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import add_profile_claims
+from .verification import BULK_VERIFICATION_LIMIT
 from rest_framework import exceptions
 from django.utils import timezone
 
@@ -26,15 +32,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     confirm_password = serializers.CharField(write_only=True)
     user_type = serializers.ChoiceField(choices=USER_TYPE_CHOICES, write_only=True)
     phone_number = serializers.CharField(required=False)
-    school_name = serializers.ChoiceField(choices=[], required=False)
+    # School id, as listed by the school directory endpoint
+    school_name = serializers.UUIDField(required=False)
 
     class Meta:
         model = User
         fields = ('email', 'username', 'password', 'confirm_password', 'user_type', 'phone_number', 'school_name')
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fields['school_name'].choices = [(school.id, school.school_name) for school in School.objects.all()]
+    def validate_school_name(self, value):
+        if not School.objects.filter(id=value).exists():
+            raise serializers.ValidationError("Select a valid school.")
+        return value
 
     def validate(self, attrs):
         if attrs['password'] != attrs.pop('confirm_password'):
@@ -64,27 +72,28 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         user.save()
 
         if user.user_type != 'EXTERNAL_TEACHER' and school_id:
-            school = School.objects.get(id=school_id)
+            # Existence was checked in validate_school_name; no need to load the row
             if user.user_type == 'SCHOOL_ADMIN':
-                if SchoolStaff.objects.filter(school=school, role='ADMIN').exists():
+                if SchoolStaff.objects.filter(school_id=school_id, role='ADMIN').exists():
                     raise serializers.ValidationError("This school already has an assigned school administrator.")
-                SchoolStaff.objects.create(user=user, school=school, role='ADMIN')
+                SchoolStaff.objects.create(user=user, school_id=school_id, role='ADMIN')
             elif user.user_type == 'PRINCIPAL':
-                if SchoolStaff.objects.filter(school=school, role='PRINCIPAL').exists():
+                if SchoolStaff.objects.filter(school_id=school_id, role='PRINCIPAL').exists():
                     raise serializers.ValidationError("This school already has an assigned principal.")
-                SchoolStaff.objects.create(user=user, school=school, role='PRINCIPAL')
+                SchoolStaff.objects.create(user=user, school_id=school_id, role='PRINCIPAL')
             elif user.user_type == 'INTERNAL_TEACHER':
                 # Create both TeacherProfile and SchoolStaff entries
-                TeacherProfile.objects.create(user=user, school=school, teacher_type='INTERNAL')
-                SchoolStaff.objects.create(user=user, school=school, role='TEACHER')
+                TeacherProfile.objects.create(user=user, school_id=school_id, teacher_type='INTERNAL')
+                SchoolStaff.objects.create(user=user, school_id=school_id, role='TEACHER')
             elif user.user_type == 'STUDENT':
-                StudentProfile.objects.create(user=user, school=school)
+                StudentProfile.objects.create(user=user, school_id=school_id)
 
         return user
     
 class AlgorithmSettingsSerializer(serializers.Serializer):
     batch_size = serializers.IntegerField(min_value=1, max_value=50)
     wait_time_minutes = serializers.IntegerField(min_value=1, max_value=60)
+    ranking = serializers.ChoiceField(choices=RANKINGS, required=False)
     weights = serializers.DictField(
         child=serializers.DictField(
             child=serializers.FloatField(min_value=0.1, max_value=10.0)
@@ -122,9 +131,79 @@ class ProfileVerificationSerializer(serializers.ModelSerializer):
         return instance
 
 
+class BulkVerificationSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=BULK_VERIFICATION_LIMIT
+    )
+    profile_verification_status = serializers.ChoiceField(choices=['VERIFIED', 'REJECTED'])
+    verification_notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, data):
+        if data['profile_verification_status'] == 'REJECTED' and not data.get('verification_notes'):
+            raise serializers.ValidationError({
+                "verification_notes": "Verification notes are required when rejecting a profile"
+            })
+        return data
+
+
+class SchoolDirectorySerializer(serializers.ModelSerializer):
+    """Public listing entry used by the signup form's school picker"""
+
+    class Meta:
+        model = School
+        fields = ['id', 'school_name', 'city', 'state', 'category', 'board_type']
+
+
+class DelimitedListField(serializers.ListField):
+    """List given as one CSV cell, e.g. "Maths; Physics" """
+    child = serializers.CharField()
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [item.strip() for item in data.split(';') if item.strip()]
+        return super().to_internal_value(data)
+
+
+class BulkUserRowSerializer(serializers.Serializer):
+    """One row of a bulk user import; see accounts.onboarding"""
+    email = serializers.EmailField(max_length=254)
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    password = serializers.CharField(required=False, write_only=True)
+    user_type = serializers.ChoiceField(choices=['STUDENT', 'INTERNAL_TEACHER'])
+    first_name = serializers.CharField(max_length=150, required=False)
+    last_name = serializers.CharField(max_length=150, required=False)
+    phone_number = serializers.CharField(max_length=15, required=False)
+
+    # Student profile
+    grade = serializers.ChoiceField(choices=StudentProfile.GRADE_CHOICES, required=False)
+    section = serializers.ChoiceField(choices=StudentProfile.SECTION, required=False)
+    roll_number = serializers.CharField(max_length=20, required=False)
+    parent_name = serializers.CharField(max_length=255, required=False)
+    parent_phone = serializers.CharField(max_length=15, required=False)
+    parent_email = serializers.EmailField(required=False)
+    date_of_birth = serializers.DateField(required=False)
+
+    # Teacher profile
+    qualification = serializers.CharField(required=False)
+    subjects = DelimitedListField(required=False)
+    experience_years = serializers.IntegerField(min_value=0, required=False)
+    preferred_classes = DelimitedListField(required=False)
+    languages = DelimitedListField(required=False)
+
+    def validate_email(self, value):
+        return User.objects.normalize_email(value)
+
+
 class UserLoginSerializer(TokenObtainPairSerializer):
     username_field = User.USERNAME_FIELD
 
+    @classmethod
+    def get_token(cls, user):
+        # Profile claims let ClaimsJWTAuthentication skip the per-request user lookup
+        return add_profile_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         try:
             data = super().validate(attrs)
@@ -149,6 +228,20 @@ class UserLoginSerializer(TokenObtainPairSerializer):
         return data
 
 
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh that re-reads the user so the new access token carries current claims"""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        try:
+            add_profile_claims(access, User(pk=access[api_settings.USER_ID_CLAIM]))
+        except User.DoesNotExist:
+            raise exceptions.AuthenticationFailed("User not found", code="user_not_found")
+        data['access'] = str(access)
+        return data
+
+
 class SendPasswordResetEmailSerializer(serializers.Serializer):
     email = serializers.EmailField(max_length=255)
 
@@ -270,16 +363,23 @@ class UserProfileSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         user_type = instance.user_type
 
+        # The nested fields above already serialized these profiles; reuse them
+        # instead of running the same serializers a second time.
         if user_type in ['INTERNAL_TEACHER', 'EXTERNAL_TEACHER']:
             teacher_profile = instance.teacher_profile
             if user_type == 'INTERNAL_TEACHER':
                 school_data = SchoolProfileSerializer(teacher_profile.school).data
                 representation.update(school_data)
-            representation.update(TeacherProfileSerializer(teacher_profile).data)
-        
+            teacher_data = representation.get('teacher_profile')
+            if teacher_data is None:
+                teacher_data = TeacherProfileSerializer(teacher_profile).data
+            representation.update(teacher_data)
+
         elif user_type == 'STUDENT':
-            student_profile = instance.student_profile
-            representation.update(StudentProfileSerializer(student_profile).data)
+            student_data = representation.get('student_profile')
+            if student_data is None:
+                student_data = StudentProfileSerializer(instance.student_profile).data
+            representation.update(student_data)
         
         elif user_type in ['SCHOOL_ADMIN', 'PRINCIPAL']:
             admin_profile = instance.school_staff
@@ -1,8 +1,115 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from .models import School
+from .models import School, User, TeacherProfile, StudentProfile, SchoolStaff
+from .algorithm_settings import invalidate_algorithm_settings
+from .profile_cache import invalidate_profiles, invalidate_school_profiles
+from .authentication import PROFILE_CLAIMS, invalidate_claims
+from .verification import sync_user_school
+from .school_directory import invalidate_directory
+
+# User columns behind the JWT profile claims; is_active gates ClaimsUser too
+PROFILE_CLAIMS_FIELDS = frozenset(PROFILE_CLAIMS) | {'school', 'is_active'}
+
+
+@receiver(post_save, sender=School)
+def invalidate_school_algorithm_settings(sender, instance, update_fields=None, **kwargs):
+    """
+    Signal handler that drops the memoized matching settings when they may have changed
+    """
+    if update_fields is None or 'matching_algorithm_settings' in update_fields:
+        # Wait for commit so a concurrent reader can't re-cache the old row
+        transaction.on_commit(lambda: invalidate_algorithm_settings(instance.pk))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_profile_cache(sender, instance, **kwargs):
+    """
+    Signal handler that drops a user's cached profile when the user row changes
+    """
+    transaction.on_commit(lambda: invalidate_profiles([instance.pk]))
+
+
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_delete, sender=TeacherProfile)
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_save, sender=SchoolStaff)
+@receiver(post_delete, sender=SchoolStaff)
+def invalidate_owner_profile_cache(sender, instance, **kwargs):
+    """
+    Signal handler that drops the owning user's cached profile when a profile row changes
+    """
+    transaction.on_commit(lambda: invalidate_profiles([instance.user_id]))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_claims(sender, instance, update_fields=None, **kwargs):
+    """
+    Signal handler that marks outstanding token claims stale when a claimed field may have changed
+    """
+    if update_fields is None or not PROFILE_CLAIMS_FIELDS.isdisjoint(update_fields):
+        transaction.on_commit(lambda: invalidate_claims([instance.pk]))
+
+
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_delete, sender=TeacherProfile)
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_save, sender=SchoolStaff)
+@receiver(post_delete, sender=SchoolStaff)
+def invalidate_owner_claims(sender, instance, **kwargs):
+    """
+    Signal handler that marks the owning user's token claims stale (school id, staff role)
+    """
+    transaction.on_commit(lambda: invalidate_claims([instance.user_id]))
+
+
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_delete, sender=TeacherProfile)
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_save, sender=SchoolStaff)
+@receiver(post_delete, sender=SchoolStaff)
+def sync_owner_school(sender, instance, **kwargs):
+    """
+    Signal handler that keeps the denormalized User.school in step with the profile rows
+    """
+    sync_user_school(instance.user_id)
+
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def sync_school_owner(sender, instance, **kwargs):
+    """
+    Signal handler that keeps User.school set for the user who owns a school
+    """
+    if not instance.user_id:
+        return
+    changed = sync_user_school(instance.user_id)
+    if changed or kwargs['signal'] is post_delete:
+        transaction.on_commit(lambda: invalidate_claims([instance.user_id]))
+
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def invalidate_school_directory(sender, instance, **kwargs):
+    """
+    Signal handler that drops cached school directory pages
+    """
+    transaction.on_commit(invalidate_directory)
+
+
+@receiver(post_save, sender=School)
+def invalidate_school_profile_cache(sender, instance, **kwargs):
+    """
+    Signal handler that drops cached profiles embedding this school's details
+    """
+    transaction.on_commit(lambda: invalidate_school_profiles(instance.pk))
 
 @receiver(post_save, sender=School)
 def notify_school_profile_update(sender, instance, **kwargs):
@@ -0,0 +1,53 @@
+"""
+Query-count guards for tests and benchmarks.
+
+    with assert_max_queries(4):
+        client.get('/api/substitute-requests/')
+
+    response = assert_endpoint_queries(client, '/api/teaching-sessions/sessions/', 5)
+
+The failure message lists every captured statement, so an N+1 regression
+shows up in CI output together with the query that repeats.
+
+jwt_client() logs in through /api/login/ as the frontend does, so requests
+authenticate from the token's claims and the budgets match production.
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+
+def format_queries(captured):
+    return "\n".join(
+        f"{index}. {query['sql']}" for index, query in enumerate(captured.captured_queries, start=1)
+    )
+
+
+@contextmanager
+def assert_max_queries(limit, using=DEFAULT_DB_ALIAS):
+    """Fail if the block runs more than `limit` queries on `using`"""
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    if len(captured) > limit:
+        raise AssertionError(
+            f"{len(captured)} queries executed, at most {limit} expected:\n{format_queries(captured)}"
+        )
+
+
+def assert_endpoint_queries(client, path, limit, method='get', **kwargs):
+    """Call `path` with a test client inside assert_max_queries; returns the response"""
+    with assert_max_queries(limit):
+        response = getattr(client, method)(path, **kwargs)
+    return response
+
+
+def jwt_client(email, password):
+    """An APIClient sending the access token of a fresh login as email"""
+    client = APIClient()
+    response = client.post('/api/login/', {'email': email, 'password': password}, format='json')
+    if response.status_code != 200:
+        raise AssertionError(f"Login as {email} failed: {response.data}")
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+    return client
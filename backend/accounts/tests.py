@@ -1,3 +1,371 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import algorithm_settings
+from .authentication import ClaimsJWTAuthentication, ClaimsUser
+from .models import School, SchoolStaff, StudentProfile, TeacherProfile, User
+from .onboarding import ImportFileError, UserImporter, iter_csv_rows, read_csv_rows
+from .profile_cache import get_cached_profile
+from .sample_data import SampleDataScale, generate_sample_data
+from .testing import jwt_client
+
+HEADER = 'email,username,password,user_type,first_name,grade,section'
+
+
+def access_token(email, password):
+    """A validated access token from a fresh login as email"""
+    response = APIClient().post('/api/login/', {'email': email, 'password': password}, format='json')
+    return ClaimsJWTAuthentication().get_validated_token(response.data['access'])
+
+
+def authenticated_user(token):
+    return ClaimsJWTAuthentication().get_user(token)
+
+
+def csv_stream(*rows, header=HEADER):
+    return io.StringIO('\n'.join((header,) + rows) + '\n')
+
+
+class CsvRowsTests(TestCase):
+    def test_missing_required_column(self):
+        with self.assertRaisesMessage(ImportFileError, 'username'):
+            list(iter_csv_rows(csv_stream('a@x.com', header='email')))
+
+    def test_empty_file(self):
+        with self.assertRaises(ImportFileError):
+            list(iter_csv_rows(io.StringIO('')))
+
+    def test_headers_normalized_and_blank_cells_dropped(self):
+        rows = list(iter_csv_rows(csv_stream(' a@x.com ,alice,,STUDENT,,,', header=' Email ,USERNAME,password,user_type,first_name,grade,section')))
+        self.assertEqual(rows, [(2, {'email': 'a@x.com', 'username': 'alice', 'user_type': 'STUDENT'})])
+
+    def test_row_cap(self):
+        rows = [f'u{i}@x.com,u{i},,STUDENT,,,' for i in range(3)]
+        self.assertEqual(len(read_csv_rows(csv_stream(*rows), 3)), 3)
+        with self.assertRaisesMessage(ImportFileError, 'more than 2 rows'):
+            read_csv_rows(csv_stream(*rows), 2)
+
+
+class UserImporterTests(TestCase):
+    """Rows are validated and written per chunk; problems are reported per CSV line"""
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=1, students_per_school=1, availability_days=0,
+        )
+        cls.school = generate_sample_data(scale, seed=32)[0]
+
+    def run_import(self, *rows, **options):
+        options.setdefault('hash_workers', 1)
+        return UserImporter(self.school, chunk_size=2, **options).run(iter_csv_rows(csv_stream(*rows)))
+
+    def test_creates_users_and_profiles(self):
+        report = self.run_import(
+            'ann@x.com,ann,Secret123!,STUDENT,Ann,10,A',
+            'tom@x.com,tom,,INTERNAL_TEACHER,Tom,,',
+            'eve@x.com,eve,Secret123!,STUDENT,Eve,9,B',
+        )
+        self.assertEqual((report['total_rows'], report['created'], report['failed']), (3, 3, 0))
+        ann = User.objects.get(username='ann')
+        self.assertEqual(ann.school_id, self.school.id)
+        self.assertTrue(ann.check_password('Secret123!'))
+        self.assertEqual(StudentProfile.objects.get(user=ann).grade, '10')
+        tom = User.objects.get(username='tom')
+        self.assertFalse(tom.has_usable_password())
+        self.assertEqual(TeacherProfile.objects.get(user=tom).teacher_type, 'INTERNAL')
+
+    def test_duplicates_in_the_file(self):
+        report = self.run_import(
+            'ann@x.com,ann,,STUDENT,,,',
+            'ann@x.com,ann2,,STUDENT,,,',
+            'bob@x.com,ann,,STUDENT,,,',
+        )
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([(error['row'], list(error['errors'])) for error in report['errors']], [
+            (3, ['email']), (4, ['username']),
+        ])
+
+    def test_duplicates_of_existing_users(self):
+        existing = User.objects.get(username='admin1')
+        report = self.run_import(
+            f'{existing.email},fresh,,STUDENT,,,',
+            'fresh@x.com,admin1,,STUDENT,,,',
+        )
+        self.assertEqual(report['created'], 0)
+        self.assertEqual([error['errors'] for error in report['errors']], [
+            {'email': ["A user with this email already exists"]},
+            {'username': ["A user with this username already exists"]},
+        ])
+
+    def test_errors_name_the_line_and_keep_the_rest(self):
+        report = self.run_import(
+            'ann@x.com,ann,,STUDENT,,10,A',
+            'not-an-email,bob,,STUDENT,,,',
+            'cy@x.com,cy,,STUDENT,,13,A',
+            'dee@x.com,dee,,,,,',
+        )
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([(error['row'], error['email'], list(error['errors'])) for error in report['errors']], [
+            (3, 'not-an-email', ['email']), (4, 'cy@x.com', ['grade']), (5, 'dee@x.com', ['user_type']),
+        ])
+        self.assertTrue(User.objects.filter(username='ann').exists())
+
+    def test_default_user_type(self):
+        report = self.run_import('ann@x.com,ann,,,,,', default_user_type='STUDENT')
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(User.objects.get(username='ann').user_type, 'STUDENT')
+
+    def test_dry_run_writes_nothing(self):
+        users = User.objects.count()
+        report = self.run_import('ann@x.com,ann,,STUDENT,,,', 'ann@x.com,bob,,STUDENT,,,', dry_run=True)
+        self.assertEqual((report['created'], report['failed'], report['dry_run']), (1, 1, True))
+        self.assertEqual(User.objects.count(), users)
+
+
+@override_settings(BULK_IMPORT_MAX_ROWS=2)
+class BulkUserImportViewTests(TestCase):
+    path = '/api/users/bulk-import/?user_type=STUDENT'
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=1, students_per_school=1, availability_days=0,
+        )
+        cls.school = generate_sample_data(scale, seed=32)[0]
+
+    def upload(self, client, *rows):
+        content = csv_stream(*rows, header='email,username').getvalue().encode()
+        return client.post(self.path, {'file': SimpleUploadedFile('users.csv', content)}, format='multipart')
+
+    def test_imports_into_the_callers_school(self):
+        response = self.upload(jwt_client('admin1@school.edu', 'admin123'), 'ann@x.com,ann', 'bob@x.com,bob')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(User.objects.get(username='ann').school_id, self.school.id)
+
+    def test_files_over_the_cap_write_nothing(self):
+        response = self.upload(
+            jwt_client('admin1@school.edu', 'admin123'), 'ann@x.com,ann', 'bob@x.com,bob', 'cy@x.com,cy',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('import_users', response.data['error'])
+        self.assertFalse(User.objects.filter(username__in=['ann', 'bob', 'cy']).exists())
+
+    def test_unverified_principal_is_refused(self):
+        principal = User.objects.get(username='principal1')
+        User.objects.filter(pk=principal.pk).update(profile_verification_status='PENDING')
+        response = self.upload(jwt_client(principal.email, 'principal123'), 'ann@x.com,ann')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(User.objects.filter(username='ann').exists())
+
+
+class BulkVerificationTests(TestCase):
+    """Bulk decisions update users with one UPDATE, so caches are dropped explicitly"""
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=2, teachers_per_school=1, external_teachers=1, students_per_school=1, availability_days=0,
+        )
+        generate_sample_data(scale, seed=31)
+        User.objects.filter(username__in=['teacher1', 'teacher2']).update(
+            profile_completed=True, profile_verification_status='PENDING',
+        )
+        cls.teacher = User.objects.get(username='teacher1')
+
+    def decide(self, user_ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            return jwt_client('admin1@school.edu', 'admin123').post(
+                '/api/profiles/pending-verification/bulk/',
+                {'user_ids': [str(user_id) for user_id in user_ids], 'profile_verification_status': 'VERIFIED'},
+                format='json',
+            )
+
+    def test_decision_drops_cached_profile_and_token_claims(self):
+        token = access_token('teacher1@school.edu', 'teacher123')
+        self.assertIs(type(authenticated_user(token)), ClaimsUser)
+        self.assertEqual(get_cached_profile(self.teacher.id)['data']['profile_verification_status'], 'PENDING')
+
+        response = self.decide([self.teacher.id])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [str(self.teacher.id)])
+        self.assertEqual(get_cached_profile(self.teacher.id)['data']['profile_verification_status'], 'VERIFIED')
+        user = authenticated_user(token)
+        self.assertIs(type(user), User)
+        self.assertEqual(user.profile_verification_status, 'VERIFIED')
+
+    def test_other_schools_users_are_skipped(self):
+        other = User.objects.get(username='teacher2')
+        response = self.decide([self.teacher.id, other.id])
+
+        self.assertEqual(response.data['skipped'], [str(other.id)])
+        other.refresh_from_db()
+        self.assertEqual(other.profile_verification_status, 'PENDING')
+
+
+class ClaimsAuthenticationTests(TestCase):
+    """
+    A token's claims stand in for the user row only while the user's claims
+    version is unchanged; any change to a claimed field falls back to the database
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=2, teachers_per_school=1, external_teachers=1, students_per_school=1, availability_days=0,
+        )
+        cls.schools = generate_sample_data(scale, seed=30)
+        cls.principal = User.objects.get(username='principal1')
+
+    def setUp(self):
+        self.token = access_token('principal1@school.edu', 'principal123')
+
+    def assert_stale(self):
+        user = authenticated_user(self.token)
+        self.assertIs(type(user), User)
+        return user
+
+    def test_current_claims_skip_the_user_lookup(self):
+        with self.assertNumQueries(0):
+            user = authenticated_user(self.token)
+            self.assertEqual(
+                (user.user_type, user.school_id, user.profile_verification_status, user.staff_role),
+                ('PRINCIPAL', self.schools[0].id, self.principal.profile_verification_status, 'PRINCIPAL'),
+            )
+        self.assertIs(type(user), ClaimsUser)
+
+    def test_verification_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.principal.profile_verification_status = 'REJECTED'
+            self.principal.save()
+        self.assertEqual(self.assert_stale().profile_verification_status, 'REJECTED')
+
+    def test_user_type_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.principal.user_type = 'INTERNAL_TEACHER'
+            self.principal.save()
+        self.assertEqual(self.assert_stale().user_type, 'INTERNAL_TEACHER')
+
+    def test_school_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            staff = SchoolStaff.objects.get(user=self.principal)
+            staff.school = self.schools[1]
+            staff.save()
+        self.assertEqual(self.assert_stale().school_id, self.schools[1].id)
+
+    def test_fresh_login_gets_current_claims_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.principal.profile_verification_status = 'REJECTED'
+            self.principal.save()
+        token = access_token('principal1@school.edu', 'principal123')
+        user = authenticated_user(token)
+        self.assertIs(type(user), ClaimsUser)
+        self.assertEqual(user.profile_verification_status, 'REJECTED')
+
+
+class AlgorithmSettingsMemoTests(TestCase):
+    """Saving a school's settings bumps its version, so every process rebuilds at once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=0, students_per_school=0, availability_days=0,
+        )
+        cls.school = generate_sample_data(scale, seed=26)[0]
+
+    def settings(self):
+        return School.objects.get(pk=self.school.pk).get_algorithm_settings
+
+    def put(self, batch_size):
+        weights = {
+            'qualification': {'PhD': 3.0, 'Masters': 2.0, 'Bachelors': 1.0},
+            'rating_multiplier': {'factor': 2.0},
+            'experience_multiplier': {'factor': 0.5},
+            'distance_multiplier': {'factor': 1.0},
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return jwt_client('admin1@school.edu', 'admin123').put(
+                '/api/school/algorithm-settings/',
+                {'batch_size': batch_size, 'wait_time_minutes': 5, 'weights': weights},
+                format='json',
+            )
+
+    def test_memoized_until_the_version_changes(self):
+        school = School.objects.get(pk=self.school.pk)
+        first = school.get_algorithm_settings
+        with self.assertNumQueries(0):
+            self.assertIs(school.get_algorithm_settings, first)
+
+    def test_update_is_picked_up_at_once(self):
+        before = self.settings()
+        stale_school = School.objects.get(pk=self.school.pk)
+
+        response = self.put(batch_size=before.batch_size + 7)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['batch_size'], before.batch_size + 7)
+        after = self.settings()
+        self.assertNotEqual(after.version, before.version)
+        self.assertEqual((after.batch_size, after.wait_time_minutes), (before.batch_size + 7, 5))
+        # An instance loaded before the save still reads the new row
+        self.assertEqual(stale_school.get_algorithm_settings.batch_size, before.batch_size + 7)
+
+    def test_other_processes_drop_their_local_copy(self):
+        before = self.settings()
+        self.put(batch_size=before.batch_size + 1)
+        # Another worker still holds the old build in memory
+        algorithm_settings._local_settings[str(self.school.pk)] = before
+        self.assertEqual(self.settings().batch_size, before.batch_size + 1)
+
+    def test_unrelated_save_keeps_the_version(self):
+        before = self.settings()
+        with self.captureOnCommitCallbacks(execute=True):
+            school = School.objects.get(pk=self.school.pk)
+            school.save(update_fields=['updated_at'])
+        self.assertIs(self.settings(), before)
+
+
+class ProfileETagTests(TestCase):
+    """Profiles are served from the cache with an ETag that changes on every edit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=0, students_per_school=0, availability_days=0,
+        )
+        generate_sample_data(scale, seed=27)
+
+    def setUp(self):
+        self.client = jwt_client('teacher1@school.edu', 'teacher123')
+
+    def test_matching_etag_returns_not_modified(self):
+        for url in ('/api/profile/', '/api/profile/teacher1/'):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, 200)
+                etag = first['ETag']
+
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertFalse(response.content)
+
+    def test_edit_changes_the_etag(self):
+        etag = self.client.get('/api/profile/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/profile/', {'phone_number': '+15550100'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        for url in ('/api/profile/', '/api/profile/teacher1/'):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                self.assertEqual(response.data['phone_number'], '+15550100')
@@ -14,6 +14,7 @@ urlpatterns = [
     
     # Authentication URLs
     path('register/', views.UserRegistrationView.as_view(), name='user-registration'),
+    path('schools/directory/', views.SchoolDirectoryView.as_view(), name='school-directory'),
     path('change-password/', views.change_password, name='change-password'),
     path('request-reset-email/', views.request_reset_email, name='request-reset-email'),
     re_path(r"^reset-password/(?P<uid>[-\w]+)_(?P<token>[-\w]+)/", views.resetPassword, name="reset-password"),
@@ -23,10 +24,13 @@ urlpatterns = [
 
     # Profile Completion & Verification Flow
     path('profile/completion/', views.ProfileCompletionView.as_view(), name='profile-completion'),
+    path('profile/completion/schema/', views.ProfileFormSchemaView.as_view(), name='profile-completion-schema'),
     path('profile/image/', views.UploadProfileImageView.as_view(), name='profile-image-upload'),
     path('profile/verification-pending/', views.VerificationPendingView.as_view(), name='verification-pending'),
     path('profiles/pending-verification/', views.ProfileVerificationView.as_view(), name='pending-verifications'),
+    path('profiles/pending-verification/bulk/', views.BulkProfileVerificationView.as_view(), name='bulk-profile-verify'),
     path('profile/verify/<str:username>/', views.ProfileVerificationView.as_view(), name='profile-verify'),
+    path('users/bulk-import/', views.BulkUserImportView.as_view(), name='bulk-user-import'),
     
     path('profile/', views.user_profile, name='user-profile'),
     path('profile/<str:username>/', views.FetchUserProfileView.as_view(), name='fetch-user-profile'),
@@ -15,6 +15,8 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Dict, List, Optional, Tuple
 
+from .instrumentation import external_call
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,7 @@ This implementation uses the standard smtplib library directly,
 bypassing Django's email system for more reliable delivery.
 """
 
+@external_call('smtp')
 def send_direct_smtp_email(subject, message, recipient, sender=None, attachment_path=None):
     """
     Send email using direct SMTP connection - based on the working debug script.
@@ -291,4 +294,30 @@ class ProfileChangeLoggingMixin:
                 object_repr=str(instance),
                 action_flag=CHANGE,
                 change_message=f"Changed {', '.join(changed_fields)}"
-            )
\ No newline at end of file
+            )
+
+def get_request_school_id(request):
+    """
+    Id of the requesting user's school, from the denormalized User.school
+    (a token claim under ClaimsJWTAuthentication, so no query at all).
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return getattr(user, 'school_id', None)
+
+
+def get_request_school(request):
+    """
+    The requesting user's School, loaded with one query and memoized on the
+    underlying HttpRequest so views, permissions and serializers share it.
+    """
+    from .models import School
+
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, '_cached_school'):
+        school_id = get_request_school_id(request)
+        http_request._cached_school = (
+            School.objects.filter(pk=school_id).first() if school_id else None
+        )
+    return http_request._cached_school
@@ -0,0 +1,90 @@
+"""
+Profile verification queue.
+
+User.school mirrors the school recorded on a user's staff, teacher or student
+profile (or the school they own), so a school's pending queue is a single
+indexed scan instead of three ORed reverse joins. Bulk decisions are applied
+with one UPDATE; because update() skips model signals, the profile cache and
+token claims are invalidated explicitly.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .authentication import invalidate_claims
+from .profile_cache import invalidate_profiles, profile_queryset
+
+# Never listed or bulk-decided by a school; external teachers are verified
+# individually through ProfileVerificationView.post
+QUEUE_EXCLUDED_USER_TYPES = ('SCHOOL_ADMIN', 'EXTERNAL_TEACHER')
+
+# Upper bound on users decided in one bulk request
+BULK_VERIFICATION_LIMIT = 1000
+
+
+def resolve_user_school_id(user_id):
+    """School a user belongs to, in the same precedence the profile flow uses"""
+    from .models import School, SchoolStaff, StudentProfile, TeacherProfile
+
+    for model in (SchoolStaff, TeacherProfile, StudentProfile):
+        school_id = model.objects.filter(user_id=user_id).values_list('school_id', flat=True).first()
+        if school_id:
+            return school_id
+    return School.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+
+
+def sync_user_school(user_id):
+    """Refresh User.school from the profile rows; returns True if it changed"""
+    from .models import User
+
+    if not user_id:
+        return False
+    school_id = resolve_user_school_id(user_id)
+    users = User.objects.filter(pk=user_id)
+    if school_id is None:
+        users = users.exclude(school__isnull=True)
+    else:
+        users = users.exclude(school_id=school_id)
+    return users.update(school_id=school_id) > 0
+
+
+def pending_verifications(school_id):
+    """Completed, pending profiles of a school, oldest first, ready to serialize"""
+    return profile_queryset().filter(
+        school_id=school_id,
+        profile_completed=True,
+        profile_verification_status='PENDING'
+    ).exclude(
+        user_type__in=QUEUE_EXCLUDED_USER_TYPES
+    ).order_by('created_at', 'id')
+
+
+def bulk_set_verification(school_id, user_ids, verification_status, notes=''):
+    """
+    Apply one verification decision to many pending users of a school.
+    Returns the ids that were actually updated.
+    """
+    from .models import User
+
+    with transaction.atomic():
+        updated_ids = list(
+            User.objects.select_for_update().filter(
+                id__in=user_ids,
+                school_id=school_id,
+                profile_completed=True,
+                profile_verification_status='PENDING'
+            ).exclude(
+                user_type__in=QUEUE_EXCLUDED_USER_TYPES
+            ).values_list('id', flat=True)
+        )
+        if updated_ids:
+            User.objects.filter(id__in=updated_ids).update(
+                profile_verification_status=verification_status,
+                verification_notes=notes,
+                updated_at=timezone.now()
+            )
+
+            def invalidate():
+                invalidate_profiles(updated_ids)
+                invalidate_claims(updated_ids)
+            transaction.on_commit(invalidate)
+    return updated_ids
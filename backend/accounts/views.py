@@ -1,9 +1,10 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, smart_str, DjangoUnicodeDecodeError
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.parsers import JSONParser
@@ -20,7 +21,7 @@ from rest_framework.parsers import JSONParser
 from rest_framework import generics, status
 from rest_framework.response import Response
 from .permissions import CanManageSchoolProfile
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer,
     TeacherProfileSerializer, StudentProfileSerializer,
@@ -28,10 +29,24 @@ from .serializers import (
     ChangePasswordSerializer, UserPasswordResetSerializer,
     SendPasswordResetEmailSerializer, UserProfileUpdateSerializer, 
     ProfileVerificationSerializer, AlgorithmSettingsSerializer, 
-    UserProfileSerializer, ProfileCompletionSerializer, SchoolStaffSerializer
+    UserProfileSerializer, ProfileCompletionSerializer, SchoolStaffSerializer,
+    ClaimsTokenRefreshSerializer, BulkVerificationSerializer, SchoolDirectorySerializer
 )
 from .models import TeacherProfile, StudentProfile, School, TeacherAvailability
-from .utils import send_email, success_msg, error, ProfileChangeLoggingMixin
+from .utils import (
+    send_email, success_msg, error, ProfileChangeLoggingMixin,
+    get_request_school, get_request_school_id
+)
+from .profile_cache import get_cached_profile, get_cached_profile_by_username, profile_response
+from .form_schemas import get_profile_form
+from .algorithm_settings import AlgorithmSettings, merge_algorithm_settings
+from .caching import conditional_response, make_etag
+from .verification import bulk_set_verification, pending_verifications
+from .onboarding import ImportFileError, UserImporter, read_csv_rows
+from .school_directory import directory_queryset, get_directory_page, normalize_search
+import csv
+import io
+from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -50,6 +65,10 @@ class UserLoginView(TokenObtainPairView):
     def get_serializer_context(self):
         return {'request': self.request}
 
+
+class ClaimsTokenRefreshView(TokenRefreshView):
+    serializer_class = ClaimsTokenRefreshSerializer
+
 @csrf_exempt
 def request_reset_email(request):
     if request.method == 'POST':
@@ -88,23 +107,44 @@ class UserRegistrationView(generics.CreateAPIView):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class SchoolDirectoryPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SchoolDirectoryView(APIView):
+    """
+    Public, paginated list of schools for the signup form.
+    ?search= matches the start of the school name or city.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    pagination_class = SchoolDirectoryPagination
+
+    def get(self, request):
+        search = normalize_search(request.query_params.get('search'))
+        paginator = self.pagination_class()
+        page_size = paginator.get_page_size(request)
+        page = request.query_params.get(paginator.page_query_param, '1')
+
+        def build():
+            schools = paginator.paginate_queryset(directory_queryset(search), request, view=self)
+            serializer = SchoolDirectorySerializer(schools, many=True)
+            return dict(paginator.get_paginated_response(serializer.data).data)
+
+        entry = get_directory_page(search, page, page_size, build)
+        return conditional_response(
+            request, entry['data'], entry['etag'],
+            cache_control='public, max-age=300'
+        )
+
+
 class TeacherProfileViewSet(viewsets.ModelViewSet):
     serializer_class = TeacherProfileSerializer
     permission_classes = [IsAuthenticated]
 
 
-    def get_school(self, user):
-        """Helper method to get school for a user"""
-        try:
-            # If user is principal or staff, get through school_staff
-            if hasattr(user, 'school_staff'):
-                return user.school_staff.school
-            
-            return None
-        except (School.DoesNotExist, AttributeError):
-            return None
-
-    
     def get_queryset(self):
         user = self.request.user
         if not user.is_authenticated:
@@ -112,8 +152,10 @@ class TeacherProfileViewSet(viewsets.ModelViewSet):
         if user.user_type in ['INTERNAL_TEACHER', 'EXTERNAL_TEACHER']:
             return TeacherProfile.objects.filter(user=user).select_related('user')
         elif user.user_type == 'SCHOOL_ADMIN':
-            school = self.get_school(user)
-            return TeacherProfile.objects.filter(school=school).select_related('user')
+            school_id = get_request_school_id(self.request)
+            if not school_id:
+                return TeacherProfile.objects.none()
+            return TeacherProfile.objects.filter(school_id=school_id).select_related('user')
         return TeacherProfile.objects.none()
 
 
@@ -128,8 +170,10 @@ class StudentProfileViewSet(viewsets.ModelViewSet):
         if self.request.user.user_type == 'STUDENT':
             return StudentProfile.objects.filter(user=self.request.user)
         elif self.request.user.user_type == 'SCHOOL_ADMIN':
-            school = School.objects.get(user=self.request.user)
-            return StudentProfile.objects.filter(school=school)
+            school_id = get_request_school_id(self.request)
+            if not school_id:
+                return StudentProfile.objects.none()
+            return StudentProfile.objects.filter(school_id=school_id)
         return StudentProfile.objects.none()
 
 class SchoolProfileViewSet(viewsets.ModelViewSet):
@@ -163,284 +207,18 @@ class ProfileCompletionView(APIView):
     def get(self, request):
         """Get the current profile completion state and required fields"""
         user = request.user
+        form_schema, required_fields, schema_etag = get_profile_form(user.user_type)
+        current_data = ProfileCompletionSerializer(user).data
         profile_data = {
             "message": "Please complete your profile",
             "user_type": user.user_type,
-            "required_fields": self._get_required_fields(user.user_type),
-            "form_schema": self._get_form_schema(user.user_type),
-            "current_data": ProfileCompletionSerializer(user).data
+            "required_fields": required_fields,
+            "form_schema": form_schema,
+            "current_data": current_data
         }
-        return Response(profile_data)
-
-    def _get_form_schema(self, user_type):
-        """Generate dynamic form schema based on user type"""
-        base_fields = {
-            "first_name": {
-                "type": "text",
-                "label": "First Name",
-                "required": True,
-                "order": 1
-            },
-            "last_name": {
-                "type": "text", 
-                "label": "Last Name",
-                "required": True,
-                "order": 2
-            },
-            "phone_number": {
-                "type": "text",
-                "label": "Phone Number",
-                "required": True,
-                "order": 3
-            },
-            "profile_image": {
-                "type": "file",
-                "label": "Profile Image",
-                "required": False,
-                "accept": "image/*",
-                "max_size": 204800,  # 200KB
-                "order": 5
-            }
-        }
-        
-        # Teacher specific fields
-        if user_type in ['INTERNAL_TEACHER', 'EXTERNAL_TEACHER']:
-            teacher_fields = {
-                "teacher_profile.qualification": {
-                    "type": "text",
-                    "label": "Educational Qualification",
-                    "required": True,
-                    "order": 10
-                },
-                "teacher_profile.subjects": {
-                    "type": "multi-text",
-                    "label": "Teaching Subjects",
-                    "required": True, 
-                    "order": 11
-                },
-                "teacher_profile.experience_years": {
-                    "type": "number",
-                    "label": "Years of Experience",
-                    "required": True,
-                    "min": 0,
-                    "order": 12
-                },
-                "teacher_profile.preferred_classes": {
-                    "type": "multi-text",
-                    "label": "Preferred Classes",
-                    "required": False,
-                    "order": 13
-                },
-                "teacher_profile.teaching_methodology": {
-                    "type": "textarea",
-                    "label": "Teaching Methodology",
-                    "required": False,
-                    "order": 14
-                },
-                "teacher_profile.languages": {
-                    "type": "multi-text",
-                    "label": "Languages Known",
-                    "required": False,
-                    "order": 15
-                },
-                "teacher_profile.can_teach_online": {
-                    "type": "checkbox",
-                    "label": "Available for Online Teaching",
-                    "required": False,
-                    "order": 16
-                },
-                "teacher_profile.can_travel": {
-                    "type": "checkbox",
-                    "label": "Available for Travel",
-                    "required": False,
-                    "order": 17
-                }
-            }
-            return {**base_fields, **teacher_fields}
-        
-        # Student specific fields
-        elif user_type == 'STUDENT':
-            student_fields = {
-                "student_profile.grade": {
-                    "type": "text",
-                    "label": "Current Grade",
-                    "required": True,
-                    "order": 10
-                },
-                "student_profile.section": {
-                    "type": "text",
-                    "label": "Section",
-                    "required": False,
-                    "order": 11
-                },
-                "student_profile.roll_number": {
-                    "type": "text",
-                    "label": "Roll Number",
-                    "required": False,
-                    "order": 12
-                },
-                "student_profile.parent_name": {
-                    "type": "text",
-                    "label": "Parent/Guardian Name",
-                    "required": True,
-                    "order": 13
-                },
-                "student_profile.parent_phone": {
-                    "type": "text",
-                    "label": "Parent/Guardian Phone",
-                    "required": True,
-                    "order": 14
-                },
-                "student_profile.parent_email": {
-                    "type": "email",
-                    "label": "Parent/Guardian Email",
-                    "required": False,
-                    "order": 15
-                },
-                "student_profile.date_of_birth": {
-                    "type": "date",
-                    "label": "Date of Birth",
-                    "required": False,
-                    "order": 16
-                }
-            }
-            return {**base_fields, **student_fields}
-        
-        # School admin/principal specific fields
-        elif user_type in ['SCHOOL_ADMIN', 'PRINCIPAL']:
-            # Staff fields
-            staff_fields = {
-                "school_staff_profile.department": {
-                    "type": "text",
-                    "label": "Department",
-                    "required": True,
-                    "section": "Staff Details",
-                    "order": 10
-                },
-                "school_staff_profile.employee_id": {
-                    "type": "text",
-                    "label": "Employee ID",
-                    "required": True,
-                    "section": "Staff Details",
-                    "order": 11
-                },
-                "school_staff_profile.date_of_joining": {
-                    "type": "date",
-                    "label": "Date of Joining",
-                    "required": True,
-                    "section": "Staff Details",
-                    "order": 12
-                }
-            }
-            
-            # School fields
-            school_fields = {
-                "school_profile.school_name": {
-                    "type": "text",
-                    "label": "School Name",
-                    "required": True,
-                    "section": "School Details",
-                    "order": 20
-                },
-                "school_profile.category": {
-                    "type": "select",
-                    "label": "School Category",
-                    "required": True,
-                    "options": [
-                        {"value": "PRIMARY", "label": "Primary School"},
-                        {"value": "MIDDLE", "label": "Middle School"},
-                        {"value": "SECONDARY", "label": "Secondary School"},
-                        {"value": "HIGHER_SECONDARY", "label": "Higher Secondary School"},
-                        {"value": "DEGREE_COLLEGE", "label": "Degree College"},
-                        {"value": "UNIVERSITY", "label": "University"},
-                        {"value": "OTHER", "label": "Other"}
-                    ],
-                    "section": "School Details",
-                    "order": 21
-                },
-                "school_profile.address": {
-                    "type": "textarea",
-                    "label": "School Address",
-                    "required": True,
-                    "section": "School Details",
-                    "order": 22
-                },
-                "school_profile.city": {
-                    "type": "text",
-                    "label": "City",
-                    "required": True,
-                    "section": "School Details",
-                    "order": 23
-                },
-                "school_profile.state": {
-                    "type": "text",
-                    "label": "State",
-                    "required": True,
-                    "section": "School Details",
-                    "order": 24
-                },
-                "school_profile.country": {
-                    "type": "text",
-                    "label": "Country",
-                    "required": True,
-                    "section": "School Details",
-                    "order": 25
-                },
-                "school_profile.postal_code": {
-                    "type": "text",
-                    "label": "Postal Code",
-                    "required": True,
-                    "section": "School Details",
-                    "order": 26
-                },
-                "school_profile.board_type": {
-                    "type": "select",
-                    "label": "Board Type",
-                    "required": True,
-                    "options": [
-                        {"value": "CBSE", "label": "CBSE"},
-                        {"value": "ICSE", "label": "ICSE"},
-                        {"value": "IB", "label": "IB"},
-                        {"value": "STATE", "label": "State Board"},
-                        {"value": "OTHER", "label": "Other Board"}
-                    ],
-                    "section": "School Details",
-                    "order": 27
-                },
-                "school_profile.registration_number": {
-                    "type": "text",
-                    "label": "Registration Number",
-                    "required": True,
-                    "section": "School Details",
-                    "order": 28
-                },
-                "school_profile.established_year": {
-                    "type": "number",
-                    "label": "Established Year",
-                    "required": True,
-                    "min": 1800,
-                    "max": datetime.datetime.now().year,
-                    "section": "School Details",
-                    "order": 29
-                },
-                "school_profile.website": {
-                    "type": "url",
-                    "label": "Website",
-                    "required": False,
-                    "section": "School Details",
-                    "order": 30
-                },
-                "school_profile.contact_person": {
-                    "type": "text",
-                    "label": "Contact Person",
-                    "required": True,
-                    "section": "School Details",
-                    "order": 31
-                }
-            }
-            return {**base_fields, **staff_fields, **school_fields}
-            
-        return base_fields
+        # current_data is per user, so the response must still be revalidated
+        etag = make_etag([schema_etag, current_data])
+        return conditional_response(request, profile_data, etag)
 
     def post(self, request):
         """Handle profile completion submission"""
@@ -460,66 +238,19 @@ class ProfileCompletionView(APIView):
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def _get_required_fields(self, user_type):
-        """Helper method to return required fields based on user type"""
-        base_fields = {
-            "first_name": "First Name",
-            "last_name": "Last Name",
-            "phone_number": "Phone Number",
-        }
 
-        if user_type == 'INTERNAL_TEACHER':
-            return {
-                **base_fields,
-                "teacher_profile": {
-                    "qualification": "Educational Qualification",
-                    "subjects": "Teaching Subjects",
-                    "experience_years": "Years of Experience",
-                    "preferred_classes": "Preferred Classes",
-                    "languages": "Languages Known",
-                    "can_teach_online": "Available for Online Teaching",
-                    "can_travel": "Available for Travel",
-                    "school_name": "School", # For internal teachers
-                }
-            }
-        elif user_type == 'EXTERNAL_TEACHER':
-            return {
-                **base_fields,
-                    "qualification": "Educational Qualification",
-                    "subjects": "Teaching Subjects",
-                    "experience_years": "Years of Experience",
-                    "preferred_classes": "Preferred Classes",
-                    "languages": "Languages Known",
-                    "can_teach_online": "Available for Online Teaching",
-                    "can_travel": "Available for Travel",
-            }
-        elif user_type == 'STUDENT':
-            return {
-                **base_fields,
-                "student_profile": {
-                    "grade": "Current Grade",
-                    "section": "Section",
-                    "roll_number": "Roll Number",
-                    "parent_name": "Parent/Guardian Name",
-                    "parent_phone": "Parent/Guardian Phone",
-                    "parent_email": "Parent/Guardian Email",
-                    "date_of_birth": "Date of Birth"
-                }
-            }
-        elif user_type in ['SCHOOL_ADMIN', 'PRINCIPAL']:
-            return {
-                **base_fields,
-                "school_staff_profile": {
-                    "employee_id": "Employee ID",
-                    "designation": "Designation",
-                },
-                "school_profile": {
-                    "school_name": "School Name",
-                    "category": "School Category",
-                    "board_type": "Board Type",       
-            }        
-            } 
-        return base_fields
+class ProfileFormSchemaView(APIView):
+    """Static profile completion schema for the requesting user's type"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        form_schema, required_fields, etag = get_profile_form(request.user.user_type)
+        return conditional_response(request, {
+            "user_type": request.user.user_type,
+            "required_fields": required_fields,
+            "form_schema": form_schema,
+        }, etag, cache_control='private, max-age=86400')
+
 
 class VerificationPendingView(APIView):
     permission_classes = [IsAuthenticated]
@@ -531,20 +262,15 @@ class VerificationPendingView(APIView):
         })
 
 
+class PendingVerificationPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
 class ProfileVerificationView(APIView):
     permission_classes = [IsAuthenticated]
-
-    def get_school(self, user):
-        """Helper method to get school for a user"""
-        try:
-            
-            # If user is principal or staff, get through school_staff
-            if hasattr(user, 'school_staff'):
-                return user.school_staff.school
-            
-            return None
-        except (School.DoesNotExist, AttributeError):
-            return None
+    pagination_class = PendingVerificationPagination
 
     def get(self, request):
         """Get list of pending profiles for verification"""
@@ -554,28 +280,17 @@ class ProfileVerificationView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        # Get the school
-        school = self.get_school(request.user)
-        if not school:
+        school_id = get_request_school_id(request)
+        if not school_id:
             return Response(
                 {"error": "No school associated with your account"}, 
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Get pending profiles from the school
-        pending_profiles = User.objects.filter(
-            profile_completed=True,
-            profile_verification_status='PENDING'
-        ).filter(
-            models.Q(teacher_profile__school=school) |
-            models.Q(student_profile__school=school) |
-            models.Q(school_staff__school=school)
-        ).exclude(
-            user_type__in=['SCHOOL_ADMIN', 'EXTERNAL_TEACHER']
-        ).distinct()
-
-        serializer = UserProfileSerializer(pending_profiles, many=True)
-        return Response(serializer.data)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(pending_verifications(school_id), request, view=self)
+        serializer = UserProfileSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, username):
         """Handle profile verification"""
@@ -596,22 +311,16 @@ class ProfileVerificationView(APIView):
         try:
             # Get the user to be verified
             user_to_verify = User.objects.get(username=username)
-            school = self.get_school(request.user)
+            school_id = get_request_school_id(request)
             
-            if not school:
+            if not school_id:
                 return Response(
                     {"error": "No school associated with your account"}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
 
             # Verify if user belongs to admin's/principal's school
-            belongs_to_school = False
-            if hasattr(user_to_verify, 'student_profile'):
-                belongs_to_school = user_to_verify.student_profile.school == school
-            elif hasattr(user_to_verify, 'teacher_profile'):
-                belongs_to_school = user_to_verify.teacher_profile.school == school
-            elif hasattr(user_to_verify, 'school_staff'):
-                belongs_to_school = user_to_verify.school_staff.school == school
+            belongs_to_school = user_to_verify.school_id == school_id
 
             if not belongs_to_school and user_to_verify.user_type != 'EXTERNAL_TEACHER':
                 return Response(
@@ -636,6 +345,49 @@ class ProfileVerificationView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+class BulkProfileVerificationView(APIView):
+    """Approve or reject many pending profiles of the caller's school at once"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.user.user_type not in ['SCHOOL_ADMIN', 'PRINCIPAL']:
+            return Response(
+                {"error": "Only school admin and principals can verify profiles"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if request.user.user_type == 'PRINCIPAL' and request.user.profile_verification_status != 'VERIFIED':
+            return Response(
+                {"error": "Your profile needs to be verified first"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        school_id = get_request_school_id(request)
+        if not school_id:
+            return Response(
+                {"error": "No school associated with your account"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = BulkVerificationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        requested_ids = set(data['user_ids'])
+        updated_ids = bulk_set_verification(
+            school_id,
+            requested_ids,
+            data['profile_verification_status'],
+            data['verification_notes']
+        )
+        return Response({
+            "message": f"{len(updated_ids)} profile(s) updated",
+            "status": data['profile_verification_status'],
+            "updated": [str(user_id) for user_id in updated_ids],
+            # Not pending, not in this school, or not found
+            "skipped": [str(user_id) for user_id in requested_ids - set(updated_ids)],
+        })
+
 class UserDashboardView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -680,8 +432,10 @@ class UserDashboardView(APIView):
 def user_profile(request):
     user = request.user
     if request.method == 'GET':
-        serializer = UserProfileSerializer(user)
-        return Response(serializer.data)
+        entry = get_cached_profile(user.id)
+        if entry is None:
+            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        return profile_response(request, entry)
 
     elif request.method == 'PUT':
         serializer = UserProfileUpdateSerializer(user, data=request.data, partial=True, context={'request': request})
@@ -703,9 +457,10 @@ class FetchUserProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, username, *args, **kwargs):
-        user = get_object_or_404(User, username=username)
-        serializer = UserProfileSerializer(user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        entry = get_cached_profile_by_username(username)
+        if entry is None:
+            raise Http404("No User matches the given query.")
+        return profile_response(request, entry)
 
 
 class FetchUserProfileByIdView(APIView):
@@ -713,11 +468,10 @@ class FetchUserProfileByIdView(APIView):
 
     def get(self, request, user_id, *args, **kwargs):
         try:
-            user = User.objects.get(id=user_id)
-            serializer = UserProfileSerializer(user)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except User.DoesNotExist:
-            return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+            entry = get_cached_profile(user_id)
+            if entry is None:
+                return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+            return profile_response(request, entry)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -775,6 +529,60 @@ class UploadProfileImageView(APIView):
     
 
 
+class BulkUserImportView(APIView):
+    """
+    Import students and internal teachers of the caller's school from a CSV
+    upload ("file"). Optional query params: user_type (default for rows without
+    that column) and dry_run=true to only validate.
+
+    Runs inside the request, so files are capped at BULK_IMPORT_MAX_ROWS rows
+    and passwords are hashed in this process; school-wide imports belong to
+    the import_users management command and its process pool.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.user.user_type not in ['SCHOOL_ADMIN', 'PRINCIPAL']:
+            return Response(
+                {"error": "Only school admin and principals can import users"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if request.user.user_type == 'PRINCIPAL' and request.user.profile_verification_status != 'VERIFIED':
+            return Response(
+                {"error": "Your profile needs to be verified first"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        school = get_request_school(request)
+        if not school:
+            return Response(
+                {"error": "No school associated with your account"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            rows = read_csv_rows(
+                io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''),
+                settings.BULK_IMPORT_MAX_ROWS,
+            )
+            report = UserImporter(
+                school,
+                default_user_type=request.query_params.get('user_type'),
+                hash_workers=1,
+                dry_run=request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes'),
+            ).run(rows)
+        except (ImportFileError, UnicodeDecodeError, csv.Error) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(report, status=status.HTTP_200_OK)
+
+
 class TeacherAvailabilityViewSet(viewsets.ModelViewSet):
     serializer_class = TeacherAvailabilitySerializer
     permission_classes = [IsAuthenticated]
@@ -817,23 +625,6 @@ class UpdateAvailabilityView(APIView):
 class SchoolAlgorithmSettingsView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def get_school(self, user):
-        """Helper method to get school for a user"""
-        try:
-            # Try direct school association first (for school admin)
-            if user.user_type == 'SCHOOL_ADMIN':
-                school = School.objects.filter(user=user).first()
-                if school:
-                    return school
-            
-            # If user is principal or staff, get through school_staff
-            if hasattr(user, 'school_staff'):
-                return user.school_staff.school
-            
-            return None
-        except (School.DoesNotExist, AttributeError):
-            return None
-
     def get(self, request):
         if request.user.user_type != 'SCHOOL_ADMIN':
             return Response(
@@ -841,15 +632,14 @@ class SchoolAlgorithmSettingsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        school = self.get_school(request.user)
+        school = get_request_school(request)
         if not school:
             return Response(
                 {"error": "School not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Fixed: Access get_algorithm_settings as a property, not a function
-        return Response(school.get_algorithm_settings)
+        return Response(school.get_algorithm_settings.as_dict())
 
     def put(self, request):
         if request.user.user_type != 'SCHOOL_ADMIN':
@@ -858,7 +648,7 @@ class SchoolAlgorithmSettingsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        school = self.get_school(request.user)
+        school = get_request_school(request)
         if not school:
             return Response(
                 {"error": "School not found"},
@@ -869,9 +659,11 @@ class SchoolAlgorithmSettingsView(APIView):
         
         if serializer.is_valid():
             school.matching_algorithm_settings = serializer.validated_data
-            school.save()
-            # Fixed: Access get_algorithm_settings as a property, not a function
-            return Response(school.get_algorithm_settings)
+            # post_save invalidates the memoized settings for every process,
+            # but only on commit, so answer from what was just saved
+            school.save(update_fields=['matching_algorithm_settings', 'updated_at'])
+            saved = merge_algorithm_settings(school.matching_algorithm_settings)
+            return Response(AlgorithmSettings.from_dict(saved).as_dict())
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
@@ -883,11 +675,7 @@ class SchoolProfileView(ProfileChangeLoggingMixin, generics.RetrieveUpdateAPIVie
     permission_classes = [CanManageSchoolProfile]
     
     def get_object(self):
-        if hasattr(self.request.user, 'school_staff'):
-            return self.request.user.school_staff.school
-        elif hasattr(self.request.user, 'school_profile'):
-            return self.request.user.school_profile
-        return None
+        return get_request_school(self.request)
     
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
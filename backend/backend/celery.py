@@ -0,0 +1,76 @@
+"""
+Celery application for the project.
+
+Tasks are split over four queues so slow work cannot starve urgent work:
+
+    matching        ranking teachers and sending invitation batches
+    email           outgoing mail
+    recording-sync  polling JioMeet for finished recordings
+    housekeeping    periodic status sweeps
+
+Run a worker per queue and scale each independently, e.g.
+
+    celery -A backend worker -Q matching -c 4
+    celery -A backend worker -Q email -c 16
+    celery -A backend worker -Q recording-sync,housekeeping -c 2
+    celery -A backend beat
+
+Workers take their prefetch multiplier from QUEUE_PREFETCH for the queues
+they consume, unless --prefetch-multiplier or CELERY_WORKER_PREFETCH_MULTIPLIER
+sets another. Within a queue, lower priority numbers are delivered first
+(see substitutes.tasks.task_priority).
+Periodic tasks are stored by django-celery-beat's DatabaseScheduler, which
+registers CELERY_BEAT_SCHEDULE on startup and lets admins retune it.
+"""
+import os
+
+from celery import Celery
+from celery.app.defaults import DEFAULTS
+from celery.signals import worker_init
+from kombu import Queue
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+MATCHING_QUEUE = 'matching'
+EMAIL_QUEUE = 'email'
+RECORDING_SYNC_QUEUE = 'recording-sync'
+HOUSEKEEPING_QUEUE = 'housekeeping'
+
+# Matching tasks are short and latency-sensitive: take one at a time so an
+# URGENT request is never stuck behind prefetched ones. Email is I/O bound.
+QUEUE_PREFETCH = {
+    MATCHING_QUEUE: 1,
+    EMAIL_QUEUE: 8,
+    RECORDING_SYNC_QUEUE: 4,
+    HOUSEKEEPING_QUEUE: 1,
+}
+
+app = Celery('backend')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.conf.task_queues = [Queue(name) for name in QUEUE_PREFETCH]
+app.conf.task_default_queue = HOUSEKEEPING_QUEUE
+app.conf.task_routes = {
+    'substitutes.tasks.match_teachers_to_request': {'queue': MATCHING_QUEUE},
+    'substitutes.tasks.check_request_status': {'queue': MATCHING_QUEUE},
+    'substitutes.tasks.escalate_due_requests': {'queue': MATCHING_QUEUE},
+    'substitutes.tasks.expire_invitations': {'queue': HOUSEKEEPING_QUEUE},
+    'substitutes.tasks.maintain_notification_partitions': {'queue': HOUSEKEEPING_QUEUE},
+    'substitutes.tasks.train_acceptance_models': {'queue': HOUSEKEEPING_QUEUE},
+    'substitutes.tasks.send_teacher_email': {'queue': EMAIL_QUEUE},
+    'substitutes.tasks.send_assignment_notifications': {'queue': EMAIL_QUEUE},
+    'substitutes.tasks.send_confirmation_email': {'queue': EMAIL_QUEUE},
+    'teaching_sessions.tasks.sync_recordings': {'queue': RECORDING_SYNC_QUEUE},
+    'teaching_sessions.tasks.check_session_status': {'queue': HOUSEKEEPING_QUEUE},
+}
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def tune_prefetch(sender=None, **kwargs):
+    """Uses the smallest prefetch among the queues this worker consumes"""
+    if sender.prefetch_multiplier != DEFAULTS['worker_prefetch_multiplier']:
+        return  # set explicitly with --prefetch-multiplier or in settings
+    queues = sender.app.amqp.queues.consume_from or QUEUE_PREFETCH
+    prefetch = [QUEUE_PREFETCH[queue] for queue in queues if queue in QUEUE_PREFETCH]
+    if prefetch:
+        sender.prefetch_multiplier = min(prefetch)
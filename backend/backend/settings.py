@@ -60,10 +60,12 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
     'phonenumber_field',
-    'django_extensions'
+    'django_extensions',
+    'django_celery_beat',
 ]
 
 MIDDLEWARE = [
+    'accounts.instrumentation.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -137,13 +139,35 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Configure channel layers (Redis for WebSocket)
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': 'accounts.channel_layers.InstrumentedRedisChannelLayer',
         'CONFIG': {
             "hosts": [(config('REDIS_HOST', default='127.0.0.1'), config('REDIS_PORT', default=6379, cast=int))],
         },
     },
 }
 
+# Per-user replay streams for notification pushes (substitutes.push)
+PUSH_STREAM_REDIS_URL = config(
+    'PUSH_STREAM_REDIS_URL',
+    default=f"redis://{config('REDIS_HOST', default='127.0.0.1')}:{config('REDIS_PORT', default=6379, cast=int)}/2",
+)
+PUSH_STREAM_ENABLED = config('PUSH_STREAM_ENABLED', default=True, cast=bool)
+PUSH_STREAM_MAXLEN = config('PUSH_STREAM_MAXLEN', default=200, cast=int)
+PUSH_STREAM_TTL = config('PUSH_STREAM_TTL', default=24 * 60 * 60, cast=int)  # seconds
+# Open notification sockets, for matching (substitutes.presence); same Redis
+PRESENCE_ENABLED = config('PRESENCE_ENABLED', default=True, cast=bool)
+PRESENCE_TTL = config('PRESENCE_TTL', default=90, cast=int)  # seconds without a heartbeat
+
+
+# Shared cache (Redis) used for per-school settings and other hot reads
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f"redis://{config('REDIS_HOST', default='127.0.0.1')}:{config('REDIS_PORT', default=6379, cast=int)}/1",
+        'KEY_PREFIX': 'teacher_hub',
+    },
+}
+
 
 DATABASES = {
     'default': {
@@ -207,7 +231,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
 }
 
@@ -229,6 +253,64 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 
+# Celery (backend/celery.py defines the queues and routes)
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default=f"redis://{config('REDIS_HOST', default='127.0.0.1')}:{config('REDIS_PORT', default=6379, cast=int)}/0")
+# Redis emulates priorities with one list per step; 0 is delivered first
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+}
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'escalate-due-requests': {
+        'task': 'substitutes.tasks.escalate_due_requests',
+        'schedule': 30.0,
+    },
+    'expire-invitations': {
+        'task': 'substitutes.tasks.expire_invitations',
+        'schedule': 30.0,
+    },
+    'check-session-status': {
+        'task': 'teaching_sessions.tasks.check_session_status',
+        'schedule': 60.0,
+    },
+    'sync-recordings': {
+        'task': 'teaching_sessions.tasks.sync_recordings',
+        'schedule': 300.0,
+    },
+    'maintain-notification-partitions': {
+        'task': 'substitutes.tasks.maintain_notification_partitions',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'train-acceptance-models': {
+        'task': 'substitutes.tasks.train_acceptance_models',
+        'schedule': 7 * 24 * 60 * 60.0,
+    },
+}
+
+# Notification partitions and archival (substitutes.partitions)
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=180, cast=int)
+NOTIFICATION_PARTITIONS_AHEAD = config('NOTIFICATION_PARTITIONS_AHEAD', default=3, cast=int)
+# Archives are the only copy of dropped months: point this at a mounted
+# volume. Archival does not run until it is set.
+NOTIFICATION_ARCHIVE_DIR = config('NOTIFICATION_ARCHIVE_DIR', default='')
+
+# Uploads through the bulk-import endpoint (accounts.onboarding); larger
+# files go through the import_users management command
+BULK_IMPORT_MAX_ROWS = config('BULK_IMPORT_MAX_ROWS', default=200, cast=int)
+
+# Request instrumentation (accounts.instrumentation)
+INSTRUMENTATION_ENABLED = config('INSTRUMENTATION_ENABLED', default=True, cast=bool)
+SERVER_TIMING_ENABLED = config('SERVER_TIMING_ENABLED', default=DEBUG, cast=bool)
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=1000, cast=int)
+SLOW_REQUEST_SAMPLE_INTERVAL = config('SLOW_REQUEST_SAMPLE_INTERVAL', default=300, cast=int)
+# Bearer token for /metrics; without one it only answers local requests
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 
 
 
@@ -21,7 +21,8 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view as swagger_get_schema_view
 from django.conf import settings
 from django.conf.urls.static import static
-from accounts.views import UserLoginView
+from accounts.views import UserLoginView, ClaimsTokenRefreshView
+from accounts.instrumentation import metrics_view
 
 
 schema_view = swagger_get_schema_view(
@@ -40,8 +41,9 @@ urlpatterns = [
     path('api/', include('substitutes.urls')),
     path('api/teaching-sessions/', include('teaching_sessions.urls')),
     path('api/login/', UserLoginView.as_view(), name='token_obtain_pair'),
-    path('api/login-refresh/', jwt_views.TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/login-refresh/', ClaimsTokenRefreshView.as_view(), name='token_refresh'),
     path('api/login-verify/', jwt_views.TokenVerifyView.as_view(), name='verify_token'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve static files in development
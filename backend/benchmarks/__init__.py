@@ -0,0 +1,14 @@
+"""
+Query-count and latency benchmarks for the REST API and the matching engine.
+
+Only installed by benchmarks.settings:
+
+    python manage.py benchmark_api --settings=benchmarks.settings
+    python manage.py benchmark_api --settings=benchmarks.settings --update-baseline
+    python manage.py benchmark_matching --settings=benchmarks.settings
+
+benchmark_api seeds a test database with accounts.sample_data, measures each
+scenario in scenarios.py and fails when it regresses against baseline.json.
+benchmark_matching does the same for the matching engine (matching.py) over
+a synthetic workload (workload.py), against matching_baseline.json.
+"""
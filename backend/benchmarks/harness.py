@@ -0,0 +1,156 @@
+"""
+Measurement and baseline comparison.
+
+A Scenario produces one callable per iteration (setup work such as creating
+a fresh invitation to accept happens in prepare() and is not measured).
+Each scenario is run twice: a timed pass recording query counts and wall
+time, then a shorter pass under tracemalloc for allocation peaks, since
+tracing slows Python down too much to time at the same time.
+"""
+import gc
+import statistics
+import time
+import tracemalloc
+import warnings
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment
+)
+
+# Query counts must not grow at all. Wall time varies by tens of percent
+# between runs on a shared machine, so it gets a wider margin than allocations.
+DEFAULT_TIME_THRESHOLD = 0.5
+DEFAULT_ALLOCATION_THRESHOLD = 0.25
+
+# Differences below these are noise on any machine
+MIN_TIME_DELTA_MS = 5.0
+MIN_ALLOCATION_DELTA_KB = 32.0
+
+
+@dataclass
+class Scenario:
+    name: str
+    # Called with the iteration number; returns the callable to measure
+    prepare: Callable[[int], Callable]
+    # Status the measured call must return, so a broken endpoint cannot look fast
+    expected_status: int = 200
+
+
+@contextmanager
+def benchmark_database():
+    """
+    A throwaway test database (in-memory on SQLite, test_<NAME> on Postgres)
+    that exists for the duration of the block
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with warnings.catch_warnings():
+            # teaching_sessions.signals stores naive session times; one warning per accept
+            warnings.filterwarnings('ignore', message=r'DateTimeField .* received a naive datetime')
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a non-empty list"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def check_status(scenario, response):
+    status_code = getattr(response, 'status_code', scenario.expected_status)
+    if status_code != scenario.expected_status:
+        detail = getattr(response, 'data', None)
+        raise RuntimeError(
+            f"{scenario.name}: expected HTTP {scenario.expected_status}, got {status_code}: {detail}"
+        )
+
+
+def measure(scenario, iterations=50, warmup=5, allocation_iterations=10):
+    for i in range(warmup):
+        check_status(scenario, scenario.prepare(i)())
+
+    timings = []
+    queries = []
+    for i in range(warmup, warmup + iterations):
+        call = scenario.prepare(i)
+        # Like timeit, keep collector pauses out of individual timings
+        gc.collect()
+        gc.disable()
+        try:
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = call()
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            gc.enable()
+        check_status(scenario, response)
+        queries.append(len(captured))
+
+    peaks = []
+    offset = warmup + iterations
+    for i in range(offset, offset + allocation_iterations):
+        call = scenario.prepare(i)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peaks.append(peak / 1024)
+
+    return {
+        'iterations': iterations,
+        'queries': max(queries),
+        'queries_min': min(queries),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'alloc_peak_kb': round(statistics.median(peaks), 1) if peaks else None,
+    }
+
+
+def compare(results, baseline, time_threshold=DEFAULT_TIME_THRESHOLD,
+            allocation_threshold=DEFAULT_ALLOCATION_THRESHOLD):
+    """
+    Regressions of `results` against `baseline` (both {scenario: metrics}),
+    as human readable lines. Scenarios missing from the baseline are skipped.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: {current['queries']} queries, baseline {previous['queries']}")
+
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = previous[metric] * (1 + time_threshold)
+            if current[metric] > limit and current[metric] - previous[metric] > MIN_TIME_DELTA_MS:
+                regressions.append(
+                    f"{name}: {metric} {current[metric]:.2f}, baseline {previous[metric]:.2f} "
+                    f"(+{time_threshold:.0%} allowed)"
+                )
+
+        if current.get('alloc_peak_kb') is not None and previous.get('alloc_peak_kb') is not None:
+            limit = previous['alloc_peak_kb'] * (1 + allocation_threshold)
+            delta = current['alloc_peak_kb'] - previous['alloc_peak_kb']
+            if current['alloc_peak_kb'] > limit and delta > MIN_ALLOCATION_DELTA_KB:
+                regressions.append(
+                    f"{name}: allocation peak {current['alloc_peak_kb']:.0f} KB, "
+                    f"baseline {previous['alloc_peak_kb']:.0f} KB (+{allocation_threshold:.0%} allowed)"
+                )
+    return regressions
@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.harness import DEFAULT_ALLOCATION_THRESHOLD, DEFAULT_TIME_THRESHOLD, compare
+
+BENCHMARKS_DIR = Path(__file__).resolve().parents[2]
+
+
+class BaselineCommand(BaseCommand):
+    """
+    Shared --baseline/--update-baseline/--output handling. A run is
+    {'meta': {...}, 'results': {scenario: metrics}}; timings are only compared
+    when the `comparable_meta` keys match the baseline's.
+    """
+    default_baseline = None
+    comparable_meta = ('database', 'seed')
+
+    def add_baseline_arguments(self, parser):
+        parser.add_argument('--baseline', default=str(self.default_baseline))
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Write this run as the new baseline instead of comparing')
+        parser.add_argument('--output', help='Also write this run as JSON to this path')
+        parser.add_argument('--time-threshold', type=float, default=DEFAULT_TIME_THRESHOLD,
+                            help='Allowed relative p50/p95 slowdown (0.5 = 50%%)')
+        parser.add_argument('--allocation-threshold', type=float, default=DEFAULT_ALLOCATION_THRESHOLD)
+
+    def finish(self, run, options):
+        if options['output']:
+            self.write_json(options['output'], run)
+
+        baseline_path = Path(options['baseline'])
+        if options['update_baseline']:
+            self.write_json(baseline_path, run)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {baseline_path}'))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}; run with --update-baseline'))
+            return
+
+        self.check_baseline(run, json.loads(baseline_path.read_text()), options)
+
+    def check_baseline(self, run, baseline, options):
+        time_threshold = options['time_threshold']
+        allocation_threshold = options['allocation_threshold']
+        meta, baseline_meta = run['meta'], baseline.get('meta', {})
+        if any(meta.get(key) != baseline_meta.get(key) for key in self.comparable_meta):
+            # Timings from another database or dataset say nothing; query counts still do
+            self.stdout.write(self.style.WARNING(
+                f'Baseline was recorded with a different {"/".join(self.comparable_meta)}; '
+                'comparing query counts only'
+            ))
+            time_threshold = allocation_threshold = float('inf')
+
+        regressions = compare(run['results'], baseline.get('results', {}), time_threshold, allocation_threshold)
+        if regressions:
+            for line in regressions:
+                self.stderr.write(line)
+            raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def write_json(self, path, data):
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.write('\n')
@@ -0,0 +1,85 @@
+import platform
+from dataclasses import asdict
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+
+from accounts.sample_data import SampleDataScale
+from benchmarks.harness import benchmark_database, measure
+from benchmarks.scenarios import BENCHMARK_SCALE, ApiBenchmark
+from benchmarks.stubs import offline_services
+from ._baseline import BENCHMARKS_DIR, BaselineCommand
+
+
+class Command(BaselineCommand):
+    help = 'Benchmarks key API endpoints on a seeded test database and compares against a baseline'
+    default_baseline = BENCHMARKS_DIR / 'baseline.json'
+    comparable_meta = ('database', 'scale', 'seed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--allocation-iterations', type=int, default=10)
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Only run this scenario (repeatable)')
+        parser.add_argument('--seed', type=int, default=1234)
+        parser.add_argument('--schools', type=int, default=BENCHMARK_SCALE.schools)
+        parser.add_argument('--teachers-per-school', type=int, default=BENCHMARK_SCALE.teachers_per_school)
+        parser.add_argument('--external-teachers', type=int, default=BENCHMARK_SCALE.external_teachers)
+        parser.add_argument('--students-per-school', type=int, default=BENCHMARK_SCALE.students_per_school)
+        parser.add_argument('--availability-days', type=int, default=BENCHMARK_SCALE.availability_days)
+        self.add_baseline_arguments(parser)
+
+    def handle(self, *args, **options):
+        scale = SampleDataScale(
+            schools=options['schools'],
+            teachers_per_school=options['teachers_per_school'],
+            external_teachers=options['external_teachers'],
+            students_per_school=options['students_per_school'],
+            availability_days=options['availability_days'],
+        )
+        if scale.schools < 1 or scale.external_teachers < 2:
+            raise CommandError('The benchmarks need at least one school and two external teachers')
+
+        with benchmark_database():
+            results = self.run_benchmarks(scale, options)
+
+        run = {
+            'meta': {
+                'database': connection.vendor,
+                'scale': asdict(scale),
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'python': platform.python_version(),
+                'created_at': timezone.now().isoformat(),
+            },
+            'results': results,
+        }
+        self.finish(run, options)
+
+    def run_benchmarks(self, scale, options):
+        benchmark = ApiBenchmark(scale, seed=options['seed'])
+        self.stdout.write(f'Seeding {scale} on {connection.vendor}...')
+        with offline_services():
+            benchmark.setup()
+
+        wanted = set(options['scenarios'] or [])
+        results = {}
+        for scenario in benchmark.scenarios():
+            if wanted and scenario.name not in wanted:
+                continue
+            with offline_services():
+                result = measure(
+                    scenario,
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    allocation_iterations=options['allocation_iterations'],
+                )
+            results[scenario.name] = result
+            self.stdout.write(
+                f"{scenario.name:<24} {result['queries']:>3} queries  "
+                f"p50 {result['p50_ms']:>8.2f} ms  p95 {result['p95_ms']:>8.2f} ms  "
+                f"p99 {result['p99_ms']:>8.2f} ms  alloc {result['alloc_peak_kb']:>8.1f} KB"
+            )
+        return results
@@ -0,0 +1,79 @@
+import platform
+from dataclasses import asdict
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.utils import timezone
+
+from benchmarks.harness import benchmark_database
+from benchmarks.matching import MatchingBenchmark
+from benchmarks.stubs import offline_services
+from benchmarks.workload import WorkloadSpec
+from ._baseline import BENCHMARKS_DIR, BaselineCommand
+
+
+class Command(BaselineCommand):
+    help = 'Times ranking, invitation and assignment over a synthetic workload'
+    default_baseline = BENCHMARKS_DIR / 'matching_baseline.json'
+    comparable_meta = ('database', 'workload')
+
+    def add_arguments(self, parser):
+        defaults = WorkloadSpec()
+        parser.add_argument('--teachers', type=int, default=defaults.teachers)
+        parser.add_argument('--days', type=int, default=defaults.days)
+        parser.add_argument('--requests-per-day', type=int, default=defaults.requests_per_day)
+        parser.add_argument('--slot-density', type=float, default=defaults.slot_density,
+                            help='Probability a teacher is free in a given hour')
+        parser.add_argument('--subject-skew', type=float, default=defaults.subject_skew,
+                            help='Zipf exponent of subject popularity; 0 is uniform')
+        parser.add_argument('--subjects-per-teacher', type=int, default=defaults.subjects_per_teacher)
+        parser.add_argument('--rating-mean', type=float, default=defaults.rating_mean)
+        parser.add_argument('--rating-stddev', type=float, default=defaults.rating_stddev)
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        self.add_baseline_arguments(parser)
+
+    def handle(self, *args, **options):
+        spec = WorkloadSpec(
+            teachers=options['teachers'],
+            days=options['days'],
+            requests_per_day=options['requests_per_day'],
+            slot_density=options['slot_density'],
+            subject_skew=options['subject_skew'],
+            subjects_per_teacher=options['subjects_per_teacher'],
+            rating_mean=options['rating_mean'],
+            rating_stddev=options['rating_stddev'],
+            seed=options['seed'],
+        )
+        if spec.teachers < 1 or spec.days < 1 or spec.requests_per_day < 1:
+            raise CommandError('teachers, days and requests-per-day must be positive')
+        if not 0 < spec.slot_density <= 1:
+            raise CommandError('slot-density must be in (0, 1]')
+
+        with benchmark_database():
+            benchmark = MatchingBenchmark(spec)
+            self.stdout.write(f'Generating {spec} on {connection.vendor}...')
+            with offline_services() as smtp:
+                benchmark.setup()
+                results = benchmark.run()
+                emails = len(smtp.outbox)
+
+        for stage, result in results.items():
+            self.stdout.write(
+                f"{stage:<12} {result['operations']:>6} ops  {result['ops_per_sec'] or 0:>9.1f} ops/s  "
+                f"{result['queries']:>3} queries  p50 {result['p50_ms']:>8.2f} ms  "
+                f"p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms"
+            )
+        outcomes = {**benchmark.outcomes, 'emails': emails}
+        self.stdout.write(', '.join(f'{key}: {value}' for key, value in outcomes.items()))
+
+        run = {
+            'meta': {
+                'database': connection.vendor,
+                'workload': asdict(spec),
+                'python': platform.python_version(),
+                'created_at': timezone.now().isoformat(),
+                'outcomes': outcomes,
+            },
+            'results': results,
+        }
+        self.finish(run, options)
@@ -0,0 +1,114 @@
+"""
+Matching-engine microbenchmark.
+
+Every synthetic request goes through the steps a real one does, timed and
+query-counted separately:
+
+    rank    get_ranked_teachers with the school's settings, first batch
+    invite  process_teacher_batch: invitations, socket notification, email
+    assign  SubstituteRequest.assign_teacher for the best ranked teacher
+
+plus end_to_end, their sum. Before a day's requests are matched, one at a
+time, the stage
+
+    plan    optimizer.plan_requests over all of them, the planning (queries
+            and assignment) match_school_day does under its lock
+
+is timed once per day; it sends nothing, so the stages above are unchanged.
+A day's requests are matched one after another
+against the same teacher pool, so later requests see the availability that
+earlier assignments split or booked, as with concurrent requests in
+production. SMTP and JioMeet are stubbed (see stubs.py) and the channel
+layer is the in-memory one from benchmarks.settings.
+"""
+import statistics
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from substitutes.optimizer import plan_requests
+from substitutes.tasks import get_ranked_teachers, process_teacher_batch
+from .harness import percentile
+from .workload import generate_workload
+
+STAGES = ('rank', 'invite', 'assign')
+# Timed per day rather than per request, so not part of end_to_end
+DAY_STAGES = ('plan',)
+
+
+class MatchingBenchmark:
+    def __init__(self, spec):
+        self.spec = spec
+        self.timings = {stage: [] for stage in (*DAY_STAGES, *STAGES, 'end_to_end')}
+        self.queries = {stage: [] for stage in (*DAY_STAGES, *STAGES, 'end_to_end')}
+        self.outcomes = {'matched': 0, 'unmatched': 0, 'conflicts': 0, 'invitations': 0}
+
+    def setup(self):
+        self.school, self.admin, self.requests_by_date = generate_workload(self.spec)
+
+    def run(self):
+        settings = self.school.get_algorithm_settings
+        for date in sorted(self.requests_by_date):
+            self.timed('plan', plan_requests, self.requests_by_date[date], settings)
+            for substitute_request in self.requests_by_date[date]:
+                self.match(substitute_request)
+        return self.summary()
+
+    def timed(self, stage, func, *args):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            result = func(*args)
+            elapsed = (time.perf_counter() - started) * 1000
+        self.timings[stage].append(elapsed)
+        self.queries[stage].append(len(captured))
+        return result, elapsed, len(captured)
+
+    def rank(self, substitute_request):
+        settings = self.school.get_algorithm_settings
+        return list(get_ranked_teachers(substitute_request, settings)[:settings.batch_size])
+
+    def assign(self, substitute_request, ranked):
+        try:
+            substitute_request.assign_teacher(ranked[0].teacher)
+            return True
+        except ValidationError:
+            # The teacher was booked by an earlier request in the meantime
+            return False
+
+    def match(self, substitute_request):
+        ranked, total_ms, total_queries = self.timed('rank', self.rank, substitute_request)
+        if not ranked:
+            self.outcomes['unmatched'] += 1
+        else:
+            _, elapsed, queries = self.timed('invite', process_teacher_batch, substitute_request, ranked, 1)
+            total_ms += elapsed
+            total_queries += queries
+            self.outcomes['invitations'] += len(ranked)
+
+            assigned, elapsed, queries = self.timed('assign', self.assign, substitute_request, ranked)
+            total_ms += elapsed
+            total_queries += queries
+            self.outcomes['matched' if assigned else 'conflicts'] += 1
+
+        self.timings['end_to_end'].append(total_ms)
+        self.queries['end_to_end'].append(total_queries)
+
+    def summary(self):
+        results = {}
+        for stage, timings in self.timings.items():
+            if not timings:
+                continue
+            queries = self.queries[stage]
+            results[stage] = {
+                'operations': len(timings),
+                'ops_per_sec': round(len(timings) / (sum(timings) / 1000), 2) if sum(timings) else None,
+                'queries': max(queries),
+                'queries_mean': round(statistics.fmean(queries), 2),
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'alloc_peak_kb': None,
+            }
+        return results
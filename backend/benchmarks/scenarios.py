@@ -0,0 +1,156 @@
+"""
+The REST API scenarios and the dataset they run against.
+
+Read-only scenarios run first so that the rows created by request
+create/accept/decline do not change what the list endpoints return.
+Accept and decline use their own teacher for the same reason, and the
+sessions and recordings belong to a third teacher and a second school.
+"""
+from datetime import time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import StudentProfile
+from accounts.sample_data import SampleDataScale, generate_sample_data
+from substitutes.models import RequestInvitation, SubstituteRequest
+from teaching_sessions.models import SessionRecording, TeachingSession
+from .harness import Scenario
+
+User = get_user_model()
+
+BENCHMARK_SCALE = SampleDataScale(
+    schools=5,
+    teachers_per_school=10,
+    external_teachers=50,
+    students_per_school=100,
+    availability_days=7,
+)
+
+# Students of the benchmarked school left waiting for verification
+PENDING_USERS = 100
+
+# Requests the reading teacher has been invited to
+INVITED_REQUESTS = 50
+
+# Assigned requests, each with a session and a recording, of the session teacher
+RECORDED_SESSIONS = 20
+
+
+class ApiBenchmark:
+    def __init__(self, scale=BENCHMARK_SCALE, seed=1234):
+        self.scale = scale
+        self.seed = seed
+
+    def setup(self):
+        schools = generate_sample_data(self.scale, seed=self.seed)
+        self.school = schools[0]
+        self.admin = User.objects.get(username='admin1')
+        self.recorded_school = schools[1]
+        self.recorded_admin = User.objects.get(username='admin2')
+        self.teacher = User.objects.get(username='external1')
+        self.responder = User.objects.get(username='external2')
+        self.session_teacher = User.objects.get(username='external3')
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+        pending_ids = StudentProfile.objects.filter(
+            school=self.school
+        ).values_list('user_id', flat=True)[:PENDING_USERS]
+        User.objects.filter(id__in=list(pending_ids)).update(profile_verification_status='PENDING')
+
+        for i in range(INVITED_REQUESTS):
+            self.invite(self.teacher, i)
+        for i in range(RECORDED_SESSIONS):
+            self.record(self.session_teacher, i)
+
+        self.admin_client = self.login('admin1@school.edu', 'admin123')
+        self.teacher_client = self.login('external1@teacher.com', 'external123')
+        self.responder_client = self.login('external2@teacher.com', 'external123')
+        self.session_client = self.login('external3@teacher.com', 'external123')
+        self.recorded_admin_client = self.login('admin2@school.edu', 'admin123')
+
+    def login(self, email, password):
+        client = APIClient()
+        response = client.post('/api/login/', {'email': email, 'password': password}, format='json')
+        if response.status_code != 200:
+            raise RuntimeError(f"Login as {email} failed: {response.data}")
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return client
+
+    def invite(self, teacher, index):
+        """A request of the benchmarked school awaiting `teacher`'s answer"""
+        substitute_request = SubstituteRequest.objects.create(
+            school=self.school,
+            requested_by=self.admin,
+            subject='MATHS',
+            grade='10',
+            date=self.tomorrow,
+            start_time=time(9 + index % 8),
+            end_time=time(10 + index % 8),
+            description='Benchmark request',
+            status='AWAITING_ACCEPTANCE',
+        )
+        RequestInvitation.objects.create(substitute_request=substitute_request, teacher=teacher)
+        return substitute_request
+
+    def record(self, teacher, index):
+        """An OFFLINE request of the second school assigned to `teacher`, its session (see signals) and a recording"""
+        substitute_request = SubstituteRequest.objects.create(
+            school=self.recorded_school,
+            requested_by=self.recorded_admin,
+            assigned_teacher=teacher,
+            subject='MATHS',
+            grade='10',
+            section='A',
+            date=self.tomorrow + timedelta(days=1 + index // 8),
+            start_time=time(9 + index % 8),
+            end_time=time(10 + index % 8),
+            description='Benchmark session',
+            mode='OFFLINE',
+            status='ASSIGNED',
+        )
+        session = TeachingSession.objects.get(substitute_request=substitute_request)
+        return SessionRecording.objects.create(
+            session=session, recording_url='https://recordings.example.com/benchmark', status='COMPLETED',
+        )
+
+    def get(self, client, path):
+        return lambda i: (lambda: client.get(path))
+
+    def create_request(self, i):
+        payload = {
+            'subject': 'MATHS',
+            'grade': '10',
+            'section': 'A',
+            'date': self.tomorrow.isoformat(),
+            'start_time': '10:00',
+            'end_time': '11:00',
+            'priority': 'MEDIUM',
+            'mode': 'ONLINE',
+            'description': f'Benchmark request {i}',
+        }
+        return lambda: self.admin_client.post('/api/substitute-requests/', payload, format='json')
+
+    def accept_request(self, i):
+        substitute_request = self.invite(self.responder, i)
+        path = f'/api/substitute-requests/{substitute_request.id}/accept_request/'
+        return lambda: self.responder_client.post(path)
+
+    def decline_request(self, i):
+        substitute_request = self.invite(self.responder, i)
+        path = f'/api/substitute-requests/{substitute_request.id}/decline_request/'
+        return lambda: self.responder_client.post(path, {'response_note': 'Not available'}, format='json')
+
+    def scenarios(self):
+        return [
+            Scenario('profile', self.get(self.teacher_client, '/api/profile/')),
+            Scenario('pending_verifications', self.get(self.admin_client, '/api/profiles/pending-verification/')),
+            Scenario('requests_to_me', self.get(self.teacher_client, '/api/substitute-requests/requests_to_me/')),
+            Scenario('school_requests', self.get(self.admin_client, '/api/substitute-requests/school_requests/')),
+            Scenario('teaching_sessions', self.get(self.session_client, '/api/teaching-sessions/sessions/')),
+            Scenario('session_recordings', self.get(self.recorded_admin_client, '/api/teaching-sessions/recordings/')),
+            Scenario('request_create', self.create_request, expected_status=201),
+            Scenario('request_accept', self.accept_request),
+            Scenario('request_decline', self.decline_request),
+        ]
@@ -0,0 +1,62 @@
+"""
+Settings for running the benchmarks offline.
+
+    python manage.py benchmark_api --settings=benchmarks.settings
+
+BENCHMARK_DATABASE=sqlite (the default) runs against an in-memory SQLite
+test database; BENCHMARK_DATABASE=postgres uses the DB_* settings, on a
+throwaway test_<DB_NAME> database. Redis, the channel layer, the Celery
+broker and SMTP are replaced by in-process backends so nothing leaves the
+machine.
+"""
+import os
+
+# The project settings require these; none of them is used offline
+for name, value in {
+    'SECRET_KEY': 'benchmark-only-secret-key-not-for-deployment',
+    'DB_NAME': 'teacher_hub', 'DB_USER': '', 'DB_PASSWORD': '', 'DB_HOST': 'localhost', 'DB_PORT': '5432',
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'EMAIL_HOST': 'localhost', 'EMAIL_PORT': '25', 'EMAIL_HOST_USER': 'benchmark@localhost',
+    'EMAIL_HOST_PASSWORD': '',
+}.items():
+    os.environ.setdefault(name, value)
+
+from backend.settings import *  # noqa: E402,F401,F403
+from backend.settings import INSTALLED_APPS  # noqa: E402
+
+INSTALLED_APPS = [*INSTALLED_APPS, 'benchmarks']
+
+if os.environ.get('BENCHMARK_DATABASE', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'KEY_PREFIX': 'teacher_hub',
+    },
+}
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+# Tasks are queued and never consumed: request_create measures the enqueue
+CELERY_BROKER_URL = 'memory://'
+
+# Push replay streams and presence live in Redis
+PUSH_STREAM_ENABLED = False
+PRESENCE_ENABLED = False
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# Seeding hashes thousands of passwords; the hasher is not what is measured
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+DEBUG = False
@@ -0,0 +1,63 @@
+"""
+In-process stand-ins for the network services the matching flow talks to.
+
+process_teacher_batch sends invitation emails with smtplib directly (see
+substitutes.tasks.send_emergency_email), bypassing EMAIL_BACKEND, so SMTP is
+patched at the smtplib level. Assigning an online request creates a JioMeet
+room over HTTP, which is replaced by a canned response. The channel layer is
+the in-memory one from benchmarks.settings.
+"""
+import os
+from contextlib import contextmanager, redirect_stdout
+from unittest import mock
+
+
+class RecordingSMTP:
+    """Accepts every message and keeps it in RecordingSMTP.outbox"""
+    outbox = []
+
+    def __init__(self, host='', port=0, *args, **kwargs):
+        self.host = host
+        self.port = port
+
+    def starttls(self, *args, **kwargs):
+        return (220, b'ready')
+
+    def login(self, user, password):
+        return (235, b'ok')
+
+    def send_message(self, msg, *args, **kwargs):
+        self.outbox.append(msg)
+        return {}
+
+    def sendmail(self, from_addr, to_addrs, msg, *args, **kwargs):
+        self.outbox.append(msg)
+        return {}
+
+    def quit(self):
+        return (221, b'bye')
+
+    close = quit
+
+
+def fake_jiomeet_meeting(name, title, description):
+    """Same shape as a successful substitutes.utils.create_jiomeet_meeting"""
+    link = 'https://jiomeet.example.com/room/benchmark'
+    return {'meetingLink': link, 'host_link': f'{link}?hostToken=benchmark'}
+
+
+@contextmanager
+def offline_services(quiet=True):
+    """
+    Patch SMTP and JioMeet and, with quiet=True, swallow the print() diagnostics the
+    request flow emits, which would otherwise dominate the timings.
+    """
+    RecordingSMTP.outbox = []
+    with mock.patch('smtplib.SMTP', RecordingSMTP), \
+            mock.patch('smtplib.SMTP_SSL', RecordingSMTP), \
+            mock.patch('substitutes.models.create_jiomeet_meeting', fake_jiomeet_meeting):
+        if quiet:
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                yield RecordingSMTP
+        else:
+            yield RecordingSMTP
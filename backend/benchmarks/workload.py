@@ -0,0 +1,204 @@
+"""
+Synthetic matching workload: one school, a pool of external teachers with
+profiles and availability, and substitute requests spread over several days.
+
+Distributions are tunable through WorkloadSpec:
+
+- subjects follow a Zipf law over SUBJECTS_POOL (subject_skew=0 is uniform),
+  both for what teachers teach and for what requests ask for
+- ratings are normal around rating_mean, clipped to 1..5
+- every teacher is available in each hourly slot with probability
+  slot_density; consecutive free hours form one availability row, the way
+  teachers enter them, so assignment has ranges to split
+
+Rows are written with bulk_create and one shared password hash, which skips
+model signals and validation; the data is generated valid.
+"""
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from accounts.models import School, SchoolStaff, TeacherAvailability, TeacherProfile
+from accounts.sample_data import QUALIFICATIONS_POOL, SUBJECTS_POOL
+from substitutes.models import SubstituteRequest
+
+User = get_user_model()
+
+# Hourly slots from FIRST_HOUR to LAST_HOUR (exclusive)
+FIRST_HOUR = 9
+LAST_HOUR = 17
+
+BULK_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class WorkloadSpec:
+    teachers: int = 500
+    days: int = 5
+    requests_per_day: int = 40
+    slot_density: float = 0.4
+    subject_skew: float = 1.0
+    subjects_per_teacher: int = 3
+    rating_mean: float = 4.0
+    rating_stddev: float = 0.5
+    seed: int = 1234
+
+
+def zipf_weights(count, skew):
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+class WorkloadGenerator:
+    def __init__(self, spec):
+        self.spec = spec
+        self.random = random.Random(spec.seed)
+        self.subject_weights = zipf_weights(len(SUBJECTS_POOL), spec.subject_skew)
+        self.start_date = timezone.now().date() + timedelta(days=1)
+
+    def pick_subjects(self, count):
+        """`count` distinct subjects drawn by weight"""
+        chosen = []
+        while len(chosen) < min(count, len(SUBJECTS_POOL)):
+            subject = self.random.choices(SUBJECTS_POOL, weights=self.subject_weights)[0]
+            if subject not in chosen:
+                chosen.append(subject)
+        return chosen
+
+    def token(self):
+        """Name suffix, so several workloads can share a database"""
+        return f"{self.random.getrandbits(32):08x}"
+
+    def rating(self):
+        return round(min(5.0, max(1.0, self.random.gauss(self.spec.rating_mean, self.spec.rating_stddev))), 1)
+
+    def generate(self):
+        """Create the workload; returns (school, admin, requests by date)"""
+        school, admin = self.create_school()
+        teachers = self.create_teachers()
+        self.create_availability(teachers)
+        return school, admin, self.create_requests(school, admin)
+
+    def create_school(self):
+        token = self.token()
+        school = School.objects.create(
+            school_name=f"Benchmark School {token}",
+            category="SECONDARY",
+            address="1 Benchmark Road",
+            city="New Delhi",
+            state="Delhi",
+            country="India",
+            postal_code="110001",
+            contact_person="Benchmark Principal",
+            registration_number=f"BENCH{token}",
+            board_type="CBSE",
+            established_year=2000,
+        )
+        admin = User.objects.create_user(
+            username=f"bench_admin_{token}",
+            email=f"bench_admin_{token}@school.edu",
+            password=None,
+            user_type="SCHOOL_ADMIN",
+            profile_verification_status="VERIFIED",
+            profile_completed=True,
+        )
+        SchoolStaff.objects.create(user=admin, school=school, role="ADMIN")
+        return school, admin
+
+    def create_teachers(self):
+        password = make_password(None)
+        token = self.token()
+        users = [
+            User(
+                id=uuid.UUID(int=self.random.getrandbits(128), version=4),
+                username=f"bench_{token}_{i}",
+                email=f"bench_{token}_{i}@teacher.com",
+                password=password,
+                first_name="Teacher",
+                last_name=str(i),
+                user_type="EXTERNAL_TEACHER",
+                profile_verification_status="VERIFIED",
+                profile_completed=True,
+            )
+            for i in range(self.spec.teachers)
+        ]
+        User.objects.bulk_create(users, batch_size=BULK_BATCH_SIZE)
+
+        profiles = [
+            TeacherProfile(
+                user=user,
+                teacher_type="EXTERNAL",
+                qualification=self.random.sample(QUALIFICATIONS_POOL, 2),
+                subjects=self.pick_subjects(self.spec.subjects_per_teacher),
+                experience_years=self.random.randint(1, 25),
+                availability_status="AVAILABLE",
+                can_teach_online=True,
+                rating=self.rating(),
+            )
+            for user in users
+        ]
+        TeacherProfile.objects.bulk_create(profiles, batch_size=BULK_BATCH_SIZE)
+        return profiles
+
+    def free_ranges(self):
+        """Contiguous (start_hour, end_hour) ranges of one teacher's day"""
+        ranges = []
+        start = None
+        for hour in range(FIRST_HOUR, LAST_HOUR):
+            free = self.random.random() < self.spec.slot_density
+            if free and start is None:
+                start = hour
+            elif not free and start is not None:
+                ranges.append((start, hour))
+                start = None
+        if start is not None:
+            ranges.append((start, LAST_HOUR))
+        return ranges
+
+    def create_availability(self, profiles):
+        rows = []
+        for profile in profiles:
+            for day in range(self.spec.days):
+                date = self.start_date + timedelta(days=day)
+                for start, end in self.free_ranges():
+                    rows.append(TeacherAvailability(
+                        teacher_id=profile.user_id,
+                        date=date,
+                        start_time=time(start),
+                        end_time=time(end),
+                        status="AVAILABLE",
+                        preferred_subjects=profile.subjects[:2],
+                    ))
+                if len(rows) >= BULK_BATCH_SIZE:
+                    TeacherAvailability.objects.bulk_create(rows)
+                    rows = []
+        TeacherAvailability.objects.bulk_create(rows)
+
+    def create_requests(self, school, admin):
+        by_date = {}
+        for day in range(self.spec.days):
+            date = self.start_date + timedelta(days=day)
+            requests = []
+            for _ in range(self.spec.requests_per_day):
+                hour = self.random.randrange(FIRST_HOUR, LAST_HOUR)
+                requests.append(SubstituteRequest(
+                    school=school,
+                    requested_by=admin,
+                    subject=self.pick_subjects(1)[0],
+                    grade="10",
+                    date=date,
+                    start_time=time(hour),
+                    end_time=time(hour + 1),
+                    description="Synthetic benchmark request",
+                    mode="ONLINE",
+                ))
+            by_date[date] = SubstituteRequest.objects.bulk_create(requests)
+        return by_date
+
+
+def generate_workload(spec):
+    return WorkloadGenerator(spec).generate()
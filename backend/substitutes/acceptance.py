@@ -0,0 +1,141 @@
+"""
+First-wins acceptance of substitute request invitations.
+
+The winner is decided by a single conditional UPDATE on the request row:
+it only matches while the request is still open and the teacher holds a
+pending, unexpired invitation. Concurrent accepts queue on that row lock
+and, once the winner commits, re-check the condition and match nothing, so
+exactly one teacher is assigned. The winner's transaction then only marks
+the invitations and creates the teaching session, which keeps the lock held
+for a few statements; the JioMeet call for online requests runs after
+commit.
+
+A request filed as part of a RequestGroup is accepted together with the
+group's other open periods the teacher holds pending invitations for, so a
+teacher invited to a whole block takes all of it. The group's rows are
+locked in id order first, so teachers accepting different periods of one
+group at once cannot deadlock.
+"""
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from accounts.models import StudentProfile
+from teaching_sessions.models import TeachingSession
+from .models import RequestInvitation, SubstituteRequest
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ('PENDING', 'AWAITING_ACCEPTANCE')
+
+ACCEPTED = 'accepted'
+ALREADY_TAKEN = 'already_taken'
+NOT_INVITED = 'not_invited'
+
+
+def accept_invitation(substitute_request, teacher, now=None):
+    """
+    Assigns teacher to substitute_request if they are the first to accept.
+    Returns ACCEPTED, ALREADY_TAKEN when the request is no longer open, or
+    NOT_INVITED when the teacher has no pending, unexpired invitation.
+    """
+    now = now or timezone.now()
+    pending_invitation = RequestInvitation.objects.filter(
+        substitute_request_id=OuterRef('pk'),
+        teacher=teacher,
+        status='PENDING',
+        expires_at__gt=now,
+    )
+
+    claimed = [substitute_request]
+    with transaction.atomic():
+        if substitute_request.group_id:
+            list(
+                SubstituteRequest.objects.filter(group_id=substitute_request.group_id)
+                .order_by('pk').select_for_update().values_list('pk', flat=True)
+            )
+        won = SubstituteRequest.objects.filter(
+            Exists(pending_invitation),
+            pk=substitute_request.pk,
+            status__in=OPEN_STATUSES,
+        ).update(
+            assigned_teacher=teacher,
+            status='ASSIGNED',
+            escalate_at=None,
+            updated_at=now,
+        )
+        if won:
+            if substitute_request.group_id:
+                claimed += list(SubstituteRequest.objects.filter(
+                    Exists(pending_invitation),
+                    group_id=substitute_request.group_id,
+                    status__in=OPEN_STATUSES,
+                ).exclude(pk=substitute_request.pk))
+                SubstituteRequest.objects.filter(pk__in=[request.pk for request in claimed[1:]]).update(
+                    assigned_teacher=teacher,
+                    status='ASSIGNED',
+                    escalate_at=None,
+                    updated_at=now,
+                )
+            invitations = RequestInvitation.objects.filter(substitute_request__in=claimed)
+            invitations.filter(teacher=teacher).update(status='ACCEPTED', responded_at=now)
+            invitations.filter(status='PENDING').update(status='WITHDRAWN', responded_at=now)
+
+            for request in claimed:
+                request.assigned_teacher = teacher
+                request.status = 'ASSIGNED'
+                request.escalate_at = None
+                create_session(request, teacher)
+
+    if not won:
+        status = SubstituteRequest.objects.filter(pk=substitute_request.pk).values_list('status', flat=True).first()
+        return NOT_INVITED if status in OPEN_STATUSES else ALREADY_TAKEN
+
+    for request in claimed:
+        add_meeting_link(request)
+    return ACCEPTED
+
+
+def create_session(substitute_request, teacher):
+    """
+    The session for an assigned request, with the students of its class.
+    The create_teaching_session signal does this on save(); accepting
+    updates the row directly, so it is done here.
+    """
+    start_time = timezone.make_aware(datetime.datetime.combine(substitute_request.date, substitute_request.start_time))
+    end_time = timezone.make_aware(datetime.datetime.combine(substitute_request.date, substitute_request.end_time))
+    session, created = TeachingSession.objects.get_or_create(
+        substitute_request=substitute_request,
+        defaults={
+            'teacher': teacher,
+            'start_time': start_time,
+            'end_time': end_time,
+            'status': 'SCHEDULED',
+            'mode': substitute_request.mode,
+        }
+    )
+    if created:
+        session.students.add(*StudentProfile.objects.filter(
+            school_id=substitute_request.school_id,
+            grade=substitute_request.grade,
+            section=substitute_request.section,
+        ).values_list('user_id', flat=True))
+    return session
+
+
+def add_meeting_link(substitute_request):
+    """Online requests get their JioMeet link once assigned, as save() would"""
+    if substitute_request.mode not in ['ONLINE', 'HYBRID'] or substitute_request.meeting_link:
+        return
+    try:
+        substitute_request.generate_meeting_link()
+    except Exception:
+        logger.exception(f"Could not create a meeting for request {substitute_request.id}")
+        return
+    SubstituteRequest.objects.filter(pk=substitute_request.pk).update(
+        meeting_link=substitute_request.meeting_link,
+        host_link=substitute_request.host_link,
+    )
@@ -0,0 +1,452 @@
+"""
+Learned ranking of candidate teachers by expected time to accept.
+
+RequestInvitation keeps the outcome of every invitation sent. Training
+(the train_acceptance_model command, or the weekly task) fits a small
+L2-regularised logistic regression of P(accept) with NumPy on the decided
+invitations: ACCEPTED against DECLINED and EXPIRED. WITHDRAWN and PENDING
+ones never got an answer. The features are the teacher's experience,
+rating and smoothed past acceptance rate, left-one-out while training so an
+invitation's own outcome is not among its features.
+
+A model is fitted for any subject and time of day, per subject, and per
+subject and time of day (see DAYPARTS), wherever there are at least
+MIN_SEGMENT_SAMPLES invitations: over all schools, and for each school with
+that much history of its own. Coefficients are stored as AcceptanceModel
+rows, per-teacher rates and response times as TeacherAcceptanceStats.
+
+Ranking orders candidates by the minutes expected until one accepts: their
+smoothed response time divided by P(accept). The model used is the most
+specific segment trained, the school's before the global one. Schools with
+'ranking': 'weighted' in their algorithm settings, or with no model trained
+at all, keep the weighted score.
+
+Before saving, training replays the newest HOLDOUT_FRACTION of filled
+requests with models fitted on the older ones, under the weighted and the
+learned order, and reports the escalation rounds and emails each would have
+needed. Models are only saved when the learned order needed fewer of both;
+otherwise the stored ones are removed too, and every school ranks by weight
+until a later training shows an improvement.
+"""
+import logging
+import math
+from collections import defaultdict, namedtuple
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.functions import Coalesce, Exp, Greatest, Least
+from django.utils import timezone
+
+from accounts.caching import bump_version, get_version
+from .models import AcceptanceModel, RequestInvitation, TeacherAcceptanceStats
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ('experience_years', 'rating', 'acceptance_rate')
+# Outcomes that answer whether the teacher would accept
+DECIDED = ('ACCEPTED', 'DECLINED', 'EXPIRED')
+# Periods starting before each hour fall in that part of the day
+DAYPARTS = (('morning', 12), ('afternoon', 16), ('evening', 24))
+
+HISTORY_DAYS = 365
+MIN_SEGMENT_SAMPLES = 200
+HOLDOUT_FRACTION = 0.2
+L2_PENALTY = 1.0
+# Pseudo-invitations at the overall rate added to every teacher's history
+PRIOR_STRENGTH = 5
+# Keeps exp() of the logit finite, in SQL too
+MAX_LOGIT = 30.0
+
+MODELS_VERSION_KEY = 'substitutes:acceptance-models:version'
+MODELS_CACHE_TIMEOUT = 60 * 60 * 24  # seconds
+
+Invitation = namedtuple('Invitation', [
+    'request_id', 'school_id', 'subject', 'daypart', 'teacher_id', 'accepted',
+    'invited_at', 'response_minutes', 'experience_years', 'rating',
+])
+
+
+def daypart(start_time):
+    for name, before_hour in DAYPARTS:
+        if start_time.hour < before_hour:
+            return name
+    return DAYPARTS[-1][0]
+
+
+def fit_logistic(X, y, l2=L2_PENALTY, iterations=25, tolerance=1e-8):
+    """
+    L2-regularised logistic regression by Newton's method. X (n x k) should
+    be standardised; an unpenalised intercept is added. Returns k + 1
+    weights, intercept first.
+    """
+    X = np.hstack([np.ones((len(X), 1)), X])
+    penalty = np.full(X.shape[1], float(l2))
+    penalty[0] = 0.0
+    weights = np.zeros(X.shape[1])
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-np.clip(X @ weights, -MAX_LOGIT, MAX_LOGIT)))
+        gradient = X.T @ (p - y) + penalty * weights
+        hessian = (X.T * (p * (1.0 - p))) @ X + np.diag(penalty + 1e-9)
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.abs(step).max() < tolerance:
+            break
+    return weights
+
+
+@dataclass(frozen=True)
+class Coefficients:
+    """One segment's model, in raw feature units (see FEATURES)"""
+    intercept: float
+    weights: tuple
+    prior_rate: float
+    response_minutes: float
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            intercept=row.coefficients['intercept'],
+            weights=tuple(row.coefficients[name] for name in FEATURES),
+            prior_rate=row.prior_rate,
+            response_minutes=row.response_minutes,
+        )
+
+    def as_json(self):
+        return {'intercept': self.intercept, **dict(zip(FEATURES, self.weights))}
+
+    def acceptance_probability(self, experience_years, rating, acceptance_rate=None):
+        rate = self.prior_rate if acceptance_rate is None else acceptance_rate
+        logit = self.intercept + sum(
+            weight * float(value) for weight, value in zip(self.weights, (experience_years, rating, rate))
+        )
+        return 1.0 / (1.0 + math.exp(-min(max(logit, -MAX_LOGIT), MAX_LOGIT)))
+
+    def expected_minutes(self, experience_years, rating, acceptance_rate=None, response_minutes=None):
+        """Minutes until this teacher accepts, on average"""
+        minutes = self.response_minutes if response_minutes is None else response_minutes
+        return minutes / self.acceptance_probability(experience_years, rating, acceptance_rate)
+
+    def expected_minutes_expression(self, teacher='teacher'):
+        """expected_minutes() in SQL, for rows whose teacher is reached through `teacher`"""
+        experience, rating, rate = self.weights
+        logit = (
+            Value(self.intercept)
+            + ExpressionWrapper(F(f'{teacher}__teacher_profile__experience_years') * Value(experience), output_field=FloatField())
+            + ExpressionWrapper(F(f'{teacher}__teacher_profile__rating') * Value(rating), output_field=FloatField())
+            + Coalesce(F(f'{teacher}__acceptance_stats__acceptance_rate'), Value(self.prior_rate)) * Value(rate)
+        )
+        logit = Least(Greatest(logit, Value(-MAX_LOGIT)), Value(MAX_LOGIT), output_field=FloatField())
+        # minutes / P(accept) = minutes * (1 + e^-logit)
+        return ExpressionWrapper(
+            Coalesce(F(f'{teacher}__acceptance_stats__response_minutes'), Value(self.response_minutes))
+            * (Value(1.0) + Exp(-logit)),
+            output_field=FloatField()
+        )
+
+
+def _models_key(school_id, version):
+    return f'substitutes:acceptance-models:{version}:{school_id}'
+
+
+def school_models(school_id):
+    """{(school's own, subject, daypart): Coefficients} usable for school_id"""
+    rows = AcceptanceModel.objects.filter(Q(school_id=school_id) | Q(school__isnull=True))
+    try:
+        key = _models_key(school_id, get_version(MODELS_VERSION_KEY))
+        models = cache.get(key)
+        if models is None:
+            models = {(row.school_id is not None, row.subject, row.daypart): Coefficients.from_row(row) for row in rows}
+            cache.set(key, models, MODELS_CACHE_TIMEOUT)
+        return models
+    except Exception as e:
+        logger.warning("Acceptance model cache unavailable: %s", e)
+        return {(row.school_id is not None, row.subject, row.daypart): Coefficients.from_row(row) for row in rows}
+
+
+def pick_coefficients(models, subject, part):
+    """The most specific of models for subject and daypart, the school's first"""
+    for segment in ((subject, part), (subject, ''), ('', '')):
+        for own in (True, False):
+            found = models.get((own, *segment))
+            if found is not None:
+                return found
+    return None
+
+
+def coefficients_for(school_id, subject, start_time):
+    """The model for a request, or None when none is trained"""
+    return pick_coefficients(school_models(school_id), subject, daypart(start_time))
+
+
+def load_history(since):
+    """Decided invitations since `since`, oldest first"""
+    rows = RequestInvitation.objects.filter(
+        status__in=DECIDED,
+        invited_at__gte=since,
+        teacher__teacher_profile__isnull=False,
+    ).order_by('invited_at', 'id').values_list(
+        'substitute_request_id', 'substitute_request__school_id', 'substitute_request__subject',
+        'substitute_request__start_time', 'teacher_id', 'status', 'invited_at', 'responded_at',
+        'teacher__teacher_profile__experience_years', 'teacher__teacher_profile__rating',
+    )
+    history = []
+    for request_id, school_id, subject, start_time, teacher_id, status, invited_at, responded_at, experience, rating in rows:
+        accepted = status == 'ACCEPTED'
+        minutes = None
+        if accepted and responded_at:
+            minutes = max((responded_at - invited_at).total_seconds() / 60, 0.0)
+        history.append(Invitation(
+            request_id, school_id, subject, daypart(start_time), teacher_id, accepted,
+            invited_at, minutes, float(experience or 0), float(rating or 0),
+        ))
+    return history
+
+
+def priors(history):
+    """(overall acceptance rate, mean minutes to accept)"""
+    rate = sum(row.accepted for row in history) / len(history)
+    minutes = [row.response_minutes for row in history if row.response_minutes is not None]
+    return rate, (sum(minutes) / len(minutes) if minutes else 5.0)
+
+
+def teacher_stats(history, prior_rate, prior_minutes):
+    """{teacher id: (invitations, accepted, smoothed rate, smoothed minutes to accept)}"""
+    counts = defaultdict(lambda: [0, 0, 0.0, 0])
+    for row in history:
+        count = counts[row.teacher_id]
+        count[0] += 1
+        count[1] += row.accepted
+        if row.response_minutes is not None:
+            count[2] += row.response_minutes
+            count[3] += 1
+    return {
+        teacher_id: (
+            invited,
+            accepted,
+            (accepted + PRIOR_STRENGTH * prior_rate) / (invited + PRIOR_STRENGTH),
+            (minutes + PRIOR_STRENGTH * prior_minutes) / (timed + PRIOR_STRENGTH),
+        )
+        for teacher_id, (invited, accepted, minutes, timed) in counts.items()
+    }
+
+
+def _training_matrix(history, stats, prior_rate):
+    """Features with each row's own outcome left out of its teacher's rate"""
+    X = np.empty((len(history), len(FEATURES)))
+    y = np.empty(len(history))
+    for index, row in enumerate(history):
+        invited, accepted = stats[row.teacher_id][:2]
+        rate = (accepted - row.accepted + PRIOR_STRENGTH * prior_rate) / (invited - 1 + PRIOR_STRENGTH)
+        X[index] = (row.experience_years, row.rating, rate)
+        y[index] = row.accepted
+    return X, y
+
+
+def fit_segments(history, stats, prior_rate, prior_minutes, min_samples=MIN_SEGMENT_SAMPLES):
+    """{(subject, daypart): (Coefficients, samples)} for segments with enough history of both outcomes"""
+    segments = defaultdict(list)
+    for index, row in enumerate(history):
+        segments[('', '')].append(index)
+        segments[(row.subject, '')].append(index)
+        segments[(row.subject, row.daypart)].append(index)
+
+    X, y = _training_matrix(history, stats, prior_rate)
+    fitted = {}
+    for segment, indices in segments.items():
+        if len(indices) < min_samples or y[indices].min() == y[indices].max():
+            continue
+        features = X[indices]
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        beta = fit_logistic((features - mean) / scale, y[indices])
+        weights = beta[1:] / scale
+        fitted[segment] = (
+            Coefficients(
+                intercept=float(beta[0] - weights @ mean),
+                weights=tuple(float(weight) for weight in weights),
+                prior_rate=prior_rate,
+                response_minutes=prior_minutes,
+            ),
+            len(indices),
+        )
+    return fitted
+
+
+def fit_models(history, min_samples=MIN_SEGMENT_SAMPLES):
+    """
+    ({school id or None: {(subject, daypart): (Coefficients, samples)}},
+    teacher stats, (prior rate, prior minutes)) fitted on history
+    """
+    prior_rate, prior_minutes = priors(history)
+    stats = teacher_stats(history, prior_rate, prior_minutes)
+    by_school = defaultdict(list)
+    for row in history:
+        by_school[row.school_id].append(row)
+
+    fitted = {None: fit_segments(history, stats, prior_rate, prior_minutes, min_samples)}
+    for school_id, rows in by_school.items():
+        if len(rows) >= min_samples:
+            segments = fit_segments(rows, stats, prior_rate, prior_minutes, min_samples)
+            if segments:
+                fitted[school_id] = segments
+    return fitted, stats, (prior_rate, prior_minutes)
+
+
+def replay(history, rank_key, batch_size):
+    """
+    Mean escalation rounds and emails per filled request had each request's
+    invitees been sent in rank_key order, batch_size(school id) at a time
+    """
+    by_request = defaultdict(list)
+    for row in history:
+        by_request[row.request_id].append(row)
+    rounds = []
+    emails = []
+    for rows in by_request.values():
+        if not any(row.accepted for row in rows):
+            continue
+        size = batch_size(rows[0].school_id)
+        position = next(index for index, row in enumerate(sorted(rows, key=rank_key)) if row.accepted)
+        batches = position // size + 1
+        rounds.append(batches - 1)
+        emails.append(min(batches * size, len(rows)))
+    if not rounds:
+        return None
+    return {
+        'filled_requests': len(rounds),
+        'escalation_rounds': sum(rounds) / len(rounds),
+        'emails': sum(emails) / len(emails),
+    }
+
+
+def evaluate(history, min_samples=MIN_SEGMENT_SAMPLES, holdout=HOLDOUT_FRACTION):
+    """
+    Fits on all but the newest `holdout` of requests and replays those under
+    the weighted and the learned order. None without enough history.
+    """
+    from accounts.models import School
+
+    requests = list(dict.fromkeys(row.request_id for row in history))
+    cut = int(len(requests) * (1 - holdout))
+    if not 0 < cut < len(requests):
+        return None
+    tested = set(requests[cut:])
+    train = [row for row in history if row.request_id not in tested]
+    test = [row for row in history if row.request_id in tested]
+    fitted, stats, _ = fit_models(train, min_samples)
+    if not fitted[None]:
+        return None
+
+    settings = {
+        school.pk: school.get_algorithm_settings
+        for school in School.objects.filter(pk__in={row.school_id for row in test})
+    }
+    models = {
+        school_id: {
+            (own, *segment): coefficients
+            for own, source in ((True, fitted.get(school_id, {})), (False, fitted[None]))
+            for segment, (coefficients, _) in source.items()
+        }
+        for school_id in settings
+    }
+
+    def weighted(row):
+        school_settings = settings[row.school_id]
+        return -(row.experience_years * school_settings.experience_weight + row.rating * school_settings.rating_weight)
+
+    def learned(row):
+        coefficients = pick_coefficients(models[row.school_id], row.subject, row.daypart)
+        rate, minutes = stats[row.teacher_id][2:] if row.teacher_id in stats else (None, None)
+        return coefficients.expected_minutes(row.experience_years, row.rating, rate, minutes)
+
+    def batch_size(school_id):
+        return settings[school_id].batch_size
+
+    test = [row for row in test if row.school_id in settings]
+    return {
+        'weighted': replay(test, weighted, batch_size),
+        'learned': replay(test, learned, batch_size),
+    }
+
+
+def learned_is_better(evaluation):
+    """Whether the learned order needed fewer escalation rounds and fewer emails on the holdout"""
+    if not evaluation or not evaluation['weighted'] or not evaluation['learned']:
+        return False
+    weighted, learned = evaluation['weighted'], evaluation['learned']
+    return (
+        learned['escalation_rounds'] < weighted['escalation_rounds']
+        and learned['emails'] < weighted['emails']
+    )
+
+
+def save_models(fitted, stats):
+    """Replaces every stored model and teacher's stats with the fitted ones"""
+    rows = [
+        AcceptanceModel(
+            school_id=school_id,
+            subject=subject,
+            daypart=part,
+            coefficients=coefficients.as_json(),
+            prior_rate=coefficients.prior_rate,
+            response_minutes=coefficients.response_minutes,
+            samples=samples,
+        )
+        for school_id, segments in fitted.items()
+        for (subject, part), (coefficients, samples) in segments.items()
+    ]
+    with transaction.atomic():
+        AcceptanceModel.objects.all().delete()
+        AcceptanceModel.objects.bulk_create(rows)
+        TeacherAcceptanceStats.objects.all().delete()
+        TeacherAcceptanceStats.objects.bulk_create([
+            TeacherAcceptanceStats(
+                teacher_id=teacher_id,
+                invitations=invited,
+                accepted=accepted,
+                acceptance_rate=rate,
+                response_minutes=minutes,
+            )
+            for teacher_id, (invited, accepted, rate, minutes) in stats.items()
+        ], batch_size=1000)
+        transaction.on_commit(lambda: bump_version(MODELS_VERSION_KEY))
+    return len(rows)
+
+
+def train_acceptance_models(days=HISTORY_DAYS, min_samples=MIN_SEGMENT_SAMPLES,
+                            holdout=HOLDOUT_FRACTION, save=True, now=None):
+    """
+    Fits acceptance models on the last `days` of invitations and evaluates
+    them against the weighted ranking. With save, stores them if they beat it
+    (see learned_is_better) and removes the stored ones if not. Returns a
+    report.
+    """
+    now = now or timezone.now()
+    history = load_history(now - timedelta(days=days))
+    report = {'invitations': len(history), 'models': 0, 'evaluation': None, 'improved': False}
+    if not history:
+        return report
+
+    report['evaluation'] = evaluate(history, min_samples, holdout)
+    fitted, stats, (prior_rate, prior_minutes) = fit_models(history, min_samples)
+    report.update(
+        prior_rate=prior_rate,
+        response_minutes=prior_minutes,
+        segments={
+            school_id: sorted(segments) for school_id, segments in fitted.items() if segments
+        },
+    )
+    report['improved'] = learned_is_better(report['evaluation'])
+    if save:
+        # Without an improvement no model is kept, so ranking falls back to the weights
+        report['models'] = save_models(fitted if report['improved'] else {}, stats)
+    logger.info(
+        f"Acceptance models trained on {len(history)} invitations: {report['models']} saved"
+        f"{'' if report['improved'] else ', learned order not better on the holdout'}"
+    )
+    return report
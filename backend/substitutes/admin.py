@@ -1,11 +1,21 @@
 from django.contrib import admin
-from .models import SubstituteRequest, RequestInvitation, Notification
+from .models import (
+    AcceptanceModel, Notification, RequestGroup, RequestInvitation, SubstituteRequest, TeacherAcceptanceStats,
+)
+
+@admin.register(RequestGroup)
+class RequestGroupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'school', 'date', 'requested_by', 'created_at']
+    list_filter = ['date', 'school']
+    raw_id_fields = ['requested_by']
+    date_hierarchy = 'date'
 
 @admin.register(SubstituteRequest)
 class SubstituteRequestAdmin(admin.ModelAdmin):
     list_display = ['id', 'subject', 'grade', 'date', 'start_time', 'end_time', 'status', 'requested_by', 'assigned_teacher']
     list_filter = ['status', 'date', 'subject', 'grade', 'school']
     search_fields = ['subject', 'description', 'requested_by__email', 'assigned_teacher__email']
+    raw_id_fields = ['group']
     date_hierarchy = 'date'
 
 @admin.register(RequestInvitation)
@@ -22,3 +32,15 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ['notification_type', 'is_read']
     search_fields = ['user__email', 'content']
     raw_id_fields = ['user']
+
+@admin.register(AcceptanceModel)
+class AcceptanceModelAdmin(admin.ModelAdmin):
+    list_display = ['id', 'school', 'subject', 'daypart', 'samples', 'prior_rate', 'trained_at']
+    list_filter = ['daypart', 'subject']
+    readonly_fields = ['trained_at']
+
+@admin.register(TeacherAcceptanceStats)
+class TeacherAcceptanceStatsAdmin(admin.ModelAdmin):
+    list_display = ['teacher', 'invitations', 'accepted', 'acceptance_rate', 'response_minutes', 'updated_at']
+    search_fields = ['teacher__email']
+    raw_id_fields = ['teacher']
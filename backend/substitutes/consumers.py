@@ -4,8 +4,29 @@ from channels.auth import get_user
 from django.contrib.auth.models import AnonymousUser
 import json
 from channels.db import database_sync_to_async
+from urllib.parse import parse_qs
+import logging
+
+import redis
+
+from django.conf import settings
+
+from . import presence, push
+
+logger = logging.getLogger(__name__)
 
 class NotificationConsumer(JsonWebsocketConsumer):
+    """
+    Pushes a user's notifications. Messages carry the user's push sequence
+    number ("seq"); a client reconnecting with ?last_seq=N first gets what
+    it missed since N (see substitutes.push), then a {"type": "sync",
+    "seq": ...} marker. Resuming is only accepted on connect: pushes
+    forwarded live afterwards would be replayed a second time.
+    {"type": "resync"} instead means the gap is gone from the replay
+    stream and the inbox must be reloaded over REST.
+    """
+    last_seq = None
+
     def connect(self):
         """Called when WebSocket connects"""
         # Get user from token
@@ -27,7 +48,7 @@ class NotificationConsumer(JsonWebsocketConsumer):
 
         # Add to role-specific groups if applicable
         if hasattr(self.user, 'school_staff'):
-            school_id = str(self.user.school_staff.school.id)
+            school_id = str(self.user.school_staff.school_id)
             role = self.user.school_staff.role.lower()
             school_group = f"school_{school_id}_{role}"
             
@@ -39,10 +60,59 @@ class NotificationConsumer(JsonWebsocketConsumer):
         
         self.accept()
         print(f"WebSocket connection accepted for {self.user.email}")
+        presence.connected(self.user.id, self.channel_name)
+
+        # Joined the group first, so anything pushed during the replay is
+        # delivered live afterwards and deduplicated by seq
+        last_seq = parse_qs(self.scope.get('query_string', b'').decode()).get('last_seq', [None])[0]
+        self.resume(last_seq)
+
+    def receive_json(self, content, **kwargs):
+        """Heartbeats keep the user online"""
+        if content.get('type') == 'heartbeat':
+            presence.heartbeat(self.user.id, self.channel_name)
+
+    def resume(self, last_seq):
+        """Replays pushes after last_seq, or just reports the current seq without one"""
+        if not settings.PUSH_STREAM_ENABLED:
+            return
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            last_seq = None
+        try:
+            if last_seq is None or last_seq < 0:
+                self.last_seq = push.current_seq(self.user.id)
+                self.send_json({"type": "sync", "seq": self.last_seq})
+                return
+            current, missed = push.missed_since(self.user.id, last_seq)
+        except redis.RedisError:
+            logger.exception(f"Could not replay pushes for user {self.user.id}")
+            self.send_json({"type": "resync", "seq": None})
+            return
+
+        if missed is None:
+            self.last_seq = current
+            self.send_json({"type": "resync", "seq": current})
+            return
+        self.last_seq = last_seq
+        for message in missed:
+            self.forward(message)
+        self.send_json({"type": "sync", "seq": self.last_seq, "replayed": len(missed)})
+
+    def forward(self, event):
+        """Sends event unless the client already got it through a replay"""
+        seq = event.get('seq')
+        if seq is not None and self.last_seq is not None:
+            if seq <= self.last_seq:
+                return
+            self.last_seq = seq
+        self.send_json(event)
     
     def disconnect(self, close_code):
         """Called when WebSocket disconnects"""
         if hasattr(self, 'group_name'):
+            presence.disconnected(self.user.id, self.channel_name)
             async_to_sync(self.channel_layer.group_discard)(
                 self.group_name,
                 self.channel_name
@@ -50,7 +120,7 @@ class NotificationConsumer(JsonWebsocketConsumer):
             
         # Remove from school group if applicable
         if hasattr(self, 'user') and hasattr(self.user, 'school_staff'):
-            school_id = str(self.user.school_staff.school.id)
+            school_id = str(self.user.school_staff.school_id)
             role = self.user.school_staff.role.lower()
             school_group = f"school_{school_id}_{role}"
             
@@ -62,21 +132,21 @@ class NotificationConsumer(JsonWebsocketConsumer):
     # Generic handler for various notification types
     def notification(self, event):
         """Handle generic notification messages"""
-        self.send_json(event)
+        self.forward(event)
     
     # Specific handlers for different notification types
     def substitute_invitation(self, event):
         """Forward substitute invitation notifications to the client"""
-        self.send_json(event)
+        self.forward(event)
     
     def substitute_request(self, event):
         """Forward substitute request notifications to the client"""
-        self.send_json(event)
+        self.forward(event)
         
     def substitute_assigned(self, event):
         """Forward substitute assigned notifications to the client"""
-        self.send_json(event)
+        self.forward(event)
     
     def request_status_change(self, event):
         """Forward request status change notifications to the client"""
-        self.send_json(event)
\ No newline at end of file
+        self.forward(event)
\ No newline at end of file
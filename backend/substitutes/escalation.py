@@ -0,0 +1,183 @@
+"""
+Escalation of substitute requests nobody has accepted yet.
+
+Each open request stores when its next invitation batch is due in
+SubstituteRequest.escalate_at (a partial index keeps the due lookup cheap).
+A single periodic task, escalate_due_requests, sweeps the due rows instead
+of the broker holding one countdown message per request, so schedules
+survive broker restarts and the broker load does not grow with the number
+of open requests.
+
+A sweep runs under a cache lock so overlapping beats do not duplicate
+work. Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED and leased by
+pushing escalate_at forward ESCALATION_LEASE; if a worker dies mid-sweep its
+rows become due again once the lease runs out. Each request's lease is
+renewed just before it is worked on, and its new schedule is only written
+while the lease is still the one taken, so a request another sweep has
+re-claimed, or a teacher has accepted, is left alone. Invitation emails go
+out from the email queue, and a sweep stops after ESCALATION_SWEEP_BUDGET,
+well inside the lease and the lock, handing what is left to the next one.
+
+PENDING requests are leased the same way while their first batch is being
+planned (see optimizer.match_school_day); one still PENDING when its lease
+runs out has its matching queued again.
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RequestInvitation, SubstituteRequest
+
+logger = logging.getLogger(__name__)
+
+ESCALATION_LOCK_KEY = 'substitutes:escalation-sweep'
+ESCALATION_LOCK_TIMEOUT = 5 * 60  # seconds
+ESCALATION_LEASE = timedelta(minutes=5)
+# Requests escalated per sweep; the rest wait for the next one
+ESCALATION_SWEEP_LIMIT = 500
+ESCALATION_SWEEP_BUDGET = 2 * 60  # seconds
+
+
+def schedule_escalation(substitute_request, settings, batch_number, now=None):
+    """Records that batch_number was sent and when the next one is due"""
+    now = now or timezone.now()
+    substitute_request.current_batch = batch_number
+    substitute_request.escalate_at = now + timedelta(minutes=settings.wait_time_minutes)
+    SubstituteRequest.objects.filter(pk=substitute_request.pk).update(
+        current_batch=substitute_request.current_batch,
+        escalate_at=substitute_request.escalate_at,
+    )
+
+
+def claim_due_requests(now, limit=ESCALATION_SWEEP_LIMIT):
+    """Leases up to limit due requests to the caller and returns their ids"""
+    with transaction.atomic():
+        ids = list(
+            SubstituteRequest.objects
+            .filter(escalate_at__lte=now)
+            .order_by('escalate_at')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:limit]
+        )
+        if ids:
+            SubstituteRequest.objects.filter(id__in=ids).update(escalate_at=now + ESCALATION_LEASE)
+    return ids
+
+
+def _renew_lease(request_id, leased_until, renewed_until):
+    """Extends the caller's lease on one request; False if it is no longer held"""
+    return SubstituteRequest.objects.filter(
+        pk=request_id, escalate_at=leased_until
+    ).update(escalate_at=renewed_until) == 1
+
+
+def escalate_requests(ids, now=None, leased_until=None):
+    """
+    Sends the next invitation batch for each request still awaiting
+    acceptance and reschedules it, and queues matching again for those
+    never matched; stops escalating the rest. ids must be leased until
+    leased_until (by default now + ESCALATION_LEASE, as claim_due_requests
+    leaves them). Returns a count per outcome.
+    """
+    from .tasks import enqueue_matching, get_ranked_teachers, notify_school_staff_no_teachers, process_teacher_batch
+
+    now = now or timezone.now()
+    leased_until = leased_until or now + ESCALATION_LEASE
+    requests = list(
+        SubstituteRequest.objects.filter(id__in=ids).select_related('school', 'requested_by')
+    )
+    invited = {}
+    for request_id, teacher_id in RequestInvitation.objects.filter(
+        substitute_request_id__in=ids
+    ).values_list('substitute_request_id', 'teacher_id'):
+        invited.setdefault(request_id, set()).add(teacher_id)
+
+    school_settings = {}
+    outcomes = {
+        'escalated': 0, 'exhausted': 0, 'rematched': 0, 'closed': 0, 'failed': 0, 'lost': 0, 'deferred': 0,
+    }
+    started = time.monotonic()
+    for index, substitute_request in enumerate(requests):
+        elapsed = time.monotonic() - started
+        if elapsed > ESCALATION_SWEEP_BUDGET:
+            # Due again at once, for the next sweep
+            outcomes['deferred'] = SubstituteRequest.objects.filter(
+                id__in=[request.id for request in requests[index:]], escalate_at=leased_until
+            ).update(escalate_at=now)
+            break
+        renewed_until = now + timedelta(seconds=elapsed) + ESCALATION_LEASE
+        if not _renew_lease(substitute_request.id, leased_until, renewed_until):
+            outcomes['lost'] += 1
+            continue
+
+        outcome = 'closed'
+        escalate_at = None
+        try:
+            if substitute_request.status == 'PENDING' and substitute_request.date >= now.date():
+                # Its first batch was never planned; the lease keeps it due if queueing fails too
+                enqueue_matching(substitute_request)
+                escalate_at = renewed_until
+                outcome = 'rematched'
+            elif substitute_request.status == 'AWAITING_ACCEPTANCE' and substitute_request.date >= now.date():
+                settings = school_settings.get(substitute_request.school_id)
+                if settings is None:
+                    settings = school_settings[substitute_request.school_id] = \
+                        substitute_request.school.get_algorithm_settings
+
+                next_batch = list(
+                    get_ranked_teachers(substitute_request, settings)
+                    .exclude(teacher_id__in=invited.get(substitute_request.id, ()))
+                    .select_related('teacher')[:settings.batch_size]
+                )
+                if next_batch:
+                    batch_number = substitute_request.current_batch + 1
+                    process_teacher_batch(substitute_request, next_batch, batch_number, queue_emails=True)
+                    substitute_request.current_batch = batch_number
+                    escalate_at = now + timedelta(minutes=settings.wait_time_minutes)
+                    outcome = 'escalated'
+                else:
+                    outcome = 'exhausted'
+        except Exception:
+            # Leave the lease in place so the request is retried after it
+            logger.exception(f"Escalating request {substitute_request.id} failed")
+            outcomes['failed'] += 1
+            continue
+        outcomes[outcome] += 1
+
+        # Only the schedule is written, and only while the lease is ours:
+        # a teacher may have accepted meanwhile
+        substitute_request.escalate_at = escalate_at
+        SubstituteRequest.objects.filter(pk=substitute_request.pk, escalate_at=renewed_until).update(
+            current_batch=substitute_request.current_batch,
+            escalate_at=escalate_at,
+        )
+
+        if outcome == 'exhausted':
+            try:
+                notify_school_staff_no_teachers(substitute_request)
+            except Exception:
+                logger.exception(f"Notifying staff about request {substitute_request.id} failed")
+    return outcomes
+
+
+def sweep_due_escalations(now=None):
+    """Escalates up to ESCALATION_SWEEP_LIMIT due requests; None if another sweep holds the lock"""
+    token = uuid.uuid4().hex
+    if not cache.add(ESCALATION_LOCK_KEY, token, timeout=ESCALATION_LOCK_TIMEOUT):
+        return None
+    try:
+        now = now or timezone.now()
+        ids = claim_due_requests(now)
+        if not ids:
+            return {}
+        outcomes = escalate_requests(ids, now)
+        logger.info(f"Escalation sweep over {len(ids)} requests: {outcomes}")
+        return outcomes
+    finally:
+        if cache.get(ESCALATION_LOCK_KEY) == token:
+            cache.delete(ESCALATION_LOCK_KEY)
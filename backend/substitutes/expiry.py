@@ -0,0 +1,91 @@
+"""
+Expiry of unanswered invitations.
+
+RequestInvitation.expires_at is set when an invitation is sent. The
+periodic expire_invitations task flips every overdue PENDING invitation to
+EXPIRED with a single UPDATE ... RETURNING over the partial index on
+pending rows, then tells each affected teacher about all of their expired
+invitations in one channel message.
+"""
+import logging
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import RequestInvitation
+from .push import push
+
+logger = logging.getLogger(__name__)
+
+
+RETURNED_FIELDS = ('id', 'substitute_request', 'teacher')
+
+
+def _expire_returning(now):
+    meta = RequestInvitation._meta
+    field = meta.get_field
+    quote = connection.ops.quote_name
+    returned = [field(name) for name in RETURNED_FIELDS]
+    sql = (
+        f"UPDATE {quote(meta.db_table)} "
+        f"SET {quote(field('status').column)} = %s, {quote(field('responded_at').column)} = %s "
+        f"WHERE {quote(field('status').column)} = %s AND {quote(field('expires_at').column)} <= %s "
+        f"RETURNING {', '.join(quote(f.column) for f in returned)}"
+    )
+    now = connection.ops.adapt_datetimefield_value(now)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ['EXPIRED', now, 'PENDING', now])
+        rows = cursor.fetchall()
+    # A raw cursor skips field conversion: SQLite returns UUIDs as bare hex,
+    # which would address pushes to groups no socket joined
+    return [tuple(f.to_python(value) for f, value in zip(returned, row)) for row in rows]
+
+
+def _expire_selecting(now):
+    """For backends without UPDATE ... RETURNING"""
+    with transaction.atomic():
+        overdue = RequestInvitation.objects.select_for_update().filter(status='PENDING', expires_at__lte=now)
+        rows = list(overdue.values_list('id', 'substitute_request_id', 'teacher_id'))
+        RequestInvitation.objects.filter(id__in=[row[0] for row in rows]).update(
+            status='EXPIRED', responded_at=now,
+        )
+    return rows
+
+
+def expire_overdue_invitations(now=None):
+    """
+    Expires overdue pending invitations and notifies their teachers.
+    Returns (invitation_id, request_id, teacher_id) for each one.
+    """
+    now = now or timezone.now()
+    if connection.vendor in ('postgresql', 'sqlite'):
+        expired = _expire_returning(now)
+    else:
+        expired = _expire_selecting(now)
+    if expired:
+        logger.info(f"Expired {len(expired)} invitations")
+        notify_expired(expired)
+    return expired
+
+
+def notify_expired(expired):
+    by_teacher = defaultdict(list)
+    for invitation_id, request_id, teacher_id in expired:
+        by_teacher[teacher_id].append({
+            "invitation_id": str(invitation_id),
+            "request_id": str(request_id),
+        })
+
+    for teacher_id, invitations in by_teacher.items():
+        try:
+            push([teacher_id], {
+                "type": "notification",
+                "content": {
+                    "event": "invitation.expired",
+                    "invitations": invitations,
+                    "message": f"{len(invitations)} invitation(s) expired without a response",
+                }
+            })
+        except Exception:
+            logger.exception(f"Could not notify teacher {teacher_id} of expired invitations")
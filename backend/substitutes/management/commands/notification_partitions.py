@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from substitutes.partitions import archive_expired_notifications, ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Creates upcoming monthly notification partitions and archives expired months'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int,
+                            help='Months to create beyond the current one (default NOTIFICATION_PARTITIONS_AHEAD)')
+        parser.add_argument('--archive', action='store_true',
+                            help='Also archive and drop months older than NOTIFICATION_RETENTION_DAYS')
+        parser.add_argument('--archive-dir', help='Where archives are written (default NOTIFICATION_ARCHIVE_DIR)')
+
+    def handle(self, *args, **options):
+        if options['ahead'] is not None and options['ahead'] < 0:
+            raise CommandError('--ahead must not be negative')
+
+        if is_partitioned():
+            for name in ensure_partitions(ahead=options['ahead']):
+                self.stdout.write(f'Created {name}')
+        else:
+            self.stdout.write('Notification table is not partitioned; skipping partition creation')
+
+        if options['archive']:
+            archived = archive_expired_notifications(archive_dir=options['archive_dir'])
+            for month, count in archived.items():
+                self.stdout.write(f'Archived {month}: {count} notifications')
+        self.stdout.write(self.style.SUCCESS('Notification partitions are up to date'))
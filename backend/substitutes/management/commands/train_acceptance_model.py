@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from substitutes.acceptance_model import (
+    HISTORY_DAYS, HOLDOUT_FRACTION, MIN_SEGMENT_SAMPLES, train_acceptance_models,
+)
+
+
+class Command(BaseCommand):
+    help = ('Fits acceptance-probability models on past invitations, compares them with '
+            'the weighted ranking on the newest requests and saves them if they do better')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=HISTORY_DAYS,
+                            help=f'Days of invitation history to learn from (default {HISTORY_DAYS})')
+        parser.add_argument('--min-samples', type=int, default=MIN_SEGMENT_SAMPLES,
+                            help=f'Invitations a segment needs for its own model (default {MIN_SEGMENT_SAMPLES})')
+        parser.add_argument('--holdout', type=float, default=HOLDOUT_FRACTION,
+                            help=f'Share of the newest requests held out for the comparison (default {HOLDOUT_FRACTION})')
+        parser.add_argument('--dry-run', action='store_true', help='Report without saving the models')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['min_samples'] < 1:
+            raise CommandError('--days and --min-samples must be positive')
+        if not 0 < options['holdout'] < 1:
+            raise CommandError('--holdout must be between 0 and 1')
+
+        report = train_acceptance_models(
+            days=options['days'],
+            min_samples=options['min_samples'],
+            holdout=options['holdout'],
+            save=not options['dry_run'],
+        )
+        self.stdout.write(f"Decided invitations: {report['invitations']}")
+        if not report['invitations']:
+            self.stdout.write(self.style.WARNING('No invitation history to learn from'))
+            return
+        self.stdout.write(
+            f"Overall acceptance rate {report['prior_rate']:.1%}, "
+            f"{report['response_minutes']:.1f} minutes to accept on average"
+        )
+        for school_id, segments in report['segments'].items():
+            names = ', '.join(f"{subject or 'any subject'}/{part or 'any time'}" for subject, part in segments)
+            self.stdout.write(f"{'All schools' if school_id is None else f'School {school_id}'}: {names}")
+
+        evaluation = report['evaluation']
+        if not evaluation or not evaluation['learned']:
+            self.stdout.write('Not enough held-out requests to compare rankings')
+        else:
+            self.stdout.write(f"Held-out filled requests: {evaluation['learned']['filled_requests']}")
+            for ranking in ('weighted', 'learned'):
+                result = evaluation[ranking]
+                self.stdout.write(
+                    f"  {ranking:<9} {result['escalation_rounds']:.2f} escalation rounds, "
+                    f"{result['emails']:.1f} emails per filled request"
+                )
+
+        if options['dry_run']:
+            self.stdout.write('Dry run; nothing saved')
+        elif report['models']:
+            self.stdout.write(self.style.SUCCESS(f"Saved {report['models']} acceptance models"))
+        elif not report['improved']:
+            self.stdout.write(self.style.WARNING(
+                'The learned order did not need fewer escalation rounds and emails; '
+                'no models kept, ranking stays weighted'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING('Too little history for any model; ranking stays weighted'))
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def schedule_open_requests(apps, schema_editor):
+    """Requests awaiting acceptance were escalated by countdown tasks; sweep them now"""
+    SubstituteRequest = apps.get_model('substitutes', 'SubstituteRequest')
+    now = timezone.now()
+    open_requests = SubstituteRequest.objects.filter(status='AWAITING_ACCEPTANCE').annotate(
+        last_batch=Max('invitations__batch_number'),
+    )
+    for substitute_request in open_requests:
+        substitute_request.current_batch = substitute_request.last_batch or 1
+        substitute_request.escalate_at = now
+    SubstituteRequest.objects.bulk_update(open_requests, ['current_batch', 'escalate_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('substitutes', '0004_improve_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='substituterequest',
+            name='current_batch',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='substituterequest',
+            name='escalate_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='substituterequest',
+            index=models.Index(condition=models.Q(('escalate_at__isnull', False)), fields=['escalate_at'], name='substitutes_escalate_at_idx'),
+        ),
+        migrations.RunPython(schedule_open_requests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+import substitutes.models
+
+
+def backfill_pending_expiry(apps, schema_editor):
+    """Pending invitations promised a 10 minute window from when they were sent"""
+    RequestInvitation = apps.get_model('substitutes', 'RequestInvitation')
+    RequestInvitation.objects.filter(status='PENDING', expires_at__isnull=True).update(
+        expires_at=F('invited_at') + timedelta(minutes=10),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('substitutes', '0005_substituterequest_escalation'),
+    ]
+
+    operations = [
+        # Added without a default so answered invitations keep a NULL expiry
+        migrations.AddField(
+            model_name='requestinvitation',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_pending_expiry, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='requestinvitation',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, default=substitutes.models.invitation_expiry, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='requestinvitation',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['expires_at'], name='substitutes_pending_expiry_idx'),
+        ),
+    ]
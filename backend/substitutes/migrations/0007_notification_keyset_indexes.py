@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    The model's Meta was declared as `class meta` until now, so its options
+    and indexes only existed in 0004. Replace the (user, is_read) and
+    (user, timestamp) indexes with the two the notification list and unread
+    counts actually use, and drop the unused priority and category indexes.
+    """
+
+    dependencies = [
+        ('substitutes', '0006_requestinvitation_expires_at'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='notification',
+            options={'ordering': ['-timestamp', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='substitutes_notif_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user', '-timestamp', '-id'], name='substitutes_notif_unread_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='substitutes_user_id_8e7330_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='substitutes_user_id_95e440_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='substitutes_user_id_2287b1_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='substitutes_priorit_6e74d0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='substitutes_categor_9f30fe_idx',
+        ),
+    ]
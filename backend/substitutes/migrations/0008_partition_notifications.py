@@ -0,0 +1,94 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = 'substitutes_notification'
+UNPARTITIONED = 'substitutes_notification_unpartitioned'
+SEQUENCE = 'substitutes_notification_id_seq'
+PARTITIONS_AHEAD = 3
+
+
+def month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_notifications(apps, schema_editor):
+    """
+    Rebuilds the notification table range-partitioned by month on timestamp
+    (see substitutes.partitions). The rows are copied under the migration's
+    lock on the old table. The primary key becomes (id, timestamp), as
+    Postgres requires of partitioned tables; ids keep coming from one
+    sequence, continued from the old maximum.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+    quote = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        if cursor.fetchone():
+            return
+        cursor.execute(f'SELECT min("timestamp"), max(id) FROM {quote(TABLE)}')
+        oldest, max_id = cursor.fetchone()
+
+    Notification = apps.get_model('substitutes', 'Notification')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(UNPARTITIONED)}')
+    # LIKE without INCLUDING copies columns and NOT NULLs only, leaving the
+    # old table's identity sequence, keys and index names free to drop
+    execute(f'CREATE TABLE {quote(TABLE)} (LIKE {quote(UNPARTITIONED)}) PARTITION BY RANGE ("timestamp")')
+
+    now = timezone.now()
+    month = month_start(oldest or now)
+    last = add_months(month_start(now), PARTITIONS_AHEAD)
+    while month <= last:
+        execute(
+            f'CREATE TABLE {quote(f"{TABLE}_p{month:%Y_%m}")} PARTITION OF {quote(TABLE)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [month, add_months(month, 1)],
+        )
+        month = add_months(month, 1)
+    execute(f'CREATE TABLE {quote(f"{TABLE}_default")} PARTITION OF {quote(TABLE)} DEFAULT')
+
+    execute(f'INSERT INTO {quote(TABLE)} SELECT * FROM {quote(UNPARTITIONED)}')
+    execute(f'DROP TABLE {quote(UNPARTITIONED)}')
+
+    execute(f'CREATE SEQUENCE {quote(SEQUENCE)} OWNED BY {quote(TABLE)}.id')
+    execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+    if max_id:
+        execute('SELECT setval(%s, %s)', [SEQUENCE, max_id])
+
+    execute(f'ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id, "timestamp")')
+    execute(
+        f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(f"{TABLE}_user_id_fk")} '
+        f'FOREIGN KEY (user_id) REFERENCES {quote(User._meta.db_table)} ({quote(User._meta.pk.column)}) DEFERRABLE INITIALLY DEFERRED'
+    )
+    # The (user, -timestamp, -id) index leads with user_id, so the foreign
+    # key needs no index of its own
+    for index in Notification._meta.indexes:
+        schema_editor.add_index(Notification, index)
+
+
+class Migration(migrations.Migration):
+    """
+    Postgres only; other databases keep a single notification table. Not
+    reversed: the partitioned table serves the same model.
+    """
+
+    dependencies = [
+        ('substitutes', '0007_notification_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0004_school_directory_prefix_indexes'),
+        ('substitutes', '0009_request_groups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherAcceptanceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invitations', models.PositiveIntegerField(default=0)),
+                ('accepted', models.PositiveIntegerField(default=0)),
+                ('acceptance_rate', models.FloatField()),
+                ('response_minutes', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('teacher', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='acceptance_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AcceptanceModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(blank=True, max_length=50)),
+                ('daypart', models.CharField(blank=True, choices=[('', 'Any time'), ('morning', 'Morning'), ('afternoon', 'Afternoon'), ('evening', 'Evening')], max_length=10)),
+                ('coefficients', models.JSONField(default=dict)),
+                ('prior_rate', models.FloatField(help_text='Acceptance rate assumed for teachers without history')),
+                ('response_minutes', models.FloatField(help_text='Minutes to accept assumed for teachers without history')),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('trained_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='acceptance_models', to='accounts.school')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='acceptancemodel',
+            constraint=models.UniqueConstraint(fields=('school', 'subject', 'daypart'), name='substitutes_acceptance_school_segment_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='acceptancemodel',
+            constraint=models.UniqueConstraint(condition=models.Q(('school__isnull', True)), fields=('subject', 'daypart'), name='substitutes_acceptance_global_segment_uniq'),
+        ),
+    ]
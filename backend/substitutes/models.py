@@ -2,10 +2,36 @@ from django.db import models
 from accounts.models import User, TeacherAvailability, School, TeacherProfile
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from datetime import timedelta
 from .utils import create_jiomeet_meeting
 from django.db import models
 from django.conf import settings
 
+class RequestGroup(models.Model):
+    """
+    Several periods of one absence, filed together. Each period is a
+    SubstituteRequest; they are matched as a block (see substitutes.optimizer)
+    and a teacher accepting one takes the others they were invited to.
+    """
+    school = models.ForeignKey(
+        'accounts.School',
+        on_delete=models.CASCADE,
+        related_name='request_groups'
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='request_groups'
+    )
+    date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Request group {self.pk} of {self.school} on {self.date}"
+
 class SubstituteRequest(models.Model):
     """
     Model to handle substitute teacher requests
@@ -117,6 +143,13 @@ class SubstituteRequest(models.Model):
         blank=True,
         related_name='substituted_classes'
     )
+    group = models.ForeignKey(
+        RequestGroup,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='requests'
+    )
     subject = models.CharField(
         max_length=20,
         choices=SUBJECTS,
@@ -150,6 +183,10 @@ class SubstituteRequest(models.Model):
     host_link = models.URLField(null=True, blank=True)
     special_instructions = models.TextField(blank=True)
     cancellation_reason = models.TextField(blank=True)
+    # Invitation batch last sent, and when to invite the next one if nobody
+    # has accepted by then (see substitutes.escalation)
+    current_batch = models.PositiveSmallIntegerField(default=0)
+    escalate_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -158,6 +195,11 @@ class SubstituteRequest(models.Model):
         indexes = [
             models.Index(fields=['school', 'date', 'status']),
             models.Index(fields=['assigned_teacher', 'date']),
+            models.Index(
+                fields=['escalate_at'],
+                condition=models.Q(escalate_at__isnull=False),
+                name='substitutes_escalate_at_idx',
+            ),
         ]
 
     def clean(self):
@@ -284,6 +326,14 @@ class SubstituteRequest(models.Model):
         TeacherAvailability.objects.bulk_create(availabilities_to_create)
         
 
+# How long an invited teacher has to accept before the invitation expires
+INVITATION_RESPONSE_WINDOW = timedelta(minutes=10)
+
+
+def invitation_expiry():
+    return timezone.now() + INVITATION_RESPONSE_WINDOW
+
+
 class RequestInvitation(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -304,9 +354,18 @@ class RequestInvitation(models.Model):
     responded_at = models.DateTimeField(null=True, blank=True)
     response_note = models.TextField(blank=True)  # For declined reasons
     batch_number = models.IntegerField(default=1)  # Track which batch this invitation was part of
+    expires_at = models.DateTimeField(null=True, blank=True, default=invitation_expiry)
     
     class Meta:
         unique_together = ('substitute_request', 'teacher')
+        indexes = [
+            # Only pending invitations can expire; keeps the sweep index small
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(status='PENDING'),
+                name='substitutes_pending_expiry_idx',
+            ),
+        ]
         
 # models.py
 
@@ -316,24 +375,120 @@ from django.conf import settings
 class Notification(models.Model):
     """
     Model to store user notifications.
+
+    Lists are read newest first per user, so the (user, -timestamp, -id)
+    index serves the keyset-paginated list and the partial index over unread
+    rows serves unread counts and mark-all-read. Unread counts themselves are
+    cached per user (see substitutes.notifications).
     """
     NOTIFICATION_TYPES = [
         ('INVITATION', 'Invitation'),
         ('ASSIGNMENT', 'Assignment'),
-        # Add more types as needed
+        ('REQUEST', 'Request'),
+        ('STATUS_CHANGE', 'Status Change'),
+        ('AVAILABILITY', 'Availability'),
+        ('PROFILE_UPDATE', 'Profile Update'),
+        ('SYSTEM', 'System'),
+    ]
+    CATEGORIES = [
+        ('substitute', 'Substitute'),
+        ('teacher', 'Teacher'),
+        ('school', 'School'),
+        ('system', 'System'),
+    ]
+    PRIORITIES = [
+        ('LOW', 'Low'),
+        ('MEDIUM', 'Medium'),
+        ('HIGH', 'High'),
+        ('URGENT', 'Urgent'),
     ]
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
     content = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    read_at = models.DateTimeField(null=True, blank=True)
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
-    
-    class meta:
-        ordering = ['-timestamp']
+    category = models.CharField(max_length=20, choices=CATEGORIES, default='system')
+    priority = models.CharField(max_length=10, choices=PRIORITIES, default='MEDIUM')
+    metadata = models.JSONField(default=dict, blank=True, help_text='Additional notification data')
+    action_url = models.URLField(null=True, blank=True, help_text='URL to navigate when notification is clicked')
+    expires_at = models.DateTimeField(null=True, blank=True, help_text='When this notification expires')
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    class Meta:
+        ordering = ['-timestamp', '-id']
         indexes = [
-            models.Index(fields=['user', 'is_read']),
-            models.Index(fields=['notification_type']),
+            models.Index(fields=['user', '-timestamp', '-id'], name='substitutes_notif_user_ts_idx'),
+            models.Index(
+                fields=['user', '-timestamp', '-id'],
+                name='substitutes_notif_unread_idx',
+                condition=models.Q(is_read=False),
+            ),
+            models.Index(fields=['notification_type'], name='substitutes_notific_e72047_idx'),
+            models.Index(fields=['timestamp'], name='substitutes_timesta_0568c2_idx'),
         ]
-    
+
+    def __str__(self):
+        return f"{self.user.username} - {self.notification_type}"
+
+class AcceptanceModel(models.Model):
+    """
+    Fitted acceptance-probability coefficients for one segment: a school (or
+    every school when school is null), a subject ('' for any) and a time of
+    day ('' for any). See substitutes.acceptance_model.
+    """
+    DAYPARTS = [
+        ('', 'Any time'),
+        ('morning', 'Morning'),
+        ('afternoon', 'Afternoon'),
+        ('evening', 'Evening'),
+    ]
+    school = models.ForeignKey(
+        'accounts.School',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='acceptance_models'
+    )
+    subject = models.CharField(max_length=50, blank=True)
+    daypart = models.CharField(max_length=10, choices=DAYPARTS, blank=True)
+    # Raw-unit weights per feature, and 'intercept'
+    coefficients = models.JSONField(default=dict)
+    prior_rate = models.FloatField(help_text='Acceptance rate assumed for teachers without history')
+    response_minutes = models.FloatField(help_text='Minutes to accept assumed for teachers without history')
+    samples = models.PositiveIntegerField(default=0)
+    trained_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['school', 'subject', 'daypart'],
+                name='substitutes_acceptance_school_segment_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['subject', 'daypart'],
+                condition=models.Q(school__isnull=True),
+                name='substitutes_acceptance_global_segment_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.school or 'All schools'} | {self.subject or 'any subject'} | {self.daypart or 'any time'}"
+
+
+class TeacherAcceptanceStats(models.Model):
+    """A teacher's smoothed invitation history, refreshed with the acceptance models"""
+    teacher = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='acceptance_stats'
+    )
+    invitations = models.PositiveIntegerField(default=0)
+    accepted = models.PositiveIntegerField(default=0)
+    acceptance_rate = models.FloatField()
+    response_minutes = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"{self.user.username} - {self.notification_type}"
\ No newline at end of file
+        return f"{self.teacher} accepts {self.acceptance_rate:.0%}"
@@ -0,0 +1,95 @@
+"""
+Stored notifications and per-user unread counts.
+
+Unread counts are kept in the cache under unread_count_key(user_id) and
+adjusted with incr/decr as notifications are created and read, so the badge
+never counts rows. A missing counter is rebuilt from the partial unread
+index on the next read. Adjustments that race a rebuild can leave the
+counter off by a few, so it expires after UNREAD_COUNT_TTL and is recounted.
+
+Notifications must be created and read through these helpers (not
+Notification.objects directly) to keep the counters in step. Reads go
+through inbox(), which only covers the retained months, so on a partitioned
+table the planner prunes them to recent partitions (see substitutes.partitions).
+"""
+import logging
+from collections import Counter
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Notification
+from .partitions import retention_start
+
+logger = logging.getLogger(__name__)
+
+UNREAD_COUNT_TTL = 60 * 60  # seconds
+
+
+def inbox(user_id, now=None):
+    """A user's notifications from the months still retained"""
+    return Notification.objects.filter(user_id=user_id, timestamp__gte=retention_start(now))
+
+
+def unread_count_key(user_id):
+    return f'substitutes:unread:{user_id}'
+
+
+def unread_count(user_id):
+    """Number of unread notifications for user_id"""
+    key = unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = inbox(user_id).filter(is_read=False).count()
+        # add() so a counter another process just adjusted is not overwritten
+        cache.add(key, count, timeout=UNREAD_COUNT_TTL)
+    return max(count, 0)
+
+
+def _adjust_unread(user_id, delta):
+    if not delta:
+        return
+    key = unread_count_key(user_id)
+    try:
+        if cache.incr(key, delta) < 0:
+            cache.delete(key)
+    except ValueError:
+        pass  # no counter yet; the next read counts the rows
+    except Exception as e:
+        logger.warning("Could not adjust unread count for %s: %s", user_id, e)
+        cache.delete(key)
+
+
+def create_notifications(notifications):
+    """Saves unsaved Notification instances in one INSERT and counts them as unread"""
+    created = Notification.objects.bulk_create(notifications)
+    for user_id, count in Counter(n.user_id for n in created if not n.is_read).items():
+        _adjust_unread(user_id, count)
+    return created
+
+
+def notify(user, content, notification_type, **fields):
+    """Stores a single notification for user"""
+    return create_notifications([
+        Notification(user=user, content=content, notification_type=notification_type, **fields)
+    ])[0]
+
+
+def mark_read(user_id, ids=None, now=None):
+    """
+    Marks the given notifications of user_id read, or all of them when ids
+    is None, in a single UPDATE. Returns how many were unread.
+    """
+    now = now or timezone.now()
+    unread = inbox(user_id, now).filter(is_read=False)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+    count = unread.update(is_read=True, read_at=now, updated_at=now)
+    _adjust_unread(user_id, -count)
+    return count
+
+
+def clear(user_id):
+    """Deletes every notification of user_id"""
+    inbox(user_id).delete()
+    cache.delete(unread_count_key(user_id))
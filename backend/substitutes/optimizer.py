@@ -0,0 +1,564 @@
+"""
+Joint planning of first invitation batches for a school's requests on one day.
+
+Matching each request on its own invites the same top-ranked teachers to
+every overlapping request, so most of those invitations are wasted. Instead
+plan_day() scores every (request, candidate) pair with the school's weights,
+as get_ranked_teachers does, and picks a primary teacher per request by
+min-cost assignment. A teacher may be primary for several requests as long
+as they do not overlap. Each request's first batch is its primary followed
+by its best other candidates, leaving out teachers who are primary for an
+overlapping request, so a batch does not poach another request's best fit.
+
+match_school_day() loads a school's PENDING requests for a date and their
+candidates, plans them and sends the batches; match_teachers_to_request
+calls it, so requests created together are matched together. Where the
+school ranks by learned acceptance (see acceptance_model), a candidate's
+score for a request is minus their expected minutes to accept it.
+
+Periods filed together as a RequestGroup are planned as one block first:
+only teachers whose availability, merged across their windows, contains
+every period of the block can take it, and one teacher is invited to all of
+its periods at once. Leaving a block unassigned costs as much as leaving
+each of its periods, so blocks win ties against single requests. Only the
+periods of a block nobody can take whole are then planned one by one.
+
+Requests are split into groups that overlap in time, transitively; groups
+never compete for a teacher, so each is planned on its own. Within a group
+the assignment runs in rounds. Each round is one rectangular assignment
+problem (requests x teachers, with an "unassigned" column per request)
+solved by shortest augmenting paths. Later rounds only cover the requests
+still unassigned, and only with teachers free at that time.
+"""
+import json
+import logging
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from functools import reduce
+from operator import or_
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import TeacherAvailability
+from . import acceptance_model
+from .models import RequestInvitation, SubstituteRequest
+
+logger = logging.getLogger(__name__)
+
+# Candidates kept per request; the tail never reaches a first batch
+MAX_CANDIDATES_PER_REQUEST = 50
+# Covers planning and claiming only, not sending
+PLAN_LOCK_TIMEOUT = 60  # seconds
+
+
+def linear_sum_assignment(cost):
+    """
+    Minimum-cost assignment of every row of cost (n x m, n <= m, entries >= 0
+    or inf for forbidden pairs) to a distinct column, by shortest augmenting
+    paths with row and column potentials (Jonker-Volgenant, as in Crouse,
+    "On implementing 2D rectangular assignment algorithms", 2016). Returns the
+    column for each row. Raises ValueError when no complete assignment exists.
+    """
+    n, m = cost.shape
+    u = np.zeros(n)
+    v = np.zeros(m)
+    col4row = np.full(n, -1)
+    row4col = np.full(m, -1)
+
+    for current in range(n):
+        shortest = np.full(m, np.inf)
+        # shortest, with visited columns set to inf for the argmin
+        remaining = np.full(m, np.inf)
+        path = np.full(m, -1)
+        seen_rows = np.zeros(n, dtype=bool)
+        seen_cols = np.zeros(m, dtype=bool)
+        min_val = 0.0
+        row = current
+        sink = -1
+        while sink == -1:
+            seen_rows[row] = True
+            reduced = min_val + cost[row] - u[row] - v
+            better = ~seen_cols & (reduced < shortest)
+            path[better] = row
+            shortest[better] = reduced[better]
+
+            remaining[better] = reduced[better]
+
+            col = int(remaining.argmin())
+            min_val = remaining[col]
+            if min_val == np.inf:
+                raise ValueError('cost matrix has no complete assignment')
+            seen_cols[col] = True
+            remaining[col] = np.inf
+            if row4col[col] == -1:
+                sink = col
+            else:
+                row = row4col[col]
+
+        u[current] += min_val
+        others = seen_rows.copy()
+        others[current] = False
+        u[others] += min_val - shortest[col4row[others]]
+        v[seen_cols] -= min_val - shortest[seen_cols]
+
+        col = sink
+        while True:
+            row = path[col]
+            row4col[col] = row
+            col4row[row], col = col, col4row[row]
+            if row == current:
+                break
+    return col4row
+
+
+def _overlaps(a_start, a_end, b_start, b_end):
+    return a_start < b_end and b_start < a_end
+
+
+def _clashes(intervals, others):
+    return any(_overlaps(start, end, s, e) for start, end in intervals for s, e in others)
+
+
+def merge_intervals(intervals):
+    """The union of intervals as sorted, disjoint ones; touching intervals merge"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+
+def covers(union, start, end):
+    """Whether the merged union contains start to end"""
+    return any(s <= start and e >= end for s, e in union)
+
+
+@dataclass
+class Slot:
+    """A request as the planner sees it, or a block of them (parts)"""
+    key: object
+    start: object
+    end: object
+    subject: str = ''
+    excluded: frozenset = frozenset()
+    parts: tuple = ()
+
+    @property
+    def intervals(self):
+        if self.parts:
+            return [(part.start, part.end) for part in self.parts]
+        return [(self.start, self.end)]
+
+
+@dataclass
+class Candidate:
+    """One availability window of a teacher, with their score"""
+    teacher_id: object
+    start: object
+    end: object
+    subjects: str
+    score: float
+    availability: object = None
+    online: bool = False
+
+
+@dataclass
+class Plan:
+    primary: dict = field(default_factory=dict)   # slot key -> teacher id
+    batches: dict = field(default_factory=dict)   # slot key -> [Candidate] best first
+    blocks: dict = field(default_factory=dict)    # block key -> its slot keys, for blocks taken whole
+    rounds: int = 0
+
+
+def _eligible(slot, candidate):
+    # The same test get_ranked_teachers applies in SQL
+    return (
+        candidate.start <= slot.start and candidate.end >= slot.end
+        and candidate.teacher_id not in slot.excluded
+        and slot.subject.lower() in candidate.subjects
+    )
+
+
+def _block_options(block, windows, scorer=None):
+    """Best candidate of every teacher who can take all of block's periods"""
+    eligible = []
+    for teacher_id, (union, teacher_candidates) in windows.items():
+        best = teacher_candidates[0]
+        if (
+            teacher_id not in block.excluded
+            and all(part.subject.lower() in best.subjects for part in block.parts)
+            and all(covers(union, part.start, part.end) for part in block.parts)
+        ):
+            if scorer is not None:
+                best = replace(best, score=scorer(block.parts[0], best))
+            eligible.append(best)
+    eligible.sort(key=lambda c: -c.score)
+    return eligible[:MAX_CANDIDATES_PER_REQUEST]
+
+
+def overlap_groups(slots):
+    """Splits slots into maximal runs whose intervals chain together"""
+    groups = []
+    group_end = None
+    for slot in sorted(slots, key=lambda slot: (slot.start, slot.end)):
+        if group_end is None or slot.start >= group_end:
+            groups.append([])
+            group_end = slot.end
+        groups[-1].append(slot)
+        group_end = max(group_end, slot.end)
+    return groups
+
+
+def _assign_group(pending, options, committed, plan):
+    """Picks primaries for one overlap group, round by round, into plan"""
+    while pending:
+        teachers = sorted({c.teacher_id for slot in pending for c in options[slot.key]}, key=str)
+        column = {teacher_id: index for index, teacher_id in enumerate(teachers)}
+        scores = np.full((len(pending), len(teachers)), np.nan)
+        for row, slot in enumerate(pending):
+            for candidate in options[slot.key]:
+                if not _clashes(slot.intervals, committed[candidate.teacher_id]):
+                    scores[row, column[candidate.teacher_id]] = candidate.score
+        if np.all(np.isnan(scores)):
+            return
+
+        # Costs relative to the best score keep them non-negative; leaving a
+        # request unassigned costs more than any set of assignments could
+        # save, and a block as much as that many requests
+        top = np.nanmax(scores)
+        span = top - np.nanmin(scores) + 1.0
+        cost = np.where(np.isnan(scores), np.inf, top - scores)
+        periods = np.array([max(len(slot.parts), 1) for slot in pending], dtype=float)
+        unassigned = np.repeat((span * len(pending) * periods)[:, None], len(pending), axis=1)
+        chosen = linear_sum_assignment(np.hstack([cost, unassigned]))
+        plan.rounds += 1
+
+        still_pending = []
+        for row, slot in enumerate(pending):
+            col = chosen[row]
+            if col < len(teachers):
+                teacher_id = teachers[col]
+                plan.primary[slot.key] = teacher_id
+                committed[teacher_id].extend(slot.intervals)
+            else:
+                still_pending.append(slot)
+        # Rounds after the first only add teachers who took a request already
+        if len(still_pending) == len(pending):
+            return
+        pending = still_pending
+
+
+def plan_day(slots, candidates, batch_size, busy=(), blocks=None, scorer=None):
+    """
+    Plans first batches for slots (one school and date). busy holds
+    (teacher_id, start, end) intervals teachers are already committed or
+    invited for; they cannot be primary for anything overlapping one.
+    blocks maps a block key to the keys of slots filed together; a block
+    taken whole gets one batch under its key, listed in plan.blocks.
+    scorer(slot, candidate), when given, replaces candidate.score per slot.
+    """
+    by_subject = {
+        subject: [c for c in candidates if subject in c.subjects]
+        for subject in {slot.subject.lower() for slot in slots}
+    }
+    options = {}
+    for slot in slots:
+        eligible = {}
+        for candidate in by_subject[slot.subject.lower()]:
+            if _eligible(slot, candidate):
+                if scorer is not None:
+                    candidate = replace(candidate, score=scorer(slot, candidate))
+                best = eligible.get(candidate.teacher_id)
+                if best is None or candidate.score > best.score:
+                    eligible[candidate.teacher_id] = candidate
+        ranked = sorted(eligible.values(), key=lambda c: -c.score)
+        options[slot.key] = ranked[:MAX_CANDIDATES_PER_REQUEST]
+
+    by_key = {slot.key: slot for slot in slots}
+    whole = []
+    if blocks:
+        by_teacher = defaultdict(list)
+        for candidate in candidates:
+            by_teacher[candidate.teacher_id].append(candidate)
+        windows = {
+            teacher_id: (
+                merge_intervals((c.start, c.end) for c in teacher_candidates),
+                sorted(teacher_candidates, key=lambda c: -c.score),
+            )
+            for teacher_id, teacher_candidates in by_teacher.items()
+        }
+        for block_key, keys in blocks.items():
+            parts = tuple(sorted((by_key[key] for key in keys), key=lambda part: part.start))
+            block = Slot(
+                key=block_key,
+                start=min(part.start for part in parts),
+                end=max(part.end for part in parts),
+                excluded=frozenset().union(*(part.excluded for part in parts)),
+                parts=parts,
+            )
+            options[block_key] = _block_options(block, windows, scorer)
+            whole.append(block)
+    in_blocks = {part.key for block in whole for part in block.parts}
+
+    committed = defaultdict(list)
+    for teacher_id, start, end in busy:
+        committed[teacher_id].append((start, end))
+
+    plan = Plan()
+    planned = [slot for slot in slots if slot.key not in in_blocks] + whole
+    for group in overlap_groups(planned):
+        _assign_group([slot for slot in group if options[slot.key]], options, committed, plan)
+    # Periods of blocks nobody can take whole fall back to single requests
+    fallback = [part for block in whole if block.key not in plan.primary for part in block.parts]
+    for group in overlap_groups(fallback):
+        _assign_group([slot for slot in group if options[slot.key]], options, committed, plan)
+    planned = [slot for slot in planned if slot.key in plan.primary or not slot.parts] + fallback
+
+    for slot in planned:
+        slot_primary = plan.primary.get(slot.key)
+        reserved = {
+            plan.primary[other.key] for other in planned
+            if other.key != slot.key and other.key in plan.primary
+            and _clashes(slot.intervals, other.intervals)
+        }
+        batch = [c for c in options[slot.key] if c.teacher_id == slot_primary]
+        batch += [
+            c for c in options[slot.key]
+            if c.teacher_id != slot_primary and c.teacher_id not in reserved
+        ]
+        plan.batches[slot.key] = batch[:batch_size]
+        if slot.parts:
+            plan.blocks[slot.key] = [part.key for part in slot.parts]
+    return plan
+
+
+def subjects_text(subjects):
+    """Lower-cased text the subject test matches against, as icontains on the JSON column does"""
+    return json.dumps(subjects).lower() if not isinstance(subjects, str) else subjects.lower()
+
+
+def _candidates(date, requests, settings):
+    """Available teachers who could cover any of requests, scored as get_ranked_teachers does"""
+    from . import presence
+
+    subjects = reduce(or_, (
+        Q(teacher__teacher_profile__subjects__icontains=subject)
+        for subject in {request.subject for request in requests}
+    ))
+    availabilities = TeacherAvailability.objects.filter(
+        subjects,
+        date=date,
+        status='AVAILABLE',
+        # Windows overlapping any request, not only those containing one: a
+        # block can be covered by several windows together
+        start_time__lt=max(request.end_time for request in requests),
+        end_time__gt=min(request.start_time for request in requests),
+    ).select_related('teacher', 'teacher__teacher_profile', 'teacher__acceptance_stats')
+    availabilities = list(availabilities)
+    # None when presence is unknown: then nobody is boosted or left out
+    online_ids = None
+    if settings.online_boost or settings.online_minutes or settings.online_only:
+        online_ids = presence.online_user_ids({availability.teacher_id for availability in availabilities})
+
+    candidates = []
+    for availability in availabilities:
+        profile = availability.teacher.teacher_profile
+        online = online_ids is not None and str(availability.teacher_id) in online_ids
+        if settings.online_only and online_ids is not None and not online:
+            continue
+        candidates.append(Candidate(
+            teacher_id=availability.teacher_id,
+            start=availability.start_time,
+            end=availability.end_time,
+            subjects=subjects_text(profile.subjects),
+            score=(
+                profile.experience_years * settings.experience_weight
+                + float(profile.rating) * settings.rating_weight
+                + (settings.online_boost if online else 0.0)
+                + 1.0
+            ),
+            availability=availability,
+            online=online,
+        ))
+    return candidates
+
+
+def _learned_scorer(school_id, settings):
+    """Scores by expected minutes to accept as get_ranked_teachers does; None keeps the weighted score"""
+    if settings.ranking != 'learned':
+        return None
+    models = acceptance_model.school_models(school_id)
+    if not models:
+        return None
+
+    minutes = {}
+
+    def score(slot, candidate):
+        coefficients = acceptance_model.pick_coefficients(
+            models, slot.subject, acceptance_model.daypart(slot.start)
+        )
+        key = (coefficients, candidate.teacher_id)
+        if key not in minutes:
+            teacher = candidate.availability.teacher
+            profile = teacher.teacher_profile
+            stats = getattr(teacher, 'acceptance_stats', None)
+            minutes[key] = coefficients.expected_minutes(
+                profile.experience_years,
+                profile.rating,
+                stats.acceptance_rate if stats else None,
+                stats.response_minutes if stats else None,
+            )
+        return (settings.online_minutes if candidate.online else 0.0) - minutes[key]
+    return score
+
+
+def _busy(date, teacher_ids):
+    """Intervals these teachers hold pending invitations for, at any school"""
+    return list(RequestInvitation.objects.filter(
+        status='PENDING',
+        teacher_id__in=teacher_ids,
+        substitute_request__date=date,
+        substitute_request__status='AWAITING_ACCEPTANCE',
+    ).values_list('teacher_id', 'substitute_request__start_time', 'substitute_request__end_time'))
+
+
+def _send_first_batch(requests, batch, settings):
+    """Invites batch to requests (the periods of a block, or a single request), claimed by _claim"""
+    from .escalation import schedule_escalation
+    from .tasks import notify_school_staff, process_group_batch, process_teacher_batch
+
+    try:
+        for request in requests:
+            notify_school_staff(request)
+        if len(requests) > 1:
+            process_group_batch(requests, batch, batch_number=1)
+        else:
+            process_teacher_batch(requests[0], batch, batch_number=1)
+        for request in requests:
+            request.status = 'AWAITING_ACCEPTANCE'
+            schedule_escalation(request, settings, batch_number=1)
+    except Exception:
+        # The claim's lease runs out and the escalation sweep sends a batch
+        logger.exception(f"Sending the first batch for requests {[request.id for request in requests]} failed")
+
+
+def _report_unmatched(requests):
+    """Tells staff nobody can cover requests; they stay PENDING, off the escalation sweep"""
+    from .tasks import notify_school_staff
+
+    logger.warning(f"No matching teachers found for requests {[request.id for request in requests]}")
+    SubstituteRequest.objects.filter(
+        id__in=[request.id for request in requests], status='PENDING',
+    ).update(escalate_at=None)
+    for request in requests:
+        try:
+            notify_school_staff(request)
+        except Exception:
+            logger.exception(f"Notifying staff about request {request.id} failed")
+
+
+def _claim(request_ids):
+    """
+    Moves the requests still PENDING to AWAITING_ACCEPTANCE, leased to the
+    escalation sweep until their batch is sent, and returns their ids. A
+    planner whose lock ran out cannot then send a batch for the same request.
+    """
+    from .escalation import ESCALATION_LEASE
+
+    with transaction.atomic():
+        claimed = set(SubstituteRequest.objects.filter(
+            id__in=request_ids, status='PENDING',
+        ).select_for_update().values_list('id', flat=True))
+        SubstituteRequest.objects.filter(id__in=claimed).update(
+            status='AWAITING_ACCEPTANCE', escalate_at=timezone.now() + ESCALATION_LEASE,
+        )
+    return claimed
+
+
+def pending_requests(school_id, date):
+    return list(SubstituteRequest.objects.filter(
+        school_id=school_id, date=date, status='PENDING', assigned_teacher__isnull=True,
+    ).select_related('school', 'requested_by'))
+
+
+def plan_requests(requests, settings):
+    """Plans first batches for requests of one school and date (see plan_day)"""
+    school_id = requests[0].school_id
+    date = requests[0].date
+    candidates = _candidates(date, requests, settings)
+    slots = [
+        Slot(
+            key=request.id,
+            start=request.start_time,
+            end=request.end_time,
+            subject=request.subject,
+            excluded=frozenset([request.requested_by_id]),
+        )
+        for request in requests
+    ]
+    groups = defaultdict(list)
+    for request in requests:
+        if request.group_id:
+            groups[request.group_id].append(request.id)
+    blocks = {('group', group_id): keys for group_id, keys in groups.items() if len(keys) > 1}
+    busy = _busy(date, {candidate.teacher_id for candidate in candidates})
+    plan = plan_day(
+        slots, candidates, settings.batch_size, busy=busy, blocks=blocks,
+        scorer=_learned_scorer(school_id, settings),
+    )
+    logger.info(
+        f"Planned {len(requests)} requests of school {school_id} on {date} in {plan.rounds} rounds: "
+        f"{len(plan.primary)} primary teachers, {len(plan.blocks)} of {len(blocks)} groups taken whole"
+    )
+    return plan
+
+
+def match_school_day(school_id, date):
+    """
+    Sends first invitation batches for every PENDING request of the school
+    on date, planned together. Returns {request id: teachers invited}, or
+    None when another worker is planning this school and date right now.
+
+    The lock only covers planning and claiming the requests; invitations
+    and emails go out after it is released.
+    """
+    lock = f'substitutes:plan:{school_id}:{date}'
+    token = uuid.uuid4().hex
+    if not cache.add(lock, token, timeout=PLAN_LOCK_TIMEOUT):
+        return None
+    try:
+        requests = pending_requests(school_id, date)
+        if not requests:
+            return {}
+        settings = requests[0].school.get_algorithm_settings
+        plan = plan_requests(requests, settings)
+        by_id = {request.id: request for request in requests}
+        batches = [
+            ([by_id[request_id] for request_id in plan.blocks.get(key, [key])], batch)
+            for key, batch in plan.batches.items()
+        ]
+        claimed = _claim([request.id for members, batch in batches if batch for request in members])
+    finally:
+        if cache.get(lock) == token:
+            cache.delete(lock)
+
+    invited = {}
+    unmatched = []
+    for members, batch in batches:
+        if not batch:
+            unmatched.extend(members)
+            continue
+        members = [request for request in members if request.id in claimed]
+        if members:
+            _send_first_batch(members, [candidate.availability for candidate in batch], settings)
+            invited.update((str(request.id), len(batch)) for request in members)
+    if unmatched:
+        _report_unmatched(unmatched)
+    return invited
@@ -0,0 +1,278 @@
+"""
+Monthly partitions and archival of stored notifications.
+
+On PostgreSQL the notification table is range-partitioned by month on
+timestamp (migration 0008). Its primary key is (id, timestamp), since
+Postgres requires the partition key in every unique constraint; ids still
+come from a single sequence. Partitions are named
+substitutes_notification_pYYYY_MM. A DEFAULT partition catches rows for
+months nobody created ahead of time.
+
+ensure_partitions() creates the coming months ahead of time.
+archive_expired_notifications() writes each month older than
+NOTIFICATION_RETENTION_DAYS to a gzipped JSONL file in
+NOTIFICATION_ARCHIVE_DIR, then detaches and drops its partition. The
+archive is the only copy left, so that directory must be persistent storage
+(a mounted volume) that already exists; archival refuses to run otherwise.
+Before anything is removed the archive is read back, and the month is only
+dropped when the archive holds exactly the rows the database does.
+Dropping a whole partition leaves no dead tuples or index bloat behind,
+which a DELETE would. Inbox queries are bounded by retention_start() (see
+substitutes.notifications.inbox), so the planner prunes them to the months
+still retained.
+
+Other databases keep a single table, and archival DELETEs the archived
+months instead, as it does for rows that landed in the DEFAULT partition.
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+TABLE = Notification._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+ARCHIVE_CHUNK_SIZE = 2000
+
+
+class ArchiveMismatch(Exception):
+    """An archive does not hold the rows it should; the month was left in place"""
+
+
+def month_start(value):
+    """Midnight UTC on the first of value's month"""
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def retention_start(now=None):
+    """First month still retained; everything before it is archived"""
+    now = now or timezone.now()
+    return month_start(now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS))
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def monthly_partitions():
+    """{month: partition name} for the attached monthly partitions"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        try:
+            month = datetime.strptime(name[len(TABLE) + 2:], '%Y_%m').replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue  # the DEFAULT partition
+        partitions[month] = name
+    return partitions
+
+
+def create_partition(month):
+    """
+    Creates and attaches the partition for month. Rows the DEFAULT partition
+    already holds for that month are moved into it first, since Postgres
+    refuses to attach a range the DEFAULT partition has rows for.
+    """
+    quote = connection.ops.quote_name
+    name = partition_name(month)
+    bounds = [month, add_months(month, 1)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {quote(name)} (LIKE {quote(TABLE)} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} '
+            f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO {quote(name)} SELECT * FROM moved',
+            bounds,
+        )
+        if cursor.rowcount:
+            logger.warning(f"Moved {cursor.rowcount} notifications from {DEFAULT_PARTITION} into {name}")
+        # A matching CHECK lets ATTACH skip scanning the new partition
+        cursor.execute(
+            f'ALTER TABLE {quote(name)} ADD CONSTRAINT {quote(name + "_bounds")} '
+            f'CHECK ("timestamp" >= %s AND "timestamp" < %s)',
+            bounds,
+        )
+        cursor.execute(
+            f'ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)',
+            bounds,
+        )
+        cursor.execute(f'ALTER TABLE {quote(name)} DROP CONSTRAINT {quote(name + "_bounds")}')
+    return name
+
+
+def ensure_partitions(ahead=None, now=None):
+    """Creates the partitions for this month and the next `ahead` months; returns the new names"""
+    if not is_partitioned():
+        return []
+    if ahead is None:
+        ahead = settings.NOTIFICATION_PARTITIONS_AHEAD
+    current = month_start(now or timezone.now())
+    existing = monthly_partitions()
+    created = []
+    for offset in range(ahead + 1):
+        month = add_months(current, offset)
+        if month not in existing:
+            created.append(create_partition(month))
+    return created
+
+
+def archive_location(archive_dir=None):
+    """The configured archive directory, which must already exist"""
+    archive_dir = archive_dir or settings.NOTIFICATION_ARCHIVE_DIR
+    if not archive_dir:
+        raise ImproperlyConfigured(
+            'NOTIFICATION_ARCHIVE_DIR must be set to persistent storage before notifications are archived'
+        )
+    # Not created here: a directory missing from a container is not a mounted volume
+    if not os.path.isdir(archive_dir):
+        raise ImproperlyConfigured(f'NOTIFICATION_ARCHIVE_DIR {archive_dir} does not exist')
+    return archive_dir
+
+
+def archive_path(month, archive_dir):
+    """
+    <archive_dir>/notifications-YYYY-MM.jsonl.gz, or -YYYY-MM-2 and so on
+    once that exists: rows landing in an archived month later get a file of
+    their own rather than replacing the first
+    """
+    path = os.path.join(archive_dir, f'notifications-{month:%Y-%m}.jsonl.gz')
+    number = 1
+    while os.path.exists(path):
+        number += 1
+        path = os.path.join(archive_dir, f'notifications-{month:%Y-%m}-{number}.jsonl.gz')
+    return path
+
+
+def write_archive(month, archive_dir):
+    """
+    Writes every notification from month to a new archive_path(). Returns
+    the path, the row count and the users who had unread ones among them.
+    """
+    path = archive_path(month, archive_dir)
+    rows = Notification.objects.filter(
+        timestamp__gte=month, timestamp__lt=add_months(month, 1)
+    ).order_by('timestamp', 'id').values()
+
+    count = 0
+    unread_users = set()
+    # Written beside the target and renamed, so a crash never leaves a partial archive
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as archive:
+        for row in rows.iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            count += 1
+            if not row['is_read']:
+                unread_users.add(row['user_id'])
+    if count:
+        os.replace(path + '.tmp', path)
+    else:
+        os.remove(path + '.tmp')
+    return path, count, unread_users
+
+
+def count_archived(path):
+    """Rows in the archive at path, read back in full so gzip checks every block"""
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            json.loads(line)
+            count += 1
+    return count
+
+
+def _check_archived(month, archived, stored):
+    if archived != stored:
+        raise ArchiveMismatch(
+            f"Archive for {month:%Y-%m} holds {archived} notifications, the database {stored}"
+        )
+
+
+def _months_before(cutoff):
+    """Months from the oldest notification up to cutoff"""
+    first = Notification.objects.filter(timestamp__lt=cutoff).order_by('timestamp').values_list(
+        'timestamp', flat=True
+    ).first()
+    months = []
+    month = month_start(first) if first else cutoff
+    while month < cutoff:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def archive_expired_notifications(now=None, archive_dir=None):
+    """
+    Archives and removes every month before retention_start(). Returns
+    {month label: rows archived}. Raises ImproperlyConfigured without an
+    archive directory, and ArchiveMismatch, keeping that month and the ones
+    after it, when an archive does not read back as written.
+    """
+    from .notifications import unread_count_key
+
+    archive_dir = archive_location(archive_dir)
+    cutoff = retention_start(now)
+    quote = connection.ops.quote_name
+    partitions = monthly_partitions() if is_partitioned() else {}
+    # Months without a partition of their own only have rows in DEFAULT
+    months = sorted(set(_months_before(cutoff)) | {month for month in partitions if month < cutoff})
+
+    archived = {}
+    for month in months:
+        path, count, unread_users = write_archive(month, archive_dir)
+        if not count and month not in partitions:
+            continue
+        archived_count = count_archived(path)
+        _check_archived(month, archived_count, count)
+        # The rows removed are counted too, inside the transaction removing
+        # them; a mismatch rolls the removal back
+        if month in partitions:
+            name = partitions[month]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}')
+                cursor.execute(f'SELECT count(*) FROM {quote(name)}')
+                _check_archived(month, archived_count, cursor.fetchone()[0])
+                cursor.execute(f'DROP TABLE {quote(name)}')
+        else:
+            with transaction.atomic():
+                _, deleted = Notification.objects.filter(
+                    timestamp__gte=month, timestamp__lt=add_months(month, 1)
+                ).delete()
+                _check_archived(month, archived_count, deleted.get(Notification._meta.label, 0))
+        # Their counters included rows that are gone now; recount on next read
+        cache.delete_many([unread_count_key(user_id) for user_id in unread_users])
+        archived[f'{month:%Y-%m}'] = count
+        logger.info(f"Archived {count} notifications from {month:%Y-%m}")
+    return archived
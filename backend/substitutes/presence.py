@@ -0,0 +1,106 @@
+"""
+Which users currently have a notification socket open.
+
+Each user with an open socket has a sorted set presence:<user_id>:sockets
+of their sockets' channel names, scored with the time each lapses unless
+refreshed, and a member in presence:users scored with the latest of those
+times. NotificationConsumer adds a socket on connect, refreshes it on every
+client heartbeat and removes it on disconnect; the user leaves
+presence:users with their last socket. A socket whose server died without
+disconnecting simply lapses after PRESENCE_TTL. Keying sockets per user
+keeps a user online while any of their tabs is. Lapsed members are pruned
+on every write.
+
+Matching asks online_user_ids() about its candidates only, in one ZMSCORE
+(Redis 6.2+), to boost or restrict teachers by the school's 'online' weight
+(see get_ranked_teachers). With presence disabled or Redis down the answer
+is None, and matching ranks as if the weight were not set.
+"""
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+from .push import get_client
+
+logger = logging.getLogger(__name__)
+
+USERS_KEY = 'presence:users'
+
+# KEYS: the user's sockets, users; ARGV: channel name, user id, now
+DISCONNECT_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[3])
+local last = redis.call('ZRANGE', KEYS[1], -1, -1, 'WITHSCORES')
+if last[2] then
+    redis.call('ZADD', KEYS[2], last[2], ARGV[2])
+else
+    redis.call('ZREM', KEYS[2], ARGV[2])
+end
+"""
+
+_disconnect = None
+
+
+def sockets_key(user_id):
+    return f'presence:{user_id}:sockets'
+
+
+def _touch(user_id, channel_name):
+    now = time.time()
+    lapses = now + settings.PRESENCE_TTL
+    key = sockets_key(user_id)
+    with get_client().pipeline() as pipe:
+        pipe.zadd(key, {channel_name: lapses})
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.expire(key, settings.PRESENCE_TTL)
+        # Every socket lapses PRESENCE_TTL after its last heartbeat, so the
+        # one just refreshed lapses last
+        pipe.zadd(USERS_KEY, {str(user_id): lapses})
+        pipe.zremrangebyscore(USERS_KEY, '-inf', now)
+        pipe.execute()
+
+
+def connected(user_id, channel_name):
+    if not settings.PRESENCE_ENABLED:
+        return
+    try:
+        _touch(user_id, channel_name)
+    except redis.RedisError as e:
+        logger.warning("Could not record presence for %s: %s", user_id, e)
+
+
+# A heartbeat re-adds the socket, which also revives one that lapsed
+heartbeat = connected
+
+
+def disconnected(user_id, channel_name):
+    global _disconnect
+    if not settings.PRESENCE_ENABLED:
+        return
+    try:
+        if _disconnect is None:
+            _disconnect = get_client().register_script(DISCONNECT_SCRIPT)
+        _disconnect(keys=[sockets_key(user_id), USERS_KEY], args=[channel_name, str(user_id), time.time()])
+    except redis.RedisError as e:
+        logger.warning("Could not clear presence for %s: %s", user_id, e)
+
+
+def online_user_ids(user_ids):
+    """
+    Which of user_ids (returned as strings) have at least one live socket,
+    or None when presence is disabled or unavailable
+    """
+    if not settings.PRESENCE_ENABLED:
+        return None
+    user_ids = [str(user_id) for user_id in user_ids]
+    if not user_ids:
+        return set()
+    try:
+        scores = get_client().zmscore(USERS_KEY, user_ids)
+    except redis.RedisError as e:
+        logger.warning("Presence unavailable, ranking without it: %s", e)
+        return None
+    now = time.time()
+    return {user_id for user_id, lapses in zip(user_ids, scores) if lapses is not None and lapses > now}
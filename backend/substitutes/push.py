@@ -0,0 +1,125 @@
+"""
+Sequenced pushes to notification sockets, replayable after a reconnect.
+
+Every message pushed to a user gets the next number in that user's
+sequence and is appended to a capped Redis stream, push:<user_id>:stream,
+under the entry id <seq>-0. A Lua script increments the sequence and
+appends in one step, so the stream stays in order under concurrent
+pushers. The message then goes to the user's channel group as before, with
+a "seq" key added.
+
+A reconnecting client passes the last seq it saw as ?last_seq=N on the
+socket URL. NotificationConsumer then replays the stream entries after N before any
+live message. The stream keeps the last PUSH_STREAM_MAXLEN entries and
+expires after PUSH_STREAM_TTL without pushes. When it no longer holds the
+whole gap, the client is told to resync from the REST inbox instead.
+With PUSH_STREAM_ENABLED off, messages go out live only, without seq.
+"""
+import json
+import logging
+
+import redis
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from accounts.models import SchoolStaff
+
+logger = logging.getLogger(__name__)
+
+# KEYS: sequence, stream; ARGV: message, maxlen, stream ttl
+APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], seq .. '-0', 'message', ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return seq
+"""
+
+_client = None
+_append = None
+
+
+def get_client():
+    global _client, _append
+    if _client is None:
+        _client = redis.Redis.from_url(settings.PUSH_STREAM_REDIS_URL)
+        _append = _client.register_script(APPEND_SCRIPT)
+    return _client
+
+
+def sequence_key(user_id):
+    # No expiry: a restarted sequence would look like a gap to clients
+    return f'push:{user_id}:seq'
+
+
+def stream_key(user_id):
+    return f'push:{user_id}:stream'
+
+
+def append(user_id, message):
+    """Records message for user_id and returns its sequence number"""
+    get_client()
+    return _append(
+        keys=[sequence_key(user_id), stream_key(user_id)],
+        args=[
+            json.dumps(message, cls=DjangoJSONEncoder),
+            settings.PUSH_STREAM_MAXLEN,
+            settings.PUSH_STREAM_TTL,
+        ],
+    )
+
+
+def push(user_ids, message):
+    """Sends message to each user's socket, stamped with their next seq"""
+    channel_layer = get_channel_layer()
+    for user_id in user_ids:
+        if not settings.PUSH_STREAM_ENABLED:
+            async_to_sync(channel_layer.group_send)(f"user_{user_id}", message)
+            continue
+        try:
+            stamped = dict(message, seq=append(user_id, message))
+        except redis.RedisError:
+            # Still deliver it live; a reconnect will just not replay it
+            logger.exception(f"Could not record push for user {user_id}")
+            stamped = message
+        async_to_sync(channel_layer.group_send)(f"user_{user_id}", stamped)
+
+
+def school_staff_ids(school_id, roles=('ADMIN', 'PRINCIPAL')):
+    return list(SchoolStaff.objects.filter(school_id=school_id, role__in=roles).values_list('user_id', flat=True))
+
+
+def push_to_school_staff(school_id, message, roles=('ADMIN', 'PRINCIPAL')):
+    push(school_staff_ids(school_id, roles), message)
+
+
+def current_seq(user_id):
+    return int(get_client().get(sequence_key(user_id)) or 0)
+
+
+def missed_since(user_id, last_seq):
+    """
+    (current seq, messages after last_seq in order). Messages is None when
+    the stream no longer holds the whole gap and the client must resync.
+    """
+    client = get_client()
+    # A MULTI pipeline, so no push lands between the two reads
+    with client.pipeline() as pipe:
+        pipe.get(sequence_key(user_id))
+        pipe.xrange(stream_key(user_id), min=f'{last_seq + 1}-0', count=settings.PUSH_STREAM_MAXLEN)
+        current, entries = pipe.execute()
+    current = int(current or 0)
+    if last_seq > current:
+        return current, None  # the sequence was reset
+    if current - last_seq > settings.PUSH_STREAM_MAXLEN:
+        return current, None  # cheaper to reload the inbox
+
+    messages = [
+        dict(json.loads(fields[b'message']), seq=int(entry_id.split(b'-')[0]))
+        for entry_id, fields in entries
+    ]
+    # Trimmed or expired entries leave the gap short
+    if len(messages) != current - last_seq:
+        return current, None
+    return current, messages
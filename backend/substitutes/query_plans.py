@@ -0,0 +1,23 @@
+"""Query plans for SubstituteRequestViewSet actions (see accounts.query_plans)"""
+from django.db.models import Prefetch
+
+from accounts.query_plans import QueryPlan
+from .models import RequestInvitation
+
+# TeacherInvitationSerializer reads the teacher and their profile for every invitation
+INVITATIONS_WITH_TEACHERS = Prefetch(
+    'invitations',
+    queryset=RequestInvitation.objects.select_related('teacher__teacher_profile'),
+)
+
+# SubstituteRequestDetailSerializer
+SUBSTITUTE_REQUEST_DETAIL = QueryPlan(
+    select_related=('requested_by', 'assigned_teacher'),
+    prefetch_related=(INVITATIONS_WITH_TEACHERS,),
+)
+
+SUBSTITUTE_REQUEST_QUERY_PLANS = {
+    'retrieve': SUBSTITUTE_REQUEST_DETAIL,
+    'invitation_history': SUBSTITUTE_REQUEST_DETAIL,
+    'requests_to_me': SUBSTITUTE_REQUEST_DETAIL,
+}
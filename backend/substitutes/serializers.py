@@ -1,6 +1,11 @@
+from collections import Counter
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
-from .models import SubstituteRequest, TeacherAvailability, RequestInvitation
+from .models import RequestGroup, SubstituteRequest, TeacherAvailability, RequestInvitation
 from accounts.models import School, User
+from accounts.utils import get_request_school
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
@@ -102,11 +107,13 @@ class SubstituteRequestCreateSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'school', 'requested_by', 'created_at', 'updated_at']        
     def create(self, validated_data):
-        user = self.context['request'].user
-        print("User:", user)
+        request = self.context['request']
+        user = request.user
         # Get school based on user type
         if user.user_type in ['SCHOOL_ADMIN', 'INTERNAL_TEACHER', 'PRINCIPAL']:
-            school = user.school_staff.school
+            school = get_request_school(request)
+            if school is None:
+                raise serializers.ValidationError("No school associated with your account")
         else:
             raise serializers.ValidationError("Only school admins, principals and internal teachers can create substitute requests")
             
@@ -137,6 +144,97 @@ class SubstituteRequestCreateSerializer(serializers.ModelSerializer):
 
 
 
+class RequestPeriodSerializer(serializers.ModelSerializer):
+    """One period of a request group; subject, grade and section default to the group's"""
+    class Meta:
+        model = SubstituteRequest
+        fields = ['start_time', 'end_time', 'subject', 'grade', 'section']
+        extra_kwargs = {
+            'subject': {'required': False},
+            'grade': {'required': False},
+            'section': {'required': False},
+        }
+
+
+class RequestGroupCreateSerializer(serializers.ModelSerializer):
+    """
+    Creates a request group: one SubstituteRequest per period, sharing the
+    date, details and (unless a period overrides them) subject, grade and
+    section, saved with a single bulk INSERT
+    """
+    MAX_PERIODS = 12
+
+    periods = RequestPeriodSerializer(many=True, write_only=True)
+
+    class Meta:
+        model = SubstituteRequest
+        fields = [
+            'subject',
+            'grade',
+            'section',
+            'date',
+            'priority',
+            'mode',
+            'description',
+            'requirements',
+            'special_instructions',
+            'periods'
+        ]
+        extra_kwargs = {
+            'subject': {'required': False},
+            'grade': {'required': False},
+        }
+
+    def validate(self, attrs):
+        periods = attrs['periods']
+        if not 1 <= len(periods) <= self.MAX_PERIODS:
+            raise serializers.ValidationError({'periods': f"Give between 1 and {self.MAX_PERIODS} periods"})
+        for period in periods:
+            for name in ('subject', 'grade'):
+                if name not in period and name not in attrs:
+                    raise serializers.ValidationError({name: "Required unless every period gives it"})
+        ordered = sorted(periods, key=lambda period: period['start_time'])
+        for earlier, later in zip(ordered, ordered[1:]):
+            if later['start_time'] < earlier['end_time']:
+                raise serializers.ValidationError({'periods': "Periods must not overlap"})
+        return attrs
+
+    def create(self, validated_data):
+        request = self.context['request']
+        user = request.user
+        if user.user_type not in ['SCHOOL_ADMIN', 'INTERNAL_TEACHER', 'PRINCIPAL']:
+            raise serializers.ValidationError("Only school admins, principals and internal teachers can create substitute requests")
+        school = get_request_school(request)
+        if school is None:
+            raise serializers.ValidationError("No school associated with your account")
+
+        periods = validated_data.pop('periods')
+        requests = [
+            SubstituteRequest(school=school, requested_by=user, **{**validated_data, **period})
+            for period in periods
+        ]
+        for substitute_request in requests:
+            # bulk_create skips save(), which would run this
+            try:
+                substitute_request.clean()
+            except DjangoValidationError as e:
+                raise serializers.ValidationError({'periods': e.messages})
+
+        with transaction.atomic():
+            group = RequestGroup.objects.create(school=school, requested_by=user, date=validated_data['date'])
+            for substitute_request in requests:
+                substitute_request.group = group
+            SubstituteRequest.objects.bulk_create(requests)
+        return group
+
+    def to_representation(self, group):
+        return {
+            'id': group.id,
+            'date': str(group.date),
+            'requests': SubstituteRequestSerializer(group.requests.order_by('start_time'), many=True).data,
+        }
+
+
 class SubstituteRequestDetailSerializer(serializers.ModelSerializer):
     """Detailed Serializer for Substitute Requests"""
     assigned_teacher_details = serializers.SerializerMethodField()
@@ -183,17 +281,40 @@ class SubstituteRequestDetailSerializer(serializers.ModelSerializer):
 
     def get_matching_teachers(self, obj):
         """Get list of potential matching teachers"""
-        matching_teachers = obj.get_matching_teachers()
+        matching_teachers = [
+            slot for slot in self._available_slots(obj)
+            if slot.start_time <= obj.start_time and slot.end_time >= obj.end_time
+        ]
         return TeacherAvailabilitySerializer(matching_teachers, many=True).data
+
+    def _available_slots(self, obj):
+        """
+        AVAILABLE slots on the request's date. When serializing a list, the
+        slots for every date in it are loaded with one query on first use.
+        """
+        slots = getattr(self, '_slots_by_date', None)
+        if slots is None or obj.date not in slots:
+            dates = {obj.date}
+            if self.parent is not None and self.parent.instance is not None:
+                dates.update(request.date for request in self.parent.instance)
+            slots = {date: [] for date in dates}
+            for slot in TeacherAvailability.objects.filter(
+                date__in=dates, status='AVAILABLE'
+            ).select_related('teacher'):
+                slots[slot.date].append(slot)
+            self._slots_by_date = slots
+        return slots[obj.date]
     
     def get_current_status(self, obj):
+        # Count in Python so prefetched invitations are reused (one query otherwise)
+        counts = Counter(invitation.status for invitation in obj.invitations.all())
         return {
-            'total_invites': obj.invitations.count(),
-            'pending': obj.invitations.filter(status='PENDING').count(),
-            'accepted': obj.invitations.filter(status='ACCEPTED').count(),
-            'declined': obj.invitations.filter(status='DECLINED').count(),
-            'withdrawn': obj.invitations.filter(status='WITHDRAWN').count(),
-            'expired': obj.invitations.filter(status='EXPIRED').count(),
+            'total_invites': sum(counts.values()),
+            'pending': counts['PENDING'],
+            'accepted': counts['ACCEPTED'],
+            'declined': counts['DECLINED'],
+            'withdrawn': counts['WITHDRAWN'],
+            'expired': counts['EXPIRED'],
         }
 
 class SubstituteRequestSerializer(serializers.ModelSerializer):
@@ -211,4 +332,5 @@ from .models import Notification
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
-        fields = ['id', 'content', 'notification_type', 'is_read', 'timestamp']
\ No newline at end of file
+        fields = ['id', 'content', 'notification_type', 'category', 'priority', 'is_read', 'read_at',
+                  'timestamp', 'action_url', 'metadata']
\ No newline at end of file
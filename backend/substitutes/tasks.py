@@ -1,15 +1,20 @@
 from celery import shared_task
+from celery.exceptions import MaxRetriesExceededError
 from django.db.models import Q, F, Value, IntegerField, Case, When
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from .models import SubstituteRequest, RequestInvitation, TeacherAvailability, Notification
+from .notifications import create_notifications
+from . import acceptance_model, presence
+from .escalation import ESCALATION_LEASE
+from .optimizer import PLAN_LOCK_TIMEOUT, match_school_day
+from .push import push, push_to_school_staff, school_staff_ids
 from accounts.models import User, School, SchoolStaff
 from accounts.models import TeacherProfile
 from accounts.utils import send_email as send
+from accounts.instrumentation import external_call
 
 # Import improved email utilities
 import logging
@@ -26,9 +31,6 @@ from email.mime.multipart import MIMEMultipart
 # Configure logging
 logger = logging.getLogger(__name__)
 
-BATCH_SIZE = 10  # Number of teachers per batch
-WAIT_TIME = 10 * 60  # 10 minutes in seconds
-
 # Maximum retry attempts for email sending
 MAX_EMAIL_RETRIES = 3
 
@@ -39,6 +41,29 @@ MAX_RETRY_DELAY = 30  # seconds
 # Path to the standalone email script
 EMAIL_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'send_email_cli.py')
 
+# Broker priority of a request's tasks; lower is delivered first (see backend/celery.py)
+TASK_PRIORITIES = {
+    'URGENT': 0,
+    'HIGH': 3,
+    'MEDIUM': 5,
+    'LOW': 8,
+}
+
+
+def task_priority(request):
+    """Celery priority for tasks working on the given substitute request"""
+    return TASK_PRIORITIES.get(request.priority, TASK_PRIORITIES['MEDIUM'])
+
+
+def enqueue_matching(request):
+    """Queue teacher matching for a newly created request, URGENT ones first"""
+    try:
+        match_teachers_to_request.apply_async(args=[request.id], priority=task_priority(request))
+        return True
+    except Exception:
+        logger.exception(f"Could not queue matching for request {request.id}")
+        return False
+
 # Helper function for exponential backoff
 def get_retry_delay(attempt):
     """Calculate delay with exponential backoff and jitter"""
@@ -47,6 +72,7 @@ def get_retry_delay(attempt):
     return delay + jitter
 
 # Emergency direct email function that bypasses all abstractions
+@external_call('smtp')
 def send_emergency_email(to_email, subject, body, from_email=None):
     """
     Emergency direct email function that uses smtplib directly with no dependencies
@@ -144,57 +170,56 @@ def send_email_via_script(to_email, subject, body, from_email=None):
         logger.exception(f"Error executing email script: {str(e)}")
         return False
 
-@shared_task
-def match_teachers_to_request(request_id):
-    """Initial matching of teachers to a substitute request"""
-    print(f"Starting teacher matching for request: {request_id}")
+# Seconds to wait while another worker plans the same school and date.
+# Retries outlast the planner lock, so one held by a crashed worker expires first.
+PLAN_RETRY_DELAY = 5
+PLAN_MAX_RETRIES = PLAN_LOCK_TIMEOUT // PLAN_RETRY_DELAY + 2
+
+@shared_task(bind=True, max_retries=PLAN_MAX_RETRIES)
+def match_teachers_to_request(self, request_id):
+    """
+    Initial matching of teachers to a substitute request. The first batch is
+    planned together with the school's other unmatched requests that day
+    (see optimizer.match_school_day), so a sibling's task may already have
+    sent it. The request is leased to the escalation sweep meanwhile, which
+    queues this task again if it never gets to plan.
+    """
+    logger.info(f"Starting teacher matching for request: {request_id}")
     try:
         request = SubstituteRequest.objects.get(id=request_id)
-        settings = request.school.get_algorithm_settings
-        print(f"School settings: {settings}")
-        
-        # First notify school staff
-        notify_school_staff(request)
-        
-        # Get first batch of ranked teachers using school settings
-        ranked_teachers = get_ranked_teachers(request, settings)
-        print(f"Found {ranked_teachers.count()} matching teachers")
-        
-        if not ranked_teachers:
-            print(f"No matching teachers found for request {request_id}!")
-            # Log the criteria being used
-            print(f"Request criteria: Date={request.date}, Time={request.start_time}-{request.end_time}, Subject={request.subject}")
-            return
-            
-        teachers_to_process = ranked_teachers[:settings['batch_size']]
-        print(f"Processing batch of {len(teachers_to_process)} teachers")
-        
-        process_teacher_batch(request, teachers_to_process, batch_number=1)
-        
-        # Update request status
-        request.status = 'AWAITING_ACCEPTANCE'
-        request.save()
-        print(f"Updated request {request_id} status to AWAITING_ACCEPTANCE")
-        
-        # Schedule next batch check
-        check_request_status.apply_async(
-            args=[request_id, 1],
-            countdown=settings['wait_time_minutes'] * 60
-        )
-        print(f"Scheduled follow-up check in {settings['wait_time_minutes']} minutes")
     except SubstituteRequest.DoesNotExist:
-        print(f"Request {request_id} not found!")
+        logger.warning(f"Request {request_id} not found")
         return
-    except Exception as e:
-        print(f"Error in match_teachers_to_request: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    if request.status != 'PENDING':
+        logger.info(f"Request {request_id} was already matched ({request.status})")
+        return
+    SubstituteRequest.objects.filter(pk=request.pk, status='PENDING').update(
+        escalate_at=timezone.now() + ESCALATION_LEASE
+    )
+
+    try:
+        invited = match_school_day(request.school_id, request.date)
+    except Exception:
+        logger.exception(f"Matching request {request_id} failed")
+        return
+    if invited is None:
+        try:
+            raise self.retry(countdown=PLAN_RETRY_DELAY)
+        except MaxRetriesExceededError:
+            logger.warning(f"Planning request {request_id} timed out; left to the escalation sweep")
+            return
+    logger.info(f"Invited teachers per request: {invited}")
+    return invited
 
 # In substitutes/tasks.py
 from django.db.models import F, Q, Value, FloatField, ExpressionWrapper
 
 def get_ranked_teachers(request, settings):
-    """Get ranked list of available teachers based on school criteria"""
+    """
+    Get ranked list of available teachers based on school criteria: by
+    expected minutes to accept when an acceptance model is trained (see
+    acceptance_model), else by the school's weights
+    """
     print(f"Searching for teachers with criteria:")
     print(f"  - Date: {request.date}")
     print(f"  - Time: {request.start_time} to {request.end_time}")
@@ -220,10 +245,9 @@ def get_ranked_teachers(request, settings):
     ).count()
     print(f"Teachers with subject {request.subject}: {subject_teachers}")
     
-    # Now do the actual query
-    weights = settings['weights']
-    
-    
+    # Now do the actual query using the school's precompiled weights
+    experience_weight = settings.experience_weight
+    rating_weight = settings.rating_weight
     results = TeacherAvailability.objects.filter(
         Q(date=request.date) &
         Q(start_time__lte=request.start_time) &
@@ -232,29 +256,66 @@ def get_ranked_teachers(request, settings):
         Q(teacher__teacher_profile__subjects__icontains=request.subject)
     ).exclude(
         teacher=request.requested_by
-    ).annotate(
+    )
+    # Teachers with the app open see the invitation straight away. Only this
+    # request's candidates are looked up; None means presence is unknown.
+    online_ids = None
+    if settings.online_boost or settings.online_minutes or settings.online_only:
+        online_ids = presence.online_user_ids(results.values_list('teacher_id', flat=True))
+
+    def if_online(value):
+        if not online_ids:
+            return Value(0.0, output_field=FloatField())
+        return Case(
+            When(teacher_id__in=online_ids, then=Value(value)),
+            default=Value(0.0),
+            output_field=FloatField()
+        )
+
+    results = results.annotate(
         # Fix this line - use experience_years instead of years_experience
         experience_score=ExpressionWrapper(
-            F('teacher__teacher_profile__experience_years') * Value(weights.get('experience', 1)),
+            F('teacher__teacher_profile__experience_years') * Value(experience_weight),
             output_field=FloatField()
         ),
         rating_score=ExpressionWrapper(
-            F('teacher__teacher_profile__rating') * Value(weights.get('rating', 1)), 
+            F('teacher__teacher_profile__rating') * Value(rating_weight),
             output_field=FloatField()
         ),
-        total_score=ExpressionWrapper(
-            F('experience_score') + F('rating_score') + Value(1.0),
+        online_score=if_online(settings.online_boost)
+    )
+    coefficients = None
+    if settings.ranking == 'learned':
+        coefficients = acceptance_model.coefficients_for(request.school_id, request.subject, request.start_time)
+    if coefficients is None:
+        results = results.annotate(total_score=ExpressionWrapper(
+            F('experience_score') + F('rating_score') + F('online_score') + Value(1.0),
             output_field=FloatField()
-        )
-    ).order_by('-total_score')
+        ))
+    else:
+        # Sooner is better; being online saves the school's online minutes
+        results = results.annotate(
+            expected_minutes=coefficients.expected_minutes_expression(),
+            online_minutes=if_online(settings.online_minutes),
+        ).annotate(total_score=ExpressionWrapper(
+            F('online_minutes') - F('expected_minutes'),
+            output_field=FloatField()
+        ))
+    results = results.order_by('-total_score')
+    if settings.online_only and online_ids is not None:
+        results = results.filter(teacher_id__in=online_ids)
         
     print(f"Final number of matching teachers: {results.count()}")
     return results
 
 
 # In substitutes/tasks.py
-def process_teacher_batch(request, teachers, batch_number):
-    """Process a batch of teachers for invitations"""
+def process_teacher_batch(request, teachers, batch_number, queue_emails=False):
+    """
+    Process a batch of teachers for invitations. With queue_emails the
+    emails are left to send_teacher_email on the email queue instead of
+    going out over SMTP here, for callers that must not wait on mail
+    """
     print(f"Processing batch {batch_number} for request {request.id} with {len(teachers)} teachers")
     for teacher in teachers:
         try:
@@ -270,6 +331,9 @@ def process_teacher_batch(request, teachers, batch_number):
             # Send notifications
             print(f"Sending WebSocket notification to teacher {teacher.teacher.id}")
             notify_teacher(invitation)
+            if queue_emails:
+                send_teacher_email.apply_async(args=[invitation.id], priority=task_priority(request))
+                continue
             
             print(f"Queueing email notification for teacher {teacher.teacher.email}")
             
@@ -320,51 +384,119 @@ Best regards,
                     print(f"✅ Email sent directly to {teacher.teacher.email}")
                 else:
                     # As a fallback, also queue the regular email task in case direct sending fails
-                    send_teacher_email.delay(invitation.id)
+                    send_teacher_email.apply_async(args=[invitation.id], priority=task_priority(request))
             except Exception as email_error:
                 print(f"Error sending direct email: {str(email_error)}")
                 # Still queue the task as a backup
-                send_teacher_email.delay(invitation.id)
+                send_teacher_email.apply_async(args=[invitation.id], priority=task_priority(request))
             
         except Exception as e:
             print(f"Error processing teacher {teacher.teacher.email}: {str(e)}")
 
+def process_group_batch(requests, teachers, batch_number):
+    """
+    Invite a batch of teachers to every period of a request group: one
+    invitation per period, all created in one INSERT, and a single email
+    per teacher listing the periods
+    """
+    invitations = RequestInvitation.objects.bulk_create([
+        RequestInvitation(
+            substitute_request=request,
+            teacher=teacher.teacher,
+            status='PENDING',
+            batch_number=batch_number
+        )
+        for teacher in teachers
+        for request in requests
+    ])
+    logger.info(f"Created {len(invitations)} invitations for group batch {batch_number} of {len(requests)} periods")
+
+    first = requests[0]
+    frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
+    from_email = f"{first.school.school_name} <{settings.EMAIL_HOST_USER}>"
+    for index, teacher in enumerate(teachers):
+        teacher_invitations = invitations[index * len(requests):(index + 1) * len(requests)]
+        for invitation in teacher_invitations:
+            notify_teacher(invitation)
+
+        periods = "\n".join(
+            f"{invitation.substitute_request.start_time} - {invitation.substitute_request.end_time}: "
+            f"{invitation.substitute_request.subject}, Grade {invitation.substitute_request.grade}\n"
+            f"  Accept: {frontend_url}/accept-request/{invitation.id}\n"
+            f"  Decline: {frontend_url}/decline-request/{invitation.id}"
+            for invitation in teacher_invitations
+        )
+        message = f"""
+Dear {teacher.teacher.get_full_name()},
+
+You have been invited to cover {len(requests)} periods at {first.school.school_name} on {first.date}.
+
+{periods}
+
+Accepting any of these periods assigns you all of them.
+
+Please respond within 10 minutes.
+
+Best regards,
+{first.school.school_name} Team
+"""
+        try:
+            success = send_emergency_email(
+                teacher.teacher.email,
+                f"Substitute Teaching Request - {len(requests)} periods on {first.date}",
+                message,
+                from_email
+            )
+        except Exception:
+            logger.exception(f"Sending the group invitation email to {teacher.teacher.email} failed")
+            success = False
+        if not success:
+            for invitation in teacher_invitations:
+                send_teacher_email.apply_async(args=[invitation.id], priority=task_priority(first))
+
 @shared_task
-def check_request_status(request_id, current_batch):
-    """Check request status and escalate to next batch if needed"""
+def escalate_due_requests():
+    """Send the next invitation batch for requests whose wait time has run out"""
+    from .escalation import sweep_due_escalations
+    return sweep_due_escalations()
+
+@shared_task
+def expire_invitations():
+    """Expire pending invitations past their response window"""
+    from .expiry import expire_overdue_invitations
+    return len(expire_overdue_invitations())
+
+@shared_task
+def maintain_notification_partitions():
+    """Create the coming months' notification partitions and archive expired ones"""
+    from django.core.exceptions import ImproperlyConfigured
+    from .partitions import archive_expired_notifications, ensure_partitions
+    created = ensure_partitions()
     try:
-        request = SubstituteRequest.objects.get(id=request_id)
-        
-        if request.status == 'AWAITING_ACCEPTANCE':
-            # Get already invited teachers
-            excluded_teachers = RequestInvitation.objects.filter(
-                substitute_request=request
-            ).values_list('teacher_id', flat=True)
-            
-            # Get next batch of teachers
-            next_batch = get_ranked_teachers(request).exclude(
-                teacher__in=excluded_teachers
-            )[:BATCH_SIZE]
-            
-            if next_batch.exists():
-                process_teacher_batch(request, next_batch, current_batch + 1)
-                
-                # Schedule next check
-                check_request_status.apply_async(
-                    args=[request_id, current_batch + 1],
-                    countdown=WAIT_TIME
-                )
-            else:
-                request.status = 'NO_TEACHERS_AVAILABLE'
-                request.save()
-                notify_school_staff_no_teachers(request)
+        archived = archive_expired_notifications()
+    except ImproperlyConfigured as e:
+        logger.error(f"Not archiving notifications: {e}")
+        archived = None
+    return {'created': created, 'archived': archived}
 
-    except SubstituteRequest.DoesNotExist:
-        return
+@shared_task
+def train_acceptance_models():
+    """Refit the acceptance models ranking uses on recent invitation history"""
+    from .acceptance_model import train_acceptance_models as train
+    report = train()
+    return {'invitations': report['invitations'], 'models': report['models'], 'improved': report['improved']}
+
+@shared_task
+def check_request_status(request_id, current_batch):
+    """
+    Superseded by escalate_due_requests. Kept registered so countdown messages
+    queued before the upgrade are consumed; the 0005 migration already put
+    their requests on the escalation schedule.
+    """
+    return None
 
 def notify_school_staff(request):
     """Send notification to school admin and principal"""
-    channel_layer = get_channel_layer()
     content = {
         "type": "substitute.request",
         "content": {
@@ -378,11 +510,32 @@ def notify_school_staff(request):
     }
     
     # Notify admin and principal
-    for role in ['admin', 'principal']:
-        async_to_sync(channel_layer.group_send)(
-            f"school_{request.school.id}_{role}",
-            content
-        )
+    push_to_school_staff(request.school_id, content)
+
+
+def notify_school_staff_no_teachers(request):
+    """Tell school admin and principal that every matching teacher was invited"""
+    message = (
+        f"No more teachers are available for the {request.subject} request on {request.date}; "
+        f"invitations already sent remain open"
+    )
+    staff = list(User.objects.filter(
+        school_staff__school_id=request.school_id,
+        school_staff__role__in=['ADMIN', 'PRINCIPAL']
+    ))
+    create_notifications([
+        Notification(user=user, content=message, notification_type='ASSIGNMENT')
+        for user in staff
+    ])
+
+    push([user.id for user in staff], {
+        "type": "notification",
+        "content": {
+            "request_id": str(request.id),
+            "status": request.status,
+            "message": message
+        }
+    })
 
 # In substitutes/tasks.py
 @shared_task
@@ -451,10 +604,9 @@ Best regards,
 def notify_teacher(invitation):
     """Send WebSocket notification to invited teacher"""
     try:
-        channel_layer = get_channel_layer()
         request = invitation.substitute_request
         
-        group_name = f"user_{invitation.teacher.id}"
+        group_name = f"user_{invitation.teacher_id}"
         print(f"Sending WebSocket message to group: {group_name}")
         
         message = {
@@ -470,12 +622,13 @@ def notify_teacher(invitation):
                 "grade": request.grade,
                 "date": str(request.date),
                 "time": f"{request.start_time} - {request.end_time}",
-                "expires_in": "10 minutes"
+                "expires_in": "10 minutes",
+                "expires_at": invitation.expires_at.isoformat() if invitation.expires_at else None
             }
         }
         print(f"WebSocket payload: {message}")
         
-        async_to_sync(channel_layer.group_send)(group_name, message)
+        push([invitation.teacher_id], message)
         print(f"WebSocket message sent to {group_name}")
     except Exception as e:
         print(f"Error sending WebSocket notification: {str(e)}")
@@ -506,42 +659,38 @@ def send_assignment_notifications(request_id):
             }
         }
         
-        channel_layer = get_channel_layer()
-        
         # Notify all relevant parties
         notifications = [
             # Assigned teacher notification
-            (f"user_{request.assigned_teacher.id}", "You have been assigned"),
+            ([request.assigned_teacher_id], "You have been assigned"),
             
             # Original teacher notification (if different)
-            (f"user_{request.requested_by.id}", "A substitute has been assigned"),
+            ([request.requested_by_id], "A substitute has been assigned"),
             
             # School staff notifications
-            (f"school_{request.school.id}_admin", "Substitute has been assigned"),
-            (f"school_{request.school.id}_principal", "Substitute has been assigned")
+            (school_staff_ids(request.school_id), "Substitute has been assigned"),
         ]
         
-        for group, message in notifications:
+        for user_ids, message in notifications:
             # Skip if sending to assigned teacher who is also the requesting teacher
-            if group == f"user_{request.requested_by.id}" and request.assigned_teacher == request.requested_by:
+            if user_ids == [request.requested_by_id] and request.assigned_teacher == request.requested_by:
                 continue
                 
-            content["content"]["message"] = message
-            async_to_sync(channel_layer.group_send)(group, content)
+            push(user_ids, dict(content, content=dict(content["content"], message=message)))
         
         # Create database notification for each recipient
-        Notification.objects.create(
+        stored = [Notification(
             user=request.assigned_teacher,
             content=f"You've been assigned to teach {request.subject} on {request.date}",
             notification_type='ASSIGNMENT'
-        )
+        )]
         
         if request.requested_by != request.assigned_teacher:
-            Notification.objects.create(
+            stored.append(Notification(
                 user=request.requested_by,
                 content=f"{request.assigned_teacher.get_full_name()} has been assigned to your request for {request.subject}",
                 notification_type='ASSIGNMENT'
-            )
+            ))
         
         # Create notifications for school staff
         from django.contrib.auth import get_user_model
@@ -552,15 +701,18 @@ def send_assignment_notifications(request_id):
             school_staff__role__in=['ADMIN', 'PRINCIPAL']
         )
         
-        for staff in school_staff:
-            Notification.objects.create(
+        stored.extend(
+            Notification(
                 user=staff,
                 content=f"{request.assigned_teacher.get_full_name()} has been assigned to teach {request.subject} on {request.date}",
                 notification_type='ASSIGNMENT'
             )
+            for staff in school_staff
+        )
+        create_notifications(stored)
             
         # Send confirmation email to assigned teacher
-        send_confirmation_email.delay(request_id)
+        send_confirmation_email.apply_async(args=[request_id], priority=task_priority(request))
         
         return "Notifications sent successfully"
         
@@ -1,3 +1,1014 @@
-from django.test import TestCase
+import gzip
+import itertools
+import json
+import math
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from datetime import datetime, time as clock, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import redis
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import StudentProfile, TeacherAvailability, TeacherProfile, User
+from accounts.sample_data import SampleDataScale, generate_sample_data
+from accounts.testing import assert_endpoint_queries, jwt_client
+from teaching_sessions.models import TeachingSession
+from . import acceptance, acceptance_model, escalation, expiry, notifications, partitions, presence, push, tasks
+from .consumers import NotificationConsumer
+from .models import AcceptanceModel, Notification, RequestGroup, RequestInvitation, SubstituteRequest, TeacherAcceptanceStats
+from .optimizer import Candidate, Slot, covers, linear_sum_assignment, merge_intervals, plan_day, subjects_text
+
+
+def brute_force_assignment(cost):
+    """Least total cost over every assignment of rows to distinct columns, inf if none"""
+    n, m = cost.shape
+    best = math.inf
+    for columns in itertools.permutations(range(m), n):
+        total = sum(cost[row, column] for row, column in enumerate(columns))
+        best = min(best, total)
+    return best
+
+
+class LinearSumAssignmentTests(SimpleTestCase):
+    def assert_optimal(self, cost):
+        expected = brute_force_assignment(cost)
+        if math.isinf(expected):
+            with self.assertRaises(ValueError):
+                linear_sum_assignment(cost)
+            return
+        columns = linear_sum_assignment(cost)
+        self.assertEqual(len(set(columns.tolist())), cost.shape[0])
+        self.assertAlmostEqual(cost[np.arange(cost.shape[0]), columns].sum(), expected)
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(48)
+        for _ in range(200):
+            n = int(rng.integers(1, 6))
+            m = int(rng.integers(n, 7))
+            cost = rng.integers(0, 20, size=(n, m)).astype(float)
+            with self.subTest(cost=cost.tolist()):
+                self.assert_optimal(cost)
+
+    def test_forbidden_pairs_match_brute_force(self):
+        rng = np.random.default_rng(49)
+        for _ in range(200):
+            n = int(rng.integers(1, 6))
+            m = int(rng.integers(n, 7))
+            cost = rng.random((n, m)) * 10
+            cost[rng.random((n, m)) < 0.4] = np.inf
+            with self.subTest(cost=cost.tolist()):
+                self.assert_optimal(cost)
+
+    def test_ties_and_zero_costs(self):
+        self.assert_optimal(np.zeros((3, 3)))
+        self.assert_optimal(np.ones((2, 4)))
+
+    def test_no_complete_assignment(self):
+        cost = np.array([[1.0, np.inf], [2.0, np.inf]])
+        with self.assertRaises(ValueError):
+            linear_sum_assignment(cost)
+
+
+@override_settings(PRESENCE_ENABLED=True)
+class IntervalUnionTests(SimpleTestCase):
+    def test_merges_overlapping_and_touching_windows(self):
+        self.assertEqual(
+            merge_intervals([(clock(13), clock(14)), (clock(9), clock(10)), (clock(10), clock(11)), (clock(10, 30), clock(12))]),
+            [(clock(9), clock(12)), (clock(13), clock(14))],
+        )
+
+    def test_covers_only_within_one_merged_window(self):
+        union = merge_intervals([(clock(9), clock(10)), (clock(10), clock(12)), (clock(13), clock(15))])
+        self.assertTrue(covers(union, clock(9, 30), clock(11, 30)))
+        self.assertTrue(covers(union, clock(13), clock(15)))
+        self.assertFalse(covers(union, clock(11), clock(14)))
+        self.assertFalse(covers(union, clock(8), clock(10)))
+
+
+class BlockPlanningTests(SimpleTestCase):
+    """plan_day with a block: taken whole by a teacher covering every period, else split"""
+    MATHS = subjects_text(['MATHS'])
+
+    def setUp(self):
+        self.periods = [
+            Slot(key='p1', start=clock(9), end=clock(10), subject='MATHS'),
+            Slot(key='p2', start=clock(10), end=clock(11), subject='MATHS'),
+        ]
+        self.blocks = {'block': ['p1', 'p2']}
+
+    def candidate(self, teacher_id, start, end, score):
+        return Candidate(teacher_id=teacher_id, start=clock(start), end=clock(end), subjects=self.MATHS, score=score)
+
+    def test_block_goes_to_a_teacher_whose_windows_cover_it(self):
+        # "whole" has two windows that only cover the block together
+        candidates = [
+            self.candidate('whole', 9, 10, 1.0),
+            self.candidate('whole', 10, 11, 1.0),
+            self.candidate('first', 9, 10, 5.0),
+            self.candidate('second', 10, 11, 5.0),
+        ]
+        plan = plan_day(self.periods, candidates, batch_size=5, blocks=self.blocks)
+
+        self.assertEqual(plan.primary, {'block': 'whole'})
+        self.assertEqual(plan.blocks, {'block': ['p1', 'p2']})
+        self.assertEqual([c.teacher_id for c in plan.batches['block']], ['whole'])
+
+    def test_block_nobody_covers_falls_back_to_periods(self):
+        candidates = [self.candidate('first', 9, 10, 5.0), self.candidate('second', 10, 11, 4.0)]
+        plan = plan_day(self.periods, candidates, batch_size=5, blocks=self.blocks)
+
+        self.assertEqual(plan.primary, {'p1': 'first', 'p2': 'second'})
+        self.assertEqual(plan.blocks, {})
+        self.assertNotIn('block', plan.batches)
+
+    def test_teacher_busy_during_the_block_cannot_take_it(self):
+        candidates = [self.candidate('whole', 9, 11, 1.0), self.candidate('first', 9, 10, 5.0)]
+        plan = plan_day(
+            self.periods, candidates, batch_size=5, blocks=self.blocks,
+            busy=[('whole', clock(10, 30), clock(11))],
+        )
+
+        self.assertEqual(plan.primary, {'p1': 'first'})
+        self.assertEqual(plan.blocks, {})
+        # Still invited to the period they are free for, after the primary
+        self.assertEqual([c.teacher_id for c in plan.batches['p1']], ['first', 'whole'])
+
+
+def coefficients(intercept):
+    return acceptance_model.Coefficients(intercept=intercept, weights=(0.0, 0.0, 0.0), prior_rate=0.5, response_minutes=5.0)
+
+
+class AcceptanceModelFitTests(SimpleTestCase):
+    def test_fit_logistic_recovers_a_separable_signal(self):
+        rng = np.random.default_rng(50)
+        true_direction = np.array([2.0, -1.0])
+        X = rng.normal(size=(600, 2))
+        # Separable with a margin around the boundary
+        X = X[np.abs(X @ true_direction - 0.25) > 0.5]
+        y = (X @ true_direction > 0.25).astype(float)
+
+        weights = acceptance_model.fit_logistic(X, y, l2=0.1)
+
+        predicted = (weights[0] + X @ weights[1:]) > 0
+        self.assertTrue(np.array_equal(predicted, y.astype(bool)))
+        cosine = weights[1:] @ true_direction / np.linalg.norm(weights[1:]) / np.linalg.norm(true_direction)
+        self.assertGreater(cosine, 0.99)
+        self.assertLess(weights[0], 0)
+
+    def test_pick_coefficients_prefers_own_and_most_specific(self):
+        models = {
+            (False, '', ''): coefficients(1),
+            (True, 'MATHS', ''): coefficients(2),
+            (False, 'MATHS', 'morning'): coefficients(3),
+            (True, 'MATHS', 'morning'): coefficients(4),
+        }
+        pick = acceptance_model.pick_coefficients
+        self.assertEqual(pick(models, 'MATHS', 'morning').intercept, 4)
+        del models[(True, 'MATHS', 'morning')]
+        # A global model for the exact segment beats the school's broader one
+        self.assertEqual(pick(models, 'MATHS', 'morning').intercept, 3)
+        self.assertEqual(pick(models, 'MATHS', 'evening').intercept, 2)
+        self.assertEqual(pick(models, 'PHYSICS', 'morning').intercept, 1)
+        self.assertIsNone(pick({}, 'MATHS', 'morning'))
+
+    def test_replay_counts_rounds_and_emails_until_the_acceptance(self):
+        rows = [
+            acceptance_model.Invitation('r1', 's', 'MATHS', 'morning', f't{rank}', rank == 2, None, None, rank, 0.0)
+            for rank in range(3)
+        ] + [
+            acceptance_model.Invitation('r2', 's', 'MATHS', 'morning', 't0', True, None, None, 0, 0.0),
+            acceptance_model.Invitation('r3', 's', 'MATHS', 'morning', 't0', False, None, None, 0, 0.0),
+        ]
+        result = acceptance_model.replay(rows, lambda row: row.experience_years, lambda school_id: 2)
+        # r1 accepted in the second batch of two; r2 in the first; r3 was never filled
+        self.assertEqual(result, {'filled_requests': 2, 'escalation_rounds': 0.5, 'emails': 2.0})
+
+
+class OnlineUserIdsTests(SimpleTestCase):
+    def test_asks_only_about_the_given_users(self):
+        client = mock.Mock()
+        client.zmscore.return_value = [time.time() + 60, None, time.time() - 1]
+        with mock.patch.object(presence, 'get_client', return_value=client):
+            online = presence.online_user_ids(['a', 'b', 'c'])
+        self.assertEqual(online, {'a'})
+        client.zmscore.assert_called_once_with(presence.USERS_KEY, ['a', 'b', 'c'])
+
+    def test_unknown_when_redis_is_down(self):
+        client = mock.Mock()
+        client.zmscore.side_effect = redis.ConnectionError('down')
+        with mock.patch.object(presence, 'get_client', return_value=client):
+            self.assertIsNone(presence.online_user_ids(['a']))
+
+    @override_settings(PRESENCE_ENABLED=False)
+    def test_unknown_when_disabled(self):
+        self.assertIsNone(presence.online_user_ids(['a']))
+
+
+def stream_entry(seq, content):
+    return (f'{seq}-0'.encode(), {b'message': json.dumps({'type': 'notification', 'content': content}).encode()})
+
+
+@override_settings(PUSH_STREAM_MAXLEN=10)
+class MissedSinceTests(SimpleTestCase):
+    """Reading the gap since a client's last seq from the user's stream"""
+
+    def missed_since(self, last_seq, current, entries):
+        client = mock.MagicMock()
+        client.pipeline.return_value.__enter__.return_value.execute.return_value = [str(current).encode(), entries]
+        with mock.patch.object(push, 'get_client', return_value=client):
+            return push.missed_since('user', last_seq)
+
+    def test_returns_exactly_the_missed_messages(self):
+        current, missed = self.missed_since(3, 5, [stream_entry(4, 'a'), stream_entry(5, 'b')])
+        self.assertEqual(current, 5)
+        self.assertEqual(missed, [
+            {'type': 'notification', 'content': 'a', 'seq': 4},
+            {'type': 'notification', 'content': 'b', 'seq': 5},
+        ])
+
+    def test_nothing_missed(self):
+        self.assertEqual(self.missed_since(5, 5, []), (5, []))
+
+    def test_trimmed_stream_means_resync(self):
+        # Entry 4 was trimmed away; replaying 5 alone would hide the gap
+        self.assertEqual(self.missed_since(3, 5, [stream_entry(5, 'b')]), (5, None))
+
+    def test_gap_longer_than_the_stream_means_resync(self):
+        self.assertEqual(self.missed_since(3, 20, []), (20, None))
+
+    def test_reset_sequence_means_resync(self):
+        self.assertEqual(self.missed_since(9, 2, []), (2, None))
+
+
+@override_settings(PUSH_STREAM_ENABLED=True)
+class NotificationReplayTests(SimpleTestCase):
+    """A socket reconnecting with ?last_seq gets the gap, then live pushes once each"""
+
+    def setUp(self):
+        self.user = SimpleNamespace(id=uuid.uuid4(), email='teacher@example.com')
+        self.sent = []
+        for name in ('connected', 'disconnected'):
+            patcher = mock.patch.object(presence, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def connect(self, query=b''):
+        consumer = NotificationConsumer()
+        consumer.scope = {'type': 'websocket', 'user': self.user, 'query_string': query}
+        consumer.channel_layer = mock.AsyncMock()
+        consumer.channel_name = 'socket'
+        consumer.accept = mock.Mock()
+        consumer.send_json = self.sent.append
+        consumer.connect()
+        consumer.accept.assert_called_once()
+        return consumer
+
+    def live(self, consumer, seq, content):
+        consumer.notification({'type': 'notification', 'content': content, 'seq': seq})
+
+    def test_reconnect_replays_the_gap_and_skips_duplicates(self):
+        missed = [{'type': 'notification', 'content': 'a', 'seq': 4}, {'type': 'notification', 'content': 'b', 'seq': 5}]
+        with mock.patch.object(push, 'missed_since', return_value=(5, missed)) as missed_since:
+            consumer = self.connect(b'last_seq=3')
+        missed_since.assert_called_once_with(self.user.id, 3)
+        self.assertEqual(self.sent, missed + [{'type': 'sync', 'seq': 5, 'replayed': 2}])
+
+        # Pushed during the replay, so delivered live as well: sent once
+        self.sent.clear()
+        self.live(consumer, 5, 'b')
+        self.live(consumer, 6, 'c')
+        self.assertEqual(self.sent, [{'type': 'notification', 'content': 'c', 'seq': 6}])
+
+    def test_trimmed_stream_tells_the_client_to_reload(self):
+        with mock.patch.object(push, 'missed_since', return_value=(250, None)):
+            consumer = self.connect(b'last_seq=3')
+        self.assertEqual(self.sent, [{'type': 'resync', 'seq': 250}])
+        self.live(consumer, 251, 'd')
+        self.assertEqual(self.sent[-1], {'type': 'notification', 'content': 'd', 'seq': 251})
+
+    def test_connect_without_seq_reports_the_current_one(self):
+        with mock.patch.object(push, 'current_seq', return_value=7), \
+                mock.patch.object(push, 'missed_since') as missed_since:
+            consumer = self.connect()
+            # Resuming later on the socket is not accepted
+            consumer.receive_json({'type': 'resume', 'last_seq': 0})
+        self.assertEqual(self.sent, [{'type': 'sync', 'seq': 7}])
+        self.assertFalse(missed_since.called)
+
+
+NOW = datetime(2026, 10, 15, 12, tzinfo=dt_timezone.utc)
+
+
+def flush_deferred_checks():
+    """
+    Runs the foreign key checks deferred to the end of the test's
+    transaction now: Postgres refuses to alter or drop a table with pending
+    trigger events, as partition maintenance does
+    """
+    connection.check_constraints()
+
+
+@override_settings(NOTIFICATION_RETENTION_DAYS=60)
+class NotificationArchiveTests(TestCase):
+    """Archival on any database; runs against the partitioned table on PostgreSQL"""
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.user = User.objects.create_user(
+            username='archive', email='archive@teacher.com', password=None, user_type='EXTERNAL_TEACHER',
+        )
+        partitions.ensure_partitions(now=NOW - timedelta(days=150))
+        partitions.ensure_partitions(now=NOW)
+
+    def notify(self, when, count=1):
+        ids = [
+            Notification.objects.create(user=self.user, content='x', notification_type='SYSTEM').id
+            for _ in range(count)
+        ]
+        Notification.objects.filter(id__in=ids).update(timestamp=when)
+        flush_deferred_checks()
+
+    def archived_rows(self, name):
+        with gzip.open(f'{self.archive_dir}/{name}', 'rt', encoding='utf-8') as archive:
+            return [json.loads(line) for line in archive]
+
+    def test_archives_and_removes_expired_months(self):
+        self.notify(datetime(2026, 6, 10, tzinfo=dt_timezone.utc), count=3)
+        self.notify(datetime(2026, 7, 20, tzinfo=dt_timezone.utc), count=2)
+        self.notify(datetime(2026, 9, 1, tzinfo=dt_timezone.utc))
+
+        archived = partitions.archive_expired_notifications(now=NOW, archive_dir=self.archive_dir)
+
+        self.assertEqual(archived.get('2026-06'), 3)
+        self.assertEqual(archived.get('2026-07'), 2)
+        self.assertEqual(len(self.archived_rows('notifications-2026-06.jsonl.gz')), 3)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_later_rows_for_an_archived_month_get_their_own_file(self):
+        self.notify(datetime(2026, 6, 10, tzinfo=dt_timezone.utc), count=2)
+        partitions.archive_expired_notifications(now=NOW, archive_dir=self.archive_dir)
+        self.notify(datetime(2026, 6, 11, tzinfo=dt_timezone.utc))
+        partitions.archive_expired_notifications(now=NOW, archive_dir=self.archive_dir)
+
+        self.assertEqual(len(self.archived_rows('notifications-2026-06.jsonl.gz')), 2)
+        self.assertEqual(len(self.archived_rows('notifications-2026-06-2.jsonl.gz')), 1)
+
+    def test_keeps_rows_when_the_archive_does_not_read_back(self):
+        self.notify(datetime(2026, 6, 10, tzinfo=dt_timezone.utc), count=3)
+
+        with mock.patch.object(partitions, 'count_archived', return_value=2):
+            with self.assertRaises(partitions.ArchiveMismatch):
+                partitions.archive_expired_notifications(now=NOW, archive_dir=self.archive_dir)
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_requires_an_archive_directory(self):
+        self.notify(datetime(2026, 6, 10, tzinfo=dt_timezone.utc))
+
+        with override_settings(NOTIFICATION_ARCHIVE_DIR=''):
+            with self.assertRaises(ImproperlyConfigured):
+                partitions.archive_expired_notifications(now=NOW)
+        with self.assertRaises(ImproperlyConfigured):
+            partitions.archive_expired_notifications(now=NOW, archive_dir=f'{self.archive_dir}/missing')
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'notifications are only partitioned on PostgreSQL')
+class NotificationPartitionTests(TestCase):
+    """Migration 0008 and the partition maintenance SQL"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='partition', email='partition@teacher.com', password=None, user_type='EXTERNAL_TEACHER',
+        )
+
+    def partition_of(self, notification_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT tableoid::regclass::text FROM {partitions.TABLE} WHERE id = %s', [notification_id]
+            )
+            return cursor.fetchone()[0]
+
+    def test_migration_partitions_the_table_by_month(self):
+        self.assertTrue(partitions.is_partitioned())
+        current = partitions.month_start(datetime.now(dt_timezone.utc))
+        self.assertIn(current, partitions.monthly_partitions())
+
+        notification = Notification.objects.create(user=self.user, content='x', notification_type='SYSTEM')
+        self.assertEqual(self.partition_of(notification.id), partitions.partition_name(current))
+
+    def test_ids_keep_coming_from_one_sequence(self):
+        first = Notification.objects.create(user=self.user, content='x', notification_type='SYSTEM')
+        second = Notification.objects.create(user=self.user, content='y', notification_type='SYSTEM')
+        self.assertGreater(second.id, first.id)
+
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        month = datetime(2040, 1, 1, tzinfo=dt_timezone.utc)
+        notification = Notification.objects.create(user=self.user, content='x', notification_type='SYSTEM')
+        Notification.objects.filter(id=notification.id).update(timestamp=month + timedelta(days=3))
+        flush_deferred_checks()
+        self.assertEqual(self.partition_of(notification.id), partitions.DEFAULT_PARTITION)
+
+        created = partitions.ensure_partitions(ahead=0, now=month)
+
+        self.assertEqual(created, [partitions.partition_name(month)])
+        self.assertEqual(self.partition_of(notification.id), partitions.partition_name(month))
+        self.assertEqual(partitions.ensure_partitions(ahead=0, now=month), [])
+
+    @override_settings(NOTIFICATION_RETENTION_DAYS=60)
+    def test_archival_drops_expired_partitions(self):
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        partitions.ensure_partitions(ahead=0, now=datetime(2026, 6, 1, tzinfo=dt_timezone.utc))
+        notification = Notification.objects.create(user=self.user, content='x', notification_type='SYSTEM')
+        Notification.objects.filter(id=notification.id).update(timestamp=datetime(2026, 6, 10, tzinfo=dt_timezone.utc))
+        flush_deferred_checks()
+
+        archived = partitions.archive_expired_notifications(now=NOW, archive_dir=archive_dir)
+
+        self.assertEqual(archived['2026-06'], 1)
+        self.assertNotIn(datetime(2026, 6, 1, tzinfo=dt_timezone.utc), partitions.monthly_partitions())
+        self.assertFalse(Notification.objects.filter(id=notification.id).exists())
+
+    @override_settings(NOTIFICATION_RETENTION_DAYS=60)
+    def test_mismatched_archive_keeps_the_partition(self):
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        month = datetime(2026, 6, 1, tzinfo=dt_timezone.utc)
+        partitions.ensure_partitions(ahead=0, now=month)
+        notification = Notification.objects.create(user=self.user, content='x', notification_type='SYSTEM')
+        Notification.objects.filter(id=notification.id).update(timestamp=month + timedelta(days=9))
+        flush_deferred_checks()
+
+        with mock.patch.object(partitions, '_check_archived', side_effect=[None, partitions.ArchiveMismatch()]):
+            with self.assertRaises(partitions.ArchiveMismatch):
+                partitions.archive_expired_notifications(now=NOW, archive_dir=archive_dir)
+
+        self.assertIn(month, partitions.monthly_partitions())
+        self.assertTrue(Notification.objects.filter(id=notification.id).exists())
+
+
+class EscalationSweepTests(TestCase):
+    """
+    Due requests are leased to one sweep, escalated without waiting on mail,
+    and only rescheduled while that sweep still holds their lease
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=3, students_per_school=1, availability_days=0,
+        )
+        cls.school = generate_sample_data(scale, seed=41)[0]
+        cls.admin = User.objects.get(username='admin1')
+        cls.teachers = list(User.objects.filter(username__startswith='external').order_by('username'))
+        cls.tomorrow = timezone.now().date() + timedelta(days=1)
+        TeacherProfile.objects.filter(user__in=cls.teachers).update(subjects=['MATHS'])
+        TeacherAvailability.objects.bulk_create([
+            TeacherAvailability(
+                teacher=teacher, date=cls.tomorrow, start_time=clock(8), end_time=clock(12), status='AVAILABLE',
+            )
+            for teacher in cls.teachers
+        ])
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def make_request(self, status='AWAITING_ACCEPTANCE'):
+        return SubstituteRequest.objects.create(
+            school=self.school,
+            requested_by=self.admin,
+            subject='MATHS',
+            grade='10',
+            date=self.tomorrow,
+            start_time=clock(9),
+            end_time=clock(10),
+            description='Escalation request',
+            mode='OFFLINE',
+            status=status,
+            escalate_at=self.now - timedelta(minutes=1),
+        )
+
+    def escalate(self, request):
+        ids = escalation.claim_due_requests(self.now)
+        self.assertEqual(ids, [request.id])
+        with mock.patch.object(tasks, 'push'), \
+                mock.patch.object(tasks, 'send_emergency_email') as smtp, \
+                mock.patch.object(tasks.send_teacher_email, 'apply_async') as queued, \
+                mock.patch.object(tasks, 'enqueue_matching') as enqueue_matching:
+            outcomes = escalation.escalate_requests(ids, self.now)
+        request.refresh_from_db()
+        self.assertFalse(smtp.called)
+        return outcomes, queued, enqueue_matching
+
+    def test_claim_leases_until_the_lease_runs_out(self):
+        request = self.make_request()
+        self.assertEqual(escalation.claim_due_requests(self.now), [request.id])
+        request.refresh_from_db()
+        self.assertEqual(request.escalate_at, self.now + escalation.ESCALATION_LEASE)
+        self.assertEqual(escalation.claim_due_requests(self.now), [])
+        expired = self.now + escalation.ESCALATION_LEASE + timedelta(seconds=1)
+        self.assertEqual(escalation.claim_due_requests(expired), [request.id])
+
+    def test_sends_next_batch_through_the_email_queue(self):
+        request = self.make_request()
+        outcomes, queued, _ = self.escalate(request)
+
+        self.assertEqual(outcomes['escalated'], 1)
+        invitations = RequestInvitation.objects.filter(substitute_request=request)
+        self.assertEqual({invitation.teacher_id for invitation in invitations}, {t.id for t in self.teachers})
+        self.assertEqual(queued.call_count, len(self.teachers))
+        self.assertEqual(request.current_batch, 1)
+        settings = self.school.get_algorithm_settings
+        self.assertEqual(request.escalate_at, self.now + timedelta(minutes=settings.wait_time_minutes))
+
+    def test_exhausted_request_stops_and_tells_staff(self):
+        request = self.make_request()
+        RequestInvitation.objects.bulk_create([
+            RequestInvitation(substitute_request=request, teacher=teacher) for teacher in self.teachers
+        ])
+        outcomes, queued, _ = self.escalate(request)
+
+        self.assertEqual(outcomes['exhausted'], 1)
+        self.assertFalse(queued.called)
+        self.assertIsNone(request.escalate_at)
+        self.assertTrue(Notification.objects.filter(user=self.admin).exists())
+
+    def test_pending_request_is_matched_again(self):
+        request = self.make_request(status='PENDING')
+        outcomes, _, enqueue_matching = self.escalate(request)
+
+        self.assertEqual(outcomes['rematched'], 1)
+        enqueue_matching.assert_called_once_with(request)
+        self.assertEqual(request.status, 'PENDING')
+        # Leased again, so a failed queueing is retried by a later sweep
+        self.assertGreaterEqual(request.escalate_at, self.now + escalation.ESCALATION_LEASE)
+        self.assertEqual(RequestInvitation.objects.filter(substitute_request=request).count(), 0)
+
+    def test_request_reclaimed_by_another_sweep_is_left_alone(self):
+        request = self.make_request()
+        ids = escalation.claim_due_requests(self.now)
+        reclaimed = self.now + timedelta(minutes=7)
+        SubstituteRequest.objects.filter(pk=request.pk).update(escalate_at=reclaimed)
+        with mock.patch.object(tasks, 'push'), mock.patch.object(tasks.send_teacher_email, 'apply_async'):
+            outcomes = escalation.escalate_requests(ids, self.now)
+
+        request.refresh_from_db()
+        self.assertEqual(outcomes['lost'], 1)
+        self.assertEqual(request.escalate_at, reclaimed)
+        self.assertEqual(request.current_batch, 0)
+        self.assertEqual(RequestInvitation.objects.filter(substitute_request=request).count(), 0)
+
+    def test_work_past_the_budget_is_handed_to_the_next_sweep(self):
+        request = self.make_request()
+        ids = escalation.claim_due_requests(self.now)
+        with mock.patch.object(escalation, 'ESCALATION_SWEEP_BUDGET', -1):
+            outcomes = escalation.escalate_requests(ids, self.now)
+
+        request.refresh_from_db()
+        self.assertEqual(outcomes['deferred'], 1)
+        self.assertEqual(request.escalate_at, self.now)
+
+
+def accept_fixture(seed):
+    """A school with three invitable external teachers and a class of students in 10/A"""
+    scale = SampleDataScale(
+        schools=1, teachers_per_school=1, external_teachers=3, students_per_school=4, availability_days=0,
+    )
+    school = generate_sample_data(scale, seed=seed)[0]
+    StudentProfile.objects.filter(school=school).update(grade='10', section='A')
+    teachers = list(User.objects.filter(username__startswith='external').order_by('username'))
+    return school, User.objects.get(username='admin1'), teachers
+
+
+def open_request(school, requested_by, hour=9, group=None):
+    return SubstituteRequest.objects.create(
+        school=school,
+        requested_by=requested_by,
+        group=group,
+        subject='MATHS',
+        grade='10',
+        section='A',
+        date=timezone.now().date() + timedelta(days=1),
+        start_time=clock(hour),
+        end_time=clock(hour + 1),
+        description='Acceptance request',
+        mode='OFFLINE',
+        status='AWAITING_ACCEPTANCE',
+    )
+
+
+def invite(requests, teachers, **fields):
+    return RequestInvitation.objects.bulk_create([
+        RequestInvitation(substitute_request=request, teacher=teacher, **fields)
+        for request in requests for teacher in teachers
+    ])
+
+
+class AcceptInvitationTests(TestCase):
+    """The first pending, unexpired invitation to be accepted wins the request"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school, cls.admin, cls.teachers = accept_fixture(seed=43)
+
+    def statuses(self, request):
+        return dict(RequestInvitation.objects.filter(substitute_request=request).values_list('teacher_id', 'status'))
+
+    def test_first_accept_wins_and_the_next_gets_a_conflict(self):
+        request = open_request(self.school, self.admin)
+        invite([request], self.teachers)
+        path = f'/api/substitute-requests/{request.id}/accept_request/'
+
+        first = jwt_client('external1@teacher.com', 'external123').post(path)
+        second = jwt_client('external2@teacher.com', 'external123').post(path)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 409)
+        request.refresh_from_db()
+        self.assertEqual(request.status, 'ASSIGNED')
+        self.assertEqual(request.assigned_teacher, self.teachers[0])
+        self.assertIsNone(request.escalate_at)
+
+    def test_other_pending_invitations_are_withdrawn(self):
+        request = open_request(self.school, self.admin)
+        invite([request], self.teachers)
+
+        self.assertEqual(acceptance.accept_invitation(request, self.teachers[1]), acceptance.ACCEPTED)
+        self.assertEqual(self.statuses(request), {
+            self.teachers[0].id: 'WITHDRAWN',
+            self.teachers[1].id: 'ACCEPTED',
+            self.teachers[2].id: 'WITHDRAWN',
+        })
+        self.assertEqual(acceptance.accept_invitation(request, self.teachers[0]), acceptance.ALREADY_TAKEN)
+
+    def test_creates_exactly_one_session_with_the_class(self):
+        request = open_request(self.school, self.admin)
+        invite([request], self.teachers)
+
+        acceptance.accept_invitation(request, self.teachers[0])
+        acceptance.accept_invitation(request, self.teachers[1])
+
+        session = TeachingSession.objects.get(substitute_request=request)
+        self.assertEqual(session.teacher, self.teachers[0])
+        self.assertEqual(session.students.count(), 4)
+
+    def test_expired_invitation_is_rejected(self):
+        request = open_request(self.school, self.admin)
+        invite([request], self.teachers[:1], expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(acceptance.accept_invitation(request, self.teachers[0]), acceptance.NOT_INVITED)
+        request.refresh_from_db()
+        self.assertEqual(request.status, 'AWAITING_ACCEPTANCE')
+        self.assertFalse(TeachingSession.objects.filter(substitute_request=request).exists())
+
+    def test_uninvited_teacher_is_rejected(self):
+        request = open_request(self.school, self.admin)
+        invite([request], self.teachers[:1])
+
+        response = jwt_client('external2@teacher.com', 'external123').post(
+            f'/api/substitute-requests/{request.id}/accept_request/'
+        )
+        self.assertEqual(response.status_code, 400)
+        request.refresh_from_db()
+        self.assertIsNone(request.assigned_teacher)
+        self.assertEqual(self.statuses(request), {self.teachers[0].id: 'PENDING'})
+
+    def test_accepting_one_period_claims_the_invited_group(self):
+        group = RequestGroup.objects.create(school=self.school, requested_by=self.admin, date=timezone.now().date())
+        periods = [open_request(self.school, self.admin, hour=hour, group=group) for hour in (9, 10, 11)]
+        # The last period went to another teacher only
+        invite(periods[:2], self.teachers[:2])
+        invite(periods[2:], self.teachers[2:])
+
+        self.assertEqual(acceptance.accept_invitation(periods[1], self.teachers[0]), acceptance.ACCEPTED)
+
+        for period in periods[:2]:
+            period.refresh_from_db()
+            self.assertEqual((period.status, period.assigned_teacher), ('ASSIGNED', self.teachers[0]))
+            self.assertEqual(self.statuses(period), {self.teachers[0].id: 'ACCEPTED', self.teachers[1].id: 'WITHDRAWN'})
+        self.assertEqual(TeachingSession.objects.filter(substitute_request__group=group).count(), 2)
+        periods[2].refresh_from_db()
+        self.assertEqual(periods[2].status, 'AWAITING_ACCEPTANCE')
+        self.assertEqual(self.statuses(periods[2]), {self.teachers[2].id: 'PENDING'})
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'SQLite serializes every write')
+class ConcurrentAcceptTests(TransactionTestCase):
+    """Teachers accepting in parallel transactions: the row lock lets one win"""
+
+    def setUp(self):
+        self.school, self.admin, self.teachers = accept_fixture(seed=43)
+
+    def test_one_of_the_concurrent_accepts_wins(self):
+        request = open_request(self.school, self.admin)
+        invite([request], self.teachers)
+        barrier = threading.Barrier(len(self.teachers))
+        outcomes = []
+
+        def accept(teacher):
+            try:
+                substitute_request = SubstituteRequest.objects.get(pk=request.pk)
+                barrier.wait()
+                outcomes.append(acceptance.accept_invitation(substitute_request, teacher))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=(teacher,)) for teacher in self.teachers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), sorted([acceptance.ACCEPTED] + [acceptance.ALREADY_TAKEN] * 2))
+        self.assertEqual(TeachingSession.objects.filter(substitute_request=request).count(), 1)
+        self.assertEqual(RequestInvitation.objects.filter(substitute_request=request, status='ACCEPTED').count(), 1)
+
+
+class RequestGroupCreateTests(TestCase):
+    """POST /api/substitute-requests/groups/ files every period at once and queues one matching task"""
+    path = '/api/substitute-requests/groups/'
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=1, students_per_school=1, availability_days=0,
+        )
+        generate_sample_data(scale, seed=49)
+
+    def setUp(self):
+        self.client = jwt_client('admin1@school.edu', 'admin123')
+
+    def payload(self, *periods):
+        return {
+            'subject': 'MATHS',
+            'grade': '10',
+            'date': str(timezone.now().date() + timedelta(days=1)),
+            'mode': 'OFFLINE',
+            'description': 'Whole-day absence',
+            'periods': list(periods),
+        }
+
+    def test_creates_a_request_per_period(self):
+        payload = self.payload(
+            {'start_time': '09:00', 'end_time': '10:00'},
+            {'start_time': '10:00', 'end_time': '11:00', 'subject': 'PHYSICS'},
+            {'start_time': '12:00', 'end_time': '13:00'},
+        )
+        with mock.patch.object(tasks, 'enqueue_matching') as enqueue_matching, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.path, payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        group = RequestGroup.objects.get(pk=response.data['id'])
+        requests = list(group.requests.order_by('start_time'))
+        self.assertEqual([request.subject for request in requests], ['MATHS', 'PHYSICS', 'MATHS'])
+        self.assertTrue(all(request.status == 'PENDING' and request.grade == '10' for request in requests))
+        enqueue_matching.assert_called_once()
+
+    def test_rejects_overlapping_periods(self):
+        payload = self.payload(
+            {'start_time': '09:00', 'end_time': '10:30'},
+            {'start_time': '10:00', 'end_time': '11:00'},
+        )
+        response = self.client.post(self.path, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('periods', response.data)
+        self.assertFalse(RequestGroup.objects.exists())
+
+    def test_subject_required_unless_every_period_gives_it(self):
+        payload = self.payload({'start_time': '09:00', 'end_time': '10:00'})
+        del payload['subject']
+        response = self.client.post(self.path, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('subject', response.data)
+
+
+class TrainAcceptanceModelsTests(TestCase):
+    """Models are kept only when the holdout replay shows the learned order is better"""
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=4, students_per_school=1, availability_days=0,
+        )
+        cls.school = generate_sample_data(scale, seed=50)[0]
+        teachers = list(User.objects.filter(username__startswith='external').order_by('username'))
+        invited_at = timezone.now() - timedelta(days=1)
+        cls.history = [
+            acceptance_model.Invitation(
+                request, cls.school.id, 'MATHS', 'morning', teacher.id, (request + rank) % 3 == 0,
+                invited_at, 4.0 if (request + rank) % 3 == 0 else None, rank, 3.5 + rank / 4,
+            )
+            for request in range(10) for rank, teacher in enumerate(teachers)
+        ]
+
+    def setUp(self):
+        AcceptanceModel.objects.create(coefficients={'intercept': 0.0}, prior_rate=0.5, response_minutes=5.0)
+
+    def train(self, learned_rounds):
+        evaluation = {
+            'weighted': {'filled_requests': 2, 'escalation_rounds': 1.0, 'emails': 8.0},
+            'learned': {'filled_requests': 2, 'escalation_rounds': learned_rounds, 'emails': 8.0 * learned_rounds},
+        }
+        with mock.patch.object(acceptance_model, 'load_history', return_value=self.history), \
+                mock.patch.object(acceptance_model, 'evaluate', return_value=evaluation), \
+                self.captureOnCommitCallbacks(execute=True):
+            return acceptance_model.train_acceptance_models(min_samples=10)
+
+    def test_models_removed_without_an_improvement(self):
+        report = self.train(learned_rounds=1.0)
+
+        self.assertFalse(report['improved'])
+        self.assertEqual(report['models'], 0)
+        self.assertFalse(AcceptanceModel.objects.exists())
+        self.assertIsNone(acceptance_model.coefficients_for(self.school.id, 'MATHS', clock(9)))
+
+    def test_models_saved_with_an_improvement(self):
+        report = self.train(learned_rounds=0.5)
+
+        self.assertTrue(report['improved'])
+        self.assertGreater(report['models'], 0)
+        self.assertEqual(AcceptanceModel.objects.count(), report['models'])
+        self.assertTrue(AcceptanceModel.objects.filter(school=self.school, subject='MATHS', daypart='morning').exists())
+        self.assertEqual(TeacherAcceptanceStats.objects.count(), 4)
+        self.assertIsNotNone(acceptance_model.coefficients_for(self.school.id, 'MATHS', clock(9)))
+
+
+class NotificationInboxTests(TestCase):
+    """Cached unread counters track the rows; keyset pages cover the inbox exactly once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=1, students_per_school=1, availability_days=0,
+        )
+        generate_sample_data(scale, seed=44)
+        cls.user = User.objects.get(username='external1')
+
+    def setUp(self):
+        cache.delete(notifications.unread_count_key(self.user.id))
+        self.client = jwt_client('external1@teacher.com', 'external123')
+
+    def create(self, count):
+        return notifications.create_notifications([
+            Notification(user=self.user, content=f'Notification {i}', notification_type='SYSTEM') for i in range(count)
+        ])
+
+    def assert_unread(self, expected):
+        self.assertEqual(Notification.objects.filter(user=self.user, is_read=False).count(), expected)
+        self.assertEqual(cache.get(notifications.unread_count_key(self.user.id)), expected)
+        self.assertEqual(notifications.unread_count(self.user.id), expected)
+
+    def test_counter_follows_creates_and_reads(self):
+        self.assertEqual(notifications.unread_count(self.user.id), 0)
+        created = self.create(5)
+        self.assert_unread(5)
+
+        self.assertEqual(notifications.mark_read(self.user.id, [created[0].id, created[1].id]), 2)
+        self.assert_unread(3)
+        # Already read: nothing changes
+        self.assertEqual(notifications.mark_read(self.user.id, [created[0].id]), 0)
+        self.assert_unread(3)
+
+        response = self.client.post('/api/notifications/read/', {}, format='json')
+        self.assertEqual((response.data['marked'], response.data['unread_count']), (3, 0))
+        self.assert_unread(0)
+
+        self.create(2)
+        self.assert_unread(2)
+        self.client.post(f'/api/notifications/{created[4].id}/read/')
+        self.assert_unread(2)
+
+    def test_missing_counter_is_rebuilt_from_rows(self):
+        created = self.create(4)
+        notifications.mark_read(self.user.id, [created[0].id])
+        cache.delete(notifications.unread_count_key(self.user.id))
+        self.assertEqual(notifications.unread_count(self.user.id), 3)
+        self.assert_unread(3)
+
+    def test_pages_with_equal_timestamps_neither_skip_nor_repeat(self):
+        created = self.create(7)
+        same = timezone.now() - timedelta(hours=1)
+        Notification.objects.filter(id__in=[n.id for n in created[:5]]).update(timestamp=same)
+        Notification.objects.filter(id=created[5].id).update(timestamp=same - timedelta(minutes=1))
+        expected = list(Notification.objects.filter(user=self.user).order_by('-timestamp', '-id').values_list('id', flat=True))
+
+        seen = []
+        url = '/api/notifications/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+        self.assertEqual(response.data['unread_count'], 7)
+
+
+class ExpireOverdueInvitationsTests(TestCase):
+    """Overdue invitations expire in one statement and notify each teacher once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=2, students_per_school=1, availability_days=1,
+        )
+        school = generate_sample_data(scale, seed=42)[0]
+        cls.teachers = list(User.objects.filter(username__in=['external1', 'external2']).order_by('username'))
+        cls.request = SubstituteRequest.objects.create(
+            school=school,
+            requested_by=User.objects.get(username='admin1'),
+            subject='MATHS',
+            grade='10',
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=clock(9),
+            end_time=clock(10),
+            description='Expiry request',
+            mode='OFFLINE',
+            status='AWAITING_ACCEPTANCE',
+        )
+        past = timezone.now() - timedelta(minutes=1)
+        RequestInvitation.objects.bulk_create([
+            RequestInvitation(substitute_request=cls.request, teacher=cls.teachers[0], expires_at=past),
+            RequestInvitation(substitute_request=cls.request, teacher=cls.teachers[1]),
+        ])
+
+    def test_returns_typed_ids_and_pushes_to_user_groups(self):
+        with mock.patch.object(expiry, 'push') as push:
+            expired = expiry.expire_overdue_invitations()
+
+        invitation = RequestInvitation.objects.get(teacher=self.teachers[0])
+        self.assertEqual(expired, [(invitation.id, self.request.id, self.teachers[0].id)])
+        self.assertEqual(invitation.status, 'EXPIRED')
+        self.assertEqual(RequestInvitation.objects.get(teacher=self.teachers[1]).status, 'PENDING')
+        push.assert_called_once()
+        self.assertEqual(push.call_args.args[0], [self.teachers[0].id])
+
+
+class SubstituteRequestQueryBudgetTests(TestCase):
+    """
+    The request endpoints run a fixed number of queries however many rows
+    they return; an N+1 regression fails here. Authentication reads the
+    token's claims, so no budget includes a user lookup.
+    """
+    REQUESTS = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=2, students_per_school=6, availability_days=1,
+        )
+        cls.school = generate_sample_data(scale, seed=35)[0]
+        cls.admin = User.objects.get(username='admin1')
+        invited = User.objects.filter(username__in=['external1', 'external2'])
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        cls.requests = [
+            SubstituteRequest.objects.create(
+                school=cls.school,
+                requested_by=cls.admin,
+                subject='MATHS',
+                grade='10',
+                date=tomorrow,
+                start_time=clock(9 + i),
+                end_time=clock(10 + i),
+                description='Query budget request',
+                mode='OFFLINE',
+                status='AWAITING_ACCEPTANCE',
+            )
+            for i in range(cls.REQUESTS)
+        ]
+        RequestInvitation.objects.bulk_create([
+            RequestInvitation(substitute_request=request, teacher=teacher)
+            for request in cls.requests for teacher in invited
+        ])
+
+    def setUp(self):
+        self.admin_client = jwt_client('admin1@school.edu', 'admin123')
+        self.teacher_client = jwt_client('external1@teacher.com', 'external123')
+
+    def test_list(self):
+        response = assert_endpoint_queries(self.admin_client, '/api/substitute-requests/', 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), self.REQUESTS)
+
+    def test_retrieve(self):
+        path = f'/api/substitute-requests/{self.requests[0].id}/'
+        response = assert_endpoint_queries(self.admin_client, path, 3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['invitations']), 2)
+
+    def test_requests_to_me(self):
+        response = assert_endpoint_queries(self.teacher_client, '/api/substitute-requests/requests_to_me/', 3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), self.REQUESTS)
@@ -3,7 +3,9 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     SubstituteRequestViewSet,
     get_notifications,
+    get_unread_count,
     mark_notification_read,
+    mark_notifications_read,
     clear_notifications,
     get_form_options
 )
@@ -14,7 +16,9 @@ router.register(r'substitute-requests', SubstituteRequestViewSet, basename='subs
 urlpatterns = [
     path('', include(router.urls)),
     path('notifications/', get_notifications, name='get-notifications'),
-    path('notifications/<str:pk>/read/', mark_notification_read, name='mark-notification-read'),
+    path('notifications/unread-count/', get_unread_count, name='notifications-unread-count'),
+    path('notifications/read/', mark_notifications_read, name='mark-notifications-read'),
+    path('notifications/<int:pk>/read/', mark_notification_read, name='mark-notification-read'),
     path('notifications/clear/', clear_notifications, name='clear-notifications'),
     path('substitute-form-options/', get_form_options, name='get-form-options'),
 ]
\ No newline at end of file
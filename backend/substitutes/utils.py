@@ -4,6 +4,8 @@ import jwt  # Install using: pip install pyjwt
 import os
 from decouple import config
 
+from accounts.instrumentation import external_call
+
 
 
 def token_generator_jiomeet():
@@ -21,6 +23,7 @@ def token_generator_jiomeet():
     return token
 
 
+@external_call('jiomeet')
 def create_jiomeet_meeting(name, title, description):
     url = "https://jiomeetpro.jio.com/api/platform/v1/room"
     
@@ -4,12 +4,11 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status, viewsets
+from django.db import transaction
 from django.utils import timezone
-import datetime
 from .models import SubstituteRequest, RequestInvitation
 # from .tasks import send_assignment_notifications
-from .serializers import SubstituteRequestSerializer, SubstituteRequestDetailSerializer, TeacherInvitationSerializer, SubstituteRequestCreateSerializer
-from teaching_sessions.models import TeachingSession
+from .serializers import SubstituteRequestSerializer, SubstituteRequestDetailSerializer, TeacherInvitationSerializer, SubstituteRequestCreateSerializer, RequestGroupCreateSerializer
 from django.shortcuts import get_object_or_404
 
 from rest_framework.decorators import api_view, permission_classes
@@ -21,67 +20,120 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Notification
+from rest_framework.pagination import CursorPagination
 from .serializers import NotificationSerializer
+from . import notifications as notifications_service
+from accounts.caching import conditional_response, make_etag
+from accounts.permissions import IsProfileVerified
+from accounts.utils import get_request_school_id
+from accounts.instrumentation import InstrumentedViewMixin
+from accounts.query_plans import QueryPlanMixin
+from .query_plans import SUBSTITUTE_REQUEST_QUERY_PLANS
+
+class NotificationPagination(CursorPagination):
+    """Keyset pages over the (user, -timestamp, -id) index, newest first"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-timestamp', '-id')
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_notifications(request):
-    """Get user notifications"""
-    notifications = Notification.objects.filter(user=request.user)
-    serializer = NotificationSerializer(notifications, many=True)
-    return Response(serializer.data)
+    """
+    Get user notifications, newest first, a page at a time; follow `next`
+    for older ones. ?unread=true lists only unread notifications.
+    """
+    notifications = notifications_service.inbox(request.user.id)
+    if request.query_params.get('unread') in ('1', 'true'):
+        notifications = notifications.filter(is_read=False)
+    paginator = NotificationPagination()
+    page = paginator.paginate_queryset(notifications, request)
+    response = paginator.get_paginated_response(NotificationSerializer(page, many=True).data)
+    response.data['unread_count'] = notifications_service.unread_count(request.user.id)
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_unread_count(request):
+    """Number of unread notifications, for the badge"""
+    return Response({"unread_count": notifications_service.unread_count(request.user.id)})
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_notification_read(request, pk):
     """Mark notification as read"""
-    try:
-        notification = Notification.objects.get(id=pk, user=request.user)
-        notification.read = True
-        notification.save()
-        return Response({"status": "success"})
-    except Notification.DoesNotExist:
+    if not notifications_service.mark_read(request.user.id, [pk]) and \
+            not notifications_service.inbox(request.user.id).filter(id=pk).exists():
         return Response({"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"status": "success"})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_notifications_read(request):
+    """
+    Mark notifications as read: the ids given as {"ids": [...]}, or all of
+    them when no ids are sent
+    """
+    ids = request.data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return Response({"error": "ids must be a list of notification ids"},
+                            status=status.HTTP_400_BAD_REQUEST)
+    marked = notifications_service.mark_read(request.user.id, ids)
+    return Response({
+        "status": "success",
+        "marked": marked,
+        "unread_count": notifications_service.unread_count(request.user.id),
+    })
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def clear_notifications(request):
     """Clear all notifications"""
-    Notification.objects.filter(user=request.user).delete()
+    notifications_service.clear(request.user.id)
     return Response({"status": "success"})
 
+# The form options only depend on model choice tuples, so build them once
+FORM_OPTIONS = {
+    'subjects': dict(SubstituteRequest.SUBJECTS),
+    'grades': dict(SubstituteRequest.GRADE_CHOICES),
+    'sections': dict(SubstituteRequest.SECTION),
+    'priorities': dict(SubstituteRequest.PRIORITY_CHOICES),
+    'modes': dict(SubstituteRequest.MODE_CHOICES),
+}
+FORM_OPTIONS_ETAG = make_etag(FORM_OPTIONS)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_form_options(request):
     """Return all options needed for the substitute request form"""
-    from .models import SubstituteRequest
-    
-    return Response({
-        'subjects': dict(SubstituteRequest.SUBJECTS),
-        'grades': dict(SubstituteRequest.GRADE_CHOICES),
-        'sections': dict(SubstituteRequest.SECTION),
-        'priorities': dict(SubstituteRequest.PRIORITY_CHOICES),
-        'modes': dict(SubstituteRequest.MODE_CHOICES),
-    })
+    return conditional_response(
+        request, FORM_OPTIONS, FORM_OPTIONS_ETAG,
+        cache_control='private, max-age=86400'
+    )
 
-@permission_classes([IsAuthenticated])
-class SubstituteRequestViewSet(viewsets.ModelViewSet):
+@permission_classes([IsAuthenticated, IsProfileVerified])
+class SubstituteRequestViewSet(InstrumentedViewMixin, QueryPlanMixin, viewsets.ModelViewSet):
     """
     ViewSet for Substitute Requests
     """
     
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsProfileVerified]
+    query_plans = SUBSTITUTE_REQUEST_QUERY_PLANS
     
     def get_serializer_class(self):
         if self.action == 'create':
             return SubstituteRequestCreateSerializer
+        elif self.action == 'create_group':
+            return RequestGroupCreateSerializer
         elif self.action in ['retrieve', 'update', 'partial_update', 'invitation_history', 'requests_to_me']:
             return SubstituteRequestDetailSerializer
         return SubstituteRequestSerializer
     
     
-    def get_queryset(self):
+    def get_base_queryset(self):
         user = self.request.user
         
         # Return nothing for unauthenticated users
@@ -90,27 +142,27 @@ class SubstituteRequestViewSet(viewsets.ModelViewSet):
         
         # School admins and principals see all requests for their school
         if user.user_type in ['SCHOOL_ADMIN', 'PRINCIPAL']:
-            try:
-                return SubstituteRequest.objects.filter(school=user.school)
-            except AttributeError:
+            school_id = get_request_school_id(self.request)
+            if not school_id:
                 return SubstituteRequest.objects.none()
+            return SubstituteRequest.objects.filter(school_id=school_id)
         
         # For teachers, combine multiple conditions with OR
         elif user.user_type in ['EXTERNAL_TEACHER', 'INTERNAL_TEACHER']:
             from django.db.models import Q
             return SubstituteRequest.objects.filter(
                 # Creator OR assigned
-                Q(requested_by=user) | 
-                Q(assigned_teacher=user)
+                Q(requested_by_id=user.id) | 
+                Q(assigned_teacher_id=user.id)
             ).distinct()
         
         # Default case
         return SubstituteRequest.objects.none()
     
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsProfileVerified])
     def my_requests(self, request):
         """Returns requests created by the current user"""
-        queryset = SubstituteRequest.objects.filter(requested_by=request.user)
+        queryset = SubstituteRequest.objects.filter(requested_by_id=request.user.id)
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
@@ -119,10 +171,10 @@ class SubstituteRequestViewSet(viewsets.ModelViewSet):
         """Returns requests where the current user was invited"""
         user = request.user
         
-        # Prefetch related invitations and teacher details to improve performance
-        queryset = SubstituteRequest.objects.filter(
-            invitations__teacher=user
-        ).prefetch_related('invitations', 'invitations__teacher').distinct()
+        # Invitations with teacher profiles come from the 'requests_to_me' query plan
+        queryset = self.plan_queryset(SubstituteRequest.objects.filter(
+            invitations__teacher_id=user.id
+        ).distinct())
         
         # Optional: Allow filtering by status
         status_param = request.query_params.get('status', None)
@@ -142,78 +194,67 @@ class SubstituteRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        try:
-            queryset = SubstituteRequest.objects.filter(school=user.school_staff.school)
-            
-            # Optional: Allow filtering by status
-            req_status = request.query_params.get('status', None)
-            if req_status:
-                queryset = queryset.filter(status=req_status)
-                
-            # Optional: Allow filtering by date range
-            start_date = request.query_params.get('start_date', None)
-            end_date = request.query_params.get('end_date', None)
-            if start_date and end_date:
-                queryset = queryset.filter(date__range=[start_date, end_date])
-                
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
-        except AttributeError:
+        school_id = get_request_school_id(request)
+        if not school_id:
             return Response(
                 {"detail": "School information not found."},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        queryset = SubstituteRequest.objects.filter(school_id=school_id)
+
+
+        # Optional: Allow filtering by status
+        req_status = request.query_params.get('status', None)
+        if req_status:
+            queryset = queryset.filter(status=req_status)
+            
+        # Optional: Allow filtering by date range
+        start_date = request.query_params.get('start_date', None)
+        end_date = request.query_params.get('end_date', None)
+        if start_date and end_date:
+            queryset = queryset.filter(date__range=[start_date, end_date])
+            
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
     
     def create(self, request, *args, **kwargs):
         """
-        Create a new substitute request and directly match teachers
+        Create a new substitute request and queue teacher matching. Matching
+        runs on the Celery 'matching' queue once the request is committed, so
+        this returns as soon as the request is saved.
         """
         
         serializer = SubstituteRequestCreateSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         substitute_request = serializer.save()
         
-        # Direct matching instead of using Celery
-        try:
-            # Get school algorithm settings
-            settings = substitute_request.school.get_algorithm_settings
-            if not isinstance(settings, dict):
-                settings = {
-                    'batch_size': 10, 
-                    'wait_time_minutes': 10,
-                    'weights': {'experience': 1, 'rating': 1, 'distance': 1}
-                }
-            
-            # Get available teachers
-            from .tasks import get_ranked_teachers
-            ranked_teachers = get_ranked_teachers(substitute_request, settings)
-            
-            # Log matching results for debugging
-            print(f"Found {ranked_teachers.count()} matching teachers for request {substitute_request.id}")
-            
-            # Process first batch of teachers
-            from .tasks import process_teacher_batch
-            if ranked_teachers.exists():
-                process_teacher_batch(substitute_request, ranked_teachers[:settings['batch_size']], 1)
-                substitute_request.status = 'AWAITING_ACCEPTANCE'
-                substitute_request.save(update_fields=['status'])
-                
-            return Response({
-                **serializer.data,
-                'matching_teachers_count': ranked_teachers.count(),
-                'detail': 'Request created and teachers matched successfully'
-            }, status=status.HTTP_201_CREATED)
-        except Exception as e:
-            # Log error but don't fail the request creation
-            print(f"Error in teacher matching: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            
-            return Response({
-                **serializer.data,
-                'matching_error': str(e),
-                'detail': 'Request created but teacher matching failed'
-            }, status=status.HTTP_201_CREATED)
+        from .tasks import enqueue_matching
+        transaction.on_commit(lambda: enqueue_matching(substitute_request))
+        
+        return Response({
+            **serializer.data,
+            'detail': 'Request created; matching teachers'
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], url_path='groups', permission_classes=[IsAuthenticated, IsProfileVerified])
+    def create_group(self, request):
+        """
+        Create one request per period of an absence in a single INSERT. The
+        periods are matched together as a block, so one matching task covers
+        them all.
+        """
+        serializer = RequestGroupCreateSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        group = serializer.save()
+
+        from .tasks import enqueue_matching
+        transaction.on_commit(lambda: enqueue_matching(group.requests.first()))
+
+        return Response({
+            **serializer.data,
+            'detail': 'Requests created; matching teachers'
+        }, status=status.HTTP_201_CREATED)
     
     def update(self, request, *args, **kwargs):
         """
@@ -256,73 +297,30 @@ class SubstituteRequestViewSet(viewsets.ModelViewSet):
         serializer = SubstituteRequestSerializer(queryset, many=True)
         return Response(serializer.data)
     
-    @action(detail=True, methods=['post'], url_path='accept_request', url_name='accept_request', permission_classes=[IsAuthenticated])
+    @action(detail=True, methods=['post'], url_path='accept_request', url_name='accept_request', permission_classes=[IsAuthenticated, IsProfileVerified])
     def accept_request(self, request, pk=None):
         """
-        Teacher accepts a substitute request.
+        Teacher accepts a substitute request. The first teacher to accept
+        is assigned; anyone accepting after that gets a 409.
         """
-        print("Accepting request")
-        print(f"accept_request called with pk={pk}, user={request.user}")
-        teacher = request.user
-        substitute_request = get_object_or_404(SubstituteRequest, pk=pk)
-        print(f"Substitute request: {substitute_request}")
-        try:
-            invitation = RequestInvitation.objects.get(
-                substitute_request=substitute_request,
-                teacher=teacher,
-                status='PENDING'
-            )
-            invitation.status = 'ACCEPTED'
-            invitation.responded_at = timezone.now()
-            invitation.save()
-            
-            substitute_request.assigned_teacher = teacher
-            substitute_request.status = 'ASSIGNED'
-            substitute_request.save()
-            
-            # --- FIX HERE: Combine date/time and make timezone-aware ---
-            request_date = substitute_request.date
-            start_datetime_naive = datetime.datetime.combine(request_date, substitute_request.start_time)
-            end_datetime_naive = datetime.datetime.combine(request_date, substitute_request.end_time)
+        from .acceptance import ACCEPTED, ALREADY_TAKEN, accept_invitation
 
-            # Make them timezone-aware using Django's current timezone
-            start_datetime_aware = timezone.make_aware(start_datetime_naive)
-            end_datetime_aware = timezone.make_aware(end_datetime_naive)
+        substitute_request = get_object_or_404(SubstituteRequest, pk=pk)
+        outcome = accept_invitation(substitute_request, request.user)
 
-            # Create TeachingSession using get_or_create to prevent duplicates
-            session, created = TeachingSession.objects.get_or_create(
-                substitute_request=substitute_request,
-                defaults={
-                    'teacher': teacher,
-                    'start_time': start_datetime_aware, # Use the aware datetime
-                    'end_time': end_datetime_aware,   # Use the aware datetime
-                    'status': 'SCHEDULED',
-                    'mode': substitute_request.mode # Copy mode from request
-                }
-            )
-            if created:
-                print(f"--- Created TeachingSession {session.id} ---")
-            else:
-                print(f"--- Found existing TeachingSession {session.id} ---")
-            # --- End Fix ---
-            
-            # Withdraw other pending invitations
-            RequestInvitation.objects.filter(
-                substitute_request=substitute_request,
-                status='PENDING'
-            ).exclude(id=invitation.id).update(status='WITHDRAWN', responded_at=timezone.now())
-            
-            # Send assignment notification
-            # send_assignment_notifications.delay(substitute_request.id)
-            
+        if outcome == ACCEPTED:
             return Response({"detail": "Request accepted successfully"})
-        except RequestInvitation.DoesNotExist:
+        if outcome == ALREADY_TAKEN:
             return Response(
-                {"detail": "No pending invitation found for this request"},
-                status=status.HTTP_400_BAD_REQUEST
+                {"detail": "This request has already been accepted by another teacher"},
+                status=status.HTTP_409_CONFLICT
             )
+        return Response(
+            {"detail": "No pending invitation found for this request, or it has expired"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsProfileVerified])
     def decline_request(self, request, pk=None):
         """Decline a substitute request invitation"""
         substitute_request = get_object_or_404(SubstituteRequest, pk=pk)
@@ -348,7 +346,7 @@ class SubstituteRequestViewSet(viewsets.ModelViewSet):
         """
         Get detailed invitation history for a substitute request
         """
-        instance = get_object_or_404(SubstituteRequest, pk=pk)
+        instance = get_object_or_404(self.plan_queryset(SubstituteRequest.objects.all()), pk=pk)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
@@ -358,7 +356,9 @@ class SubstituteRequestViewSet(viewsets.ModelViewSet):
         Get detailed teacher profile from invitation
         """
         try:
-            invitation = RequestInvitation.objects.get(
+            invitation = RequestInvitation.objects.select_related(
+                'teacher__teacher_profile'
+            ).get(
                 substitute_request_id=pk,
                 teacher_id=teacher_id
             )
@@ -0,0 +1,38 @@
+"""Query plans for the teaching session ViewSets (see accounts.query_plans)"""
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+
+from accounts.query_plans import QueryPlan
+
+User = get_user_model()
+
+# Many-to-many fields are serialized as primary keys only
+STUDENT_IDS = Prefetch('students', queryset=User.objects.only('id'))
+ATTENDANCE_IDS = Prefetch('sessionreport__attendance', queryset=User.objects.only('id'))
+
+# TeachingSessionSerializer, including the nested recording and report
+TEACHING_SESSION = QueryPlan(
+    select_related=(
+        'substitute_request__school',
+        'teacher',
+        'sessionrecording',
+        'sessionreport',
+    ),
+    prefetch_related=(STUDENT_IDS, ATTENDANCE_IDS),
+)
+
+TEACHING_SESSION_QUERY_PLANS = {
+    'default': TEACHING_SESSION,
+}
+
+# SessionRecordingSerializer.get_session_details walks these per row
+SESSION_RECORDING = QueryPlan(
+    select_related=(
+        'session__substitute_request__school',
+        'session__teacher',
+    ),
+)
+
+SESSION_RECORDING_QUERY_PLANS = {
+    'default': SESSION_RECORDING,
+}
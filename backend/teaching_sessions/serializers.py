@@ -41,7 +41,7 @@ class SessionRecordingSerializer(serializers.ModelSerializer):
             'date': request.date,
             'start_time': request.start_time,
             'end_time': request.end_time,
-            'school_name': request.school.name if request.school else None,
+            'school_name': request.school.school_name if request.school else None,
             'teacher_name': f"{session.teacher.first_name} {session.teacher.last_name}".strip() if session.teacher else None,
         }
 
@@ -50,11 +50,14 @@ class SessionReportSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = SessionReport
-        fields = ['attendance', 'performance_notes', 'created_at']
+        fields = [
+            'attendance', 'attendance_count', 'attendance_percentage',
+            'summary', 'teacher_remarks', 'created_at'
+        ]
 
 class TeachingSessionSerializer(serializers.ModelSerializer):
-    recording = SessionRecordingSerializer(read_only=True)
-    report = SessionReportSerializer(read_only=True)
+    recording = SessionRecordingSerializer(source='sessionrecording', read_only=True)
+    report = SessionReportSerializer(source='sessionreport', read_only=True)
 
     class Meta:
         model = TeachingSession
@@ -2,7 +2,8 @@
 
 from celery import shared_task
 from django.utils import timezone
-from .models import TeachingSession
+from .models import TeachingSession, SessionRecording
+from .utils import fetch_recording_url
 
 @shared_task
 def check_session_status():
@@ -22,4 +23,16 @@ def check_session_status():
     )
     for session in sessions_to_end:
         session.status = 'COMPLETED'
-        session.save()
\ No newline at end of file
+        session.save()
+
+@shared_task
+def sync_recordings():
+    """Fetch the URLs of finished sessions' recordings from JioMeet"""
+    pending = SessionRecording.objects.filter(
+        status='STARTED',
+        recording_url__isnull=True,
+        history_id__isnull=False,
+        session__status='COMPLETED',
+    ).select_related('session')
+    for recording in pending:
+        fetch_recording_url(recording.session)
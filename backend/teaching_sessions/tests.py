@@ -1,3 +1,79 @@
+from datetime import time, timedelta
+
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import StudentProfile, User
+from accounts.sample_data import SampleDataScale, generate_sample_data
+from accounts.testing import assert_endpoint_queries, jwt_client
+from substitutes.models import SubstituteRequest
+from .models import SessionRecording, TeachingSession
+
+
+class SessionQueryBudgetTests(TestCase):
+    """
+    The session and recording endpoints run a fixed number of queries however
+    many rows they return, students included; an N+1 regression fails here.
+    """
+    SESSIONS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        scale = SampleDataScale(
+            schools=1, teachers_per_school=1, external_teachers=1, students_per_school=12, availability_days=1,
+        )
+        school = generate_sample_data(scale, seed=35)[0]
+        admin = User.objects.get(username='admin1')
+        teacher = User.objects.get(username='external1')
+        tomorrow = timezone.now().date() + timedelta(days=1)
+        # Every session gets students, so their prefetch is exercised
+        StudentProfile.objects.filter(school=school).update(grade='10', section='A')
+        for i in range(cls.SESSIONS):
+            # Assigning creates the session with the grade's students (see signals)
+            SubstituteRequest.objects.create(
+                school=school,
+                requested_by=admin,
+                assigned_teacher=teacher,
+                subject='MATHS',
+                grade='10',
+                section='A',
+                date=tomorrow,
+                start_time=time(9 + i),
+                end_time=time(10 + i),
+                description='Query budget session',
+                mode='OFFLINE',
+                status='ASSIGNED',
+            )
+        cls.sessions = list(TeachingSession.objects.order_by('id'))
+        cls.recordings = [
+            SessionRecording.objects.create(
+                session=session, recording_url='https://recordings.example.com/r', status='COMPLETED',
+            )
+            for session in cls.sessions
+        ]
+
+    def setUp(self):
+        self.admin_client = jwt_client('admin1@school.edu', 'admin123')
+        self.teacher_client = jwt_client('external1@teacher.com', 'external123')
+
+    def test_session_list(self):
+        response = assert_endpoint_queries(self.teacher_client, '/api/teaching-sessions/sessions/', 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), self.SESSIONS)
+        self.assertTrue(all(session['students'] for session in response.data))
+
+    def test_session_detail(self):
+        path = f'/api/teaching-sessions/sessions/{self.sessions[0].id}/'
+        response = assert_endpoint_queries(self.teacher_client, path, 3)
+        self.assertEqual(response.status_code, 200)
+
+    def test_recording_list(self):
+        for client in (self.admin_client, self.teacher_client):
+            response = assert_endpoint_queries(client, '/api/teaching-sessions/recordings/', 1)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), self.SESSIONS)
 
-# Create your tests here.
+    def test_recording_detail(self):
+        path = f'/api/teaching-sessions/recordings/{self.recordings[0].id}/'
+        response = assert_endpoint_queries(self.admin_client, path, 1)
+        self.assertEqual(response.status_code, 200)
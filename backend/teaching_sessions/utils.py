@@ -9,6 +9,7 @@ from django.utils import timezone
 from datetime import timedelta
 from .models import SessionRecording
 from substitutes.utils import token_generator_jiomeet  # Import the existing token generator
+from accounts.instrumentation import external_call
 
 logger = logging.getLogger(__name__)
 
@@ -61,17 +62,18 @@ def start_recording(session):
             return None
             
         # Call JioMeet API to start recording
-        response = requests.post(
-            "https://jiomeetpro.jio.com/api/platform/v1/recordings/start",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": jwt_token
-            },
-            data=json.dumps({
-                "jiomeetId": jiomeet_id,
-                "roomPIN": room_pin
-            })
-        )
+        with external_call('jiomeet'):
+            response = requests.post(
+                "https://jiomeetpro.jio.com/api/platform/v1/recordings/start",
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": jwt_token
+                },
+                data=json.dumps({
+                    "jiomeetId": jiomeet_id,
+                    "roomPIN": room_pin
+                })
+            )
         
         if response.status_code == 200:
             data = response.json()
@@ -119,18 +121,19 @@ def fetch_recording_url(session):
         if not jwt_token:
             return None
             
-        response = requests.post(
-            "https://jiomeetpro.jio.com/api/platform/v1/recordings/list",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": jwt_token
-            },
-            data=json.dumps({
-                "jiomeetId": recording.jiomeet_id,
-                "roomPIN": recording.room_pin,
-                "historyId": recording.history_id
-            })
-        )
+        with external_call('jiomeet'):
+            response = requests.post(
+                "https://jiomeetpro.jio.com/api/platform/v1/recordings/list",
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": jwt_token
+                },
+                data=json.dumps({
+                    "jiomeetId": recording.jiomeet_id,
+                    "roomPIN": recording.room_pin,
+                    "historyId": recording.history_id
+                })
+            )
         
         if response.status_code == 200:
             data = response.json()
@@ -193,18 +196,19 @@ def get_recording_status(session):
         if not jwt_token:
             return None
             
-        response = requests.post(
-            "https://jiomeetpro.jio.com/api/platform/v1/recordings/list",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": jwt_token
-            },
-            data=json.dumps({
-                "jiomeetId": recording.jiomeet_id,
-                "roomPIN": recording.room_pin,
-                "historyId": recording.history_id
-            })
-        )
+        with external_call('jiomeet'):
+            response = requests.post(
+                "https://jiomeetpro.jio.com/api/platform/v1/recordings/list",
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": jwt_token
+                },
+                data=json.dumps({
+                    "jiomeetId": recording.jiomeet_id,
+                    "roomPIN": recording.room_pin,
+                    "historyId": recording.history_id
+                })
+            )
         
         if response.status_code == 200:
             data = response.json()
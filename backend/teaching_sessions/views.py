@@ -7,13 +7,19 @@ from django.utils import timezone
 from .models import TeachingSession, SessionRecording, SessionReport
 from .serializers import TeachingSessionSerializer, AddStudentSerializer, SessionRecordingSerializer
 from .permissions import IsAssignedTeacher
+from accounts.permissions import IsProfileVerified
+from accounts.utils import get_request_school_id
+from accounts.instrumentation import InstrumentedViewMixin
+from accounts.query_plans import QueryPlanMixin
 from accounts.models import User
 from .utils import start_recording, stop_recording, get_recording_status
+from .query_plans import TEACHING_SESSION_QUERY_PLANS, SESSION_RECORDING_QUERY_PLANS
 
-class TeachingSessionViewSet(viewsets.ModelViewSet):
+class TeachingSessionViewSet(InstrumentedViewMixin, QueryPlanMixin, viewsets.ModelViewSet):
     queryset = TeachingSession.objects.all()
+    query_plans = TEACHING_SESSION_QUERY_PLANS
     serializer_class = TeachingSessionSerializer
-    permission_classes = [IsAuthenticated, IsAssignedTeacher]
+    permission_classes = [IsAuthenticated, IsProfileVerified, IsAssignedTeacher]
 
     @action(detail=True, methods=['post'])
     def start_session(self, request, pk=None):
@@ -123,15 +129,16 @@ class TeachingSessionViewSet(viewsets.ModelViewSet):
             'detail': f'Recording is {recording.status.lower()}'
         })
 
-class SessionRecordingViewSet(viewsets.ReadOnlyModelViewSet):
+class SessionRecordingViewSet(InstrumentedViewMixin, QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for session recordings. Users can only view recordings associated with
     their school or sessions they taught/requested.
     """
     serializer_class = SessionRecordingSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsProfileVerified]
+    query_plans = SESSION_RECORDING_QUERY_PLANS
     
-    def get_queryset(self):
+    def get_base_queryset(self):
         user = self.request.user
         
         # Filter recordings based on user type and associations
@@ -140,28 +147,26 @@ class SessionRecordingViewSet(viewsets.ReadOnlyModelViewSet):
         
         # School administrators and principals see all recordings for their school
         if user.user_type in ['SCHOOL_ADMIN', 'PRINCIPAL']:
-            try:
-                if hasattr(user, 'school_staff') and user.school_staff.school:
-                    school = user.school_staff.school
-                    return SessionRecording.objects.filter(
-                        session__substitute_request__school=school
-                    )
-            except AttributeError:
+            school_id = get_request_school_id(self.request)
+            if not school_id:
                 return SessionRecording.objects.none()
+            return SessionRecording.objects.filter(
+                session__substitute_request__school_id=school_id
+            )
         
         # Teachers see recordings of sessions they taught or requested
         elif user.user_type in ['EXTERNAL_TEACHER', 'INTERNAL_TEACHER']:
             # Fix: Use Q objects to combine conditions instead of using | operator
             from django.db.models import Q
             return SessionRecording.objects.filter(
-                Q(session__teacher=user) | 
-                Q(session__substitute_request__requested_by=user)
+                Q(session__teacher_id=user.id) | 
+                Q(session__substitute_request__requested_by_id=user.id)
             ).distinct()
         
         # Students see recordings of sessions they attended
         elif user.user_type == 'STUDENT':
             return SessionRecording.objects.filter(
-                session__students=user
+                session__students__id=user.id
             )
         
         return SessionRecording.objects.none()
@@ -248,7 +248,7 @@ export default function Page() {
       }
 
       const data = await response.json();
-      setPendingProfiles(Array.isArray(data) ? data : Object.values(data));
+      setPendingProfiles(Array.isArray(data) ? data : data.results ?? []);
     } catch (error) {
       console.error("Error fetching pending profiles:", error);
       toast({
@@ -48,18 +48,42 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
     // Connect to WebSocket
     const accessToken = localStorage.getItem("accessToken")
     const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws'
-    const ws = new WebSocket(`${protocol}://${BASE_API_URL.replace(/^https?:\/\//, '')}/ws/notifications/?token=${accessToken}`);
+    // Pushes carry a per-user sequence; sending the last one seen makes the
+    // server replay whatever was missed while disconnected
+    const seqKey = `notificationSeq:${userId}`
+    const lastSeq = localStorage.getItem(seqKey)
+    const resumeParam = lastSeq ? `&last_seq=${lastSeq}` : ''
+    const ws = new WebSocket(`${protocol}://${BASE_API_URL.replace(/^https?:\/\//, '')}/ws/notifications/?token=${accessToken}${resumeParam}`);
        
+    // Heartbeats keep this user marked online for matching
+    let heartbeat: ReturnType<typeof setInterval> | undefined
+
     ws.onopen = () => {
       console.log('WebSocket connected')
+      heartbeat = setInterval(() => ws.send(JSON.stringify({ type: 'heartbeat' })), 30000)
+      // Nothing to replay from, so start from the stored inbox
+      if (!lastSeq) {
+        loadInbox()
+      }
     }
     
         ws.onmessage = (event) => {
       const data = JSON.parse(event.data)
       console.log('WebSocket message:', data)
+
+      if (typeof data.seq === 'number') {
+        localStorage.setItem(seqKey, String(data.seq))
+      } else if (data.type === 'resync') {
+        localStorage.removeItem(seqKey)
+      }
       
       // Handle different message types
       switch (data.type) {
+        case 'sync':                        // Caught up with missed pushes
+          break
+        case 'resync':                      // Missed too much to replay
+          loadInbox()
+          break
         case 'substitute.request':          // Changed from substitute_request
           handleSubstituteRequest(data)
           break
@@ -89,6 +113,7 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
     
     ws.onclose = (event) => {
       console.log('WebSocket closed:', event)
+      clearInterval(heartbeat)
     }
     
     setSocket(ws)
@@ -100,6 +125,33 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
     }
   }, [toast, router])
   
+  const loadInbox = async () => {
+    // Newest page of the stored inbox replaces whatever was built from pushes
+    try {
+      const response = await fetch(`${BASE_API_URL}/api/notifications/`, {
+        headers: {
+          "Authorization": `Bearer ${localStorage.getItem("accessToken")}`
+        }
+      })
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`)
+      }
+      const page = await response.json()
+
+      setNotifications(page.results.map((notification: any) => ({
+        id: String(notification.id),
+        type: notification.notification_type,
+        message: notification.content,
+        read: notification.is_read,
+        data: notification.metadata,
+        createdAt: notification.timestamp
+      })))
+      setUnreadCount(page.unread_count)
+    } catch (error) {
+      console.error('Error loading notifications:', error)
+    }
+  }
+
   const handleSubstituteRequest = (data: any) => {
     // Handle new substitute request (for school admin/principal)
     const newNotification = {